@@ -0,0 +1,118 @@
+"""
+Content-addressed cache for AI flow generation.
+
+Entries are keyed by a hash of the normalized input text plus provider,
+model and prompt version, so resubmitting the same description — or one
+that differs only in case, spacing or line breaks — skips the LLM calls.
+Rewritten narratives and generated graphs live in separate namespaces: a
+new description that rewrites to a narrative already seen still reuses
+the graph.
+
+Values are held as JSON text in an in-memory LRU, optionally backed by a
+SQLite file so they survive restarts and are shared between workers. The
+file keeps the same number of entries, dropping the oldest written.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Fold away differences that don't change meaning: Unicode form, case and whitespace."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return " ".join(text.split())
+
+
+def cache_key(text, provider, model, prompt_version):
+    digest = hashlib.sha256(normalize_text(text).encode()).hexdigest()
+    return f"{provider}:{model}:{prompt_version}:{digest}"
+
+
+class ResultCache:
+    def __init__(self, max_entries=256, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    def configure(self, max_entries=None, path=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if path != self.path:
+                self.path = path
+                self._db = None
+
+    def _store(self):
+        if not self.path:
+            return None
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " created_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            self._db.commit()
+        return self._db
+
+    def get(self, namespace, key):
+        """Return a fresh copy of the cached value, or None."""
+        with self._lock:
+            raw = self._entries.get((namespace, key))
+            if raw is not None:
+                self._entries.move_to_end((namespace, key))
+            elif (store := self._store()) is not None:
+                row = store.execute(
+                    "SELECT value FROM ai_cache WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                if row:
+                    raw = row[0]
+                    self._remember(namespace, key, raw)
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+    def set(self, namespace, key, value):
+        raw = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._remember(namespace, key, raw)
+            if (store := self._store()) is not None:
+                store.execute(
+                    "INSERT OR REPLACE INTO ai_cache (namespace, key, value, created_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, raw, time.time()),
+                )
+                # Same cap as the LRU. REPLACE gives the row a new rowid, so the oldest written go first
+                store.execute(
+                    "DELETE FROM ai_cache WHERE rowid < "
+                    "(SELECT rowid FROM ai_cache ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+                    (self.max_entries - 1,),
+                )
+                store.commit()
+
+    def _remember(self, namespace, key, raw):
+        self._entries[(namespace, key)] = raw
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "persistent": bool(self.path),
+            }
+
+
+generation_cache = ResultCache()
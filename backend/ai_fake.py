@@ -0,0 +1,308 @@
+"""
+Offline stand-ins for the Groq and Gemini SDKs, for load tests and benchmarks.
+
+With AI_FAKE_PROVIDERS=1 the provider registry hands out these clients
+instead of real ones, so every route runs its normal code path (rate
+budget, hedging, parsing, the node-count retry) without spending quota.
+They implement only the slice of each SDK the routes call.
+
+Responses are recorded text replayed from AI_FAKE_RECORDINGS, or, without
+recordings, synthesized from the prompt: a branching flow with a node per
+sentence of the description, a rewrite in if/then form, or a suggestion
+ranked by word overlap with the flows listed in the prompt.
+
+What goes wrong is configurable, per call:
+
+    AI_FAKE_LATENCY          fixed:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA | recorded
+    AI_FAKE_TRUNCATE_RATE    cut the output short (Gemini reports MAX_TOKENS)
+    AI_FAKE_MALFORMED_RATE   fences, trailing commas, single quotes or Python literals
+    AI_FAKE_SPARSE_RATE      a four-node flow, which trips the node-count retry
+    AI_FAKE_ERROR_RATE       raise FakeProviderError with AI_FAKE_ERROR_STATUS
+
+Every outcome is drawn from a generator seeded by AI_FAKE_SEED, the
+provider, the prompt and how many times that prompt was sent before, so a
+run replays identically however requests interleave across threads.
+
+A recordings directory holds flow/, rewrite/ and suggest/ subdirectories of
+.txt files (the raw response) or .json files ({"text": ..., "latency_ms": ...});
+the file for a call is picked by the hash of its prompt.
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+
+class _Options:
+    """Stands in for the SDK's config objects; the fakes only read a few fields."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+genai_types = SimpleNamespace(GenerateContentConfig=_Options, HttpOptions=_Options)
+
+
+class FakeProviderError(Exception):
+    """An injected provider failure, worded like the SDK errors the routes classify."""
+
+    def __init__(self, provider, status):
+        self.status_code = status
+        reason = {429: "rate_limit_exceeded", 503: "service_unavailable"}.get(status, "internal_server_error")
+        super().__init__(f"Error code: {status} - {{'error': {{'code': '{reason}', 'provider': '{provider}'}}}}")
+
+
+def settings(app_config):
+    """The fake-provider settings from app config, as a hashable tuple."""
+    return (
+        app_config.get("AI_FAKE_LATENCY", "lognormal:1.5,0.5"),
+        float(app_config.get("AI_FAKE_TRUNCATE_RATE", 0)),
+        float(app_config.get("AI_FAKE_MALFORMED_RATE", 0)),
+        float(app_config.get("AI_FAKE_SPARSE_RATE", 0)),
+        float(app_config.get("AI_FAKE_ERROR_RATE", 0)),
+        int(app_config.get("AI_FAKE_ERROR_STATUS", 429)),
+        int(app_config.get("AI_FAKE_SEED", 0)),
+        app_config.get("AI_FAKE_RECORDINGS"),
+    )
+
+
+def _latency_sampler(spec):
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "fixed":
+        return lambda rng, recorded: values[0]
+    if kind == "uniform":
+        return lambda rng, recorded: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng, recorded: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "recorded":
+        # Recordings without a latency replay instantly
+        return lambda rng, recorded: recorded or 0.0
+    raise ValueError(f"Unknown AI_FAKE_LATENCY {spec!r}")
+
+
+def _load_recordings(path):
+    recordings = {}
+    if not path:
+        return recordings
+    for kind in ("flow", "rewrite", "suggest"):
+        entries = []
+        for file in sorted((Path(path) / kind).glob("*")):
+            if file.suffix == ".json":
+                data = json.loads(file.read_text())
+                latency = data.get("latency_ms")
+                entries.append((data["text"], latency / 1000 if latency is not None else None))
+            elif file.suffix == ".txt":
+                entries.append((file.read_text(), None))
+        recordings[kind] = entries
+    return recordings
+
+
+# ── Synthesized responses ─────────────────────────────────────
+
+_SENTENCE_RE = re.compile(r"[^.!?\n]+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _steps(text, limit):
+    steps = [s.strip() for s in _SENTENCE_RE.findall(text) if len(s.split()) >= 3]
+    return steps[:limit] or [text.strip()[:200] or "Describe the problem"]
+
+
+def _synthesize_flow(prompt, rng, sparse):
+    description = prompt.split("\n\n", 1)[-1]
+    handover = 'titled exactly "CONTINUE"' in description
+    if description.startswith("This is part "):
+        # One section of a long description: drop the instructions around it
+        description = description.rsplit("\n\n", 1)[-1]
+    steps = _steps(description, 2 if sparse else 14)
+    nodes, edges = [], []
+    for i, step in enumerate(steps):
+        nodes.append({
+            "id": str(len(nodes)),
+            "title": step[:57],
+            "type": "question",
+            "body": f"Ask the customer to confirm: {step}. Record the answer before continuing.",
+            "is_start": i == 0,
+            "position": {"x": 60, "y": 60 + i * 200},
+        })
+    escalate = {
+        "id": str(len(nodes)),
+        "title": "Escalate to tier 2",
+        "type": "result",
+        "body": "Escalate to tier 2 with the customer's account id, the steps tried and their outcomes.",
+        "is_start": False,
+        "position": {"x": 380, "y": 60 + len(steps) * 200},
+    }
+    resolved = dict(escalate, id=str(len(nodes) + 1), title="CONTINUE" if handover else "Resolved",
+                    body="Confirm the fix with the customer, log the resolution and close the ticket.",
+                    position={"x": 60, "y": 60 + len(steps) * 200})
+    nodes += [escalate, resolved]
+    for i in range(len(steps)):
+        edges.append({"source": str(i), "target": str(i + 1) if i + 1 < len(steps) else resolved["id"],
+                      "label": "yes"})
+        edges.append({"source": str(i), "target": escalate["id"], "label": rng.choice(["no", "not resolved"])})
+    return json.dumps({"nodes": nodes, "edges": edges, "suggestions": []}, indent=2)
+
+
+def _synthesize_rewrite(description):
+    return " ".join(
+        f"If {step[0].lower() + step[1:]}, continue to the next check; otherwise escalate to tier 2 "
+        "with the details gathered so far."
+        for step in _steps(description, 20)
+    )
+
+
+def _synthesize_suggest(prompt, rng):
+    issue, _, rest = prompt.partition("Available published flows:\n")
+    catalog_text = rest.rsplit("\n\nReturn", 1)[0]
+    try:
+        catalog = json.loads(catalog_text)
+    except ValueError:
+        catalog = []
+    words = set(_WORD_RE.findall(issue.lower()))
+
+    def overlap(entry):
+        text = " ".join(str(entry.get(k) or "") for k in ("flow_name", "description", "category", "tags"))
+        return len(words & set(_WORD_RE.findall(text.lower())))
+
+    ranked = sorted(catalog, key=lambda e: (-overlap(e), e.get("flow_name", "")))
+    matches = [
+        {
+            "flow_id": e["flow_id"],
+            "flow_name": e["flow_name"],
+            "active_version_id": e["active_version_id"],
+            "confidence": round(rng.uniform(0.75, 0.95) if i == 0 else rng.uniform(0.3, 0.6), 2),
+            "reasoning": f"The issue shares {overlap(e)} terms with this flow.",
+        }
+        for i, e in enumerate(ranked[:3])
+        if overlap(e)
+    ]
+    return json.dumps({
+        "no_match": not matches,
+        "top_match": matches[0] if matches else None,
+        "alternatives": matches[1:],
+    })
+
+
+def _malform(text, rng):
+    """Bend valid JSON the ways models do; the tolerant parser should recover every one."""
+    defect = rng.choice(("fence", "trailing_commas", "single_quotes", "python_literals"))
+    if defect == "fence":
+        return f"Here is the flow:\n```json\n{text}\n```\nLet me know if you need changes."
+    if defect == "trailing_commas":
+        return re.sub(r"(\S)(\s*[}\]])", r"\1,\2", text)
+    if defect == "single_quotes":
+        return text.replace("'", "\\'").replace('"', "'")
+    return text.replace("true", "True").replace("false", "False").replace("null", "None")
+
+
+# ── Clients ───────────────────────────────────────────────────
+
+class _FakeBackend:
+    def __init__(self, provider, config):
+        (latency, self.truncate_rate, self.malformed_rate, self.sparse_rate,
+         self.error_rate, self.error_status, self.seed, recordings) = config
+        self.provider = provider
+        self.latency = _latency_sampler(latency)
+        self.recordings = _load_recordings(recordings)
+        self._sent = {}
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt):
+        digest = hashlib.sha1(prompt.encode()).hexdigest()
+        with self._lock:
+            n = self._sent[digest] = self._sent.get(digest, -1) + 1
+        return random.Random(f"{self.seed}:{self.provider}:{digest}:{n}"), digest
+
+    def respond(self, system, prompt):
+        """Return (text, seconds of latency, truncated) for one call, or raise the injected error."""
+        rng, digest = self._rng(system + prompt)
+        kind = "suggest" if "top_match" in system else "flow" if '"nodes"' in system else "rewrite"
+
+        recorded = self.recordings.get(kind)
+        recorded_latency = None
+        if recorded:
+            text, recorded_latency = recorded[int(digest, 16) % len(recorded)]
+        elif kind == "flow":
+            text = _synthesize_flow(prompt, rng, rng.random() < self.sparse_rate)
+        elif kind == "rewrite":
+            text = _synthesize_rewrite(prompt.split("\n\n", 1)[-1])
+        else:
+            text = _synthesize_suggest(prompt, rng)
+
+        seconds = self.latency(rng, recorded_latency)
+        if rng.random() < self.error_rate:
+            # Failures come back quicker than answers
+            time.sleep(seconds * 0.1)
+            raise FakeProviderError(self.provider, self.error_status)
+        if kind != "rewrite" and rng.random() < self.malformed_rate:
+            text = _malform(text, rng)
+        truncated = rng.random() < self.truncate_rate
+        if truncated:
+            text = text[:int(len(text) * rng.uniform(0.3, 0.9))]
+        return text, seconds, truncated
+
+    def stream(self, system, prompt):
+        """Yield the response in chunks, with time to first chunk about a quarter of the latency."""
+        text, seconds, _ = self.respond(system, prompt)
+        chunks = [text[i:i + 64] for i in range(0, len(text), 64)] or [""]
+        time.sleep(seconds * 0.25)
+        gap = seconds * 0.75 / len(chunks)
+        for chunk in chunks:
+            time.sleep(gap)
+            yield chunk
+
+
+class _GroqCompletions:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def create(self, model, messages, stream=False, **kwargs):
+        system = "".join(m["content"] for m in messages if m["role"] == "system")
+        prompt = "".join(m["content"] for m in messages if m["role"] != "system")
+        if stream:
+            return (
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+                for chunk in self._backend.stream(system, prompt)
+            )
+        text, seconds, truncated = self._backend.respond(system, prompt)
+        time.sleep(seconds)
+        return SimpleNamespace(choices=[SimpleNamespace(
+            message=SimpleNamespace(content=text),
+            finish_reason="length" if truncated else "stop",
+        )])
+
+
+class FakeGroq:
+    def __init__(self, config):
+        self.chat = SimpleNamespace(completions=_GroqCompletions(_FakeBackend("groq", config)))
+
+
+class _GeminiModels:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def generate_content(self, model, contents, config=None):
+        system = getattr(config, "system_instruction", "") or ""
+        text, seconds, truncated = self._backend.respond(system, contents)
+        time.sleep(seconds)
+        return SimpleNamespace(
+            text=text,
+            candidates=[SimpleNamespace(finish_reason="MAX_TOKENS" if truncated else "STOP")],
+        )
+
+    def generate_content_stream(self, model, contents, config=None):
+        system = getattr(config, "system_instruction", "") or ""
+        for chunk in self._backend.stream(system, contents):
+            yield SimpleNamespace(text=chunk)
+
+
+class FakeGemini:
+    def __init__(self, config):
+        self.models = _GeminiModels(_FakeBackend("gemini", config))
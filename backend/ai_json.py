@@ -0,0 +1,249 @@
+"""
+Incremental, tolerant JSON parsing for LLM output.
+
+IncrementalParser consumes a model response chunk by chunk as it streams in
+and reports each element of the watched top-level arrays ("nodes", "edges")
+the moment its closing brace arrives. It accepts the usual ways models bend
+JSON: prose or ``` fences around the object, trailing commas, single-quoted
+strings, unquoted keys, raw newlines inside strings and Python literals.
+
+Nothing is rescanned. When the stream stops early, finish() closes whatever
+is still open from the parser's stack, dropping only the half-written array
+element and any partial token, so a truncated response still yields every
+node and edge that was completed.
+
+parse_tolerant() applies the same parser to a complete response.
+"""
+import json
+import re
+
+_NO_KEY = object()
+
+_STOP = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_SCALAR_RE = re.compile(r"[^\s,:\]\}]+")
+_SEPARATORS_RE = re.compile(r"[\s,:]+")
+_SINGLE_QUOTED_RE = re.compile(r'\\(.)|"', re.S)
+_LITERALS = {
+    "true": True, "True": True,
+    "false": False, "False": False,
+    "null": None, "None": None,
+}
+
+# strict=False lets raw newlines and tabs through inside strings
+_decoder = json.JSONDecoder(strict=False)
+
+
+def _decode_string(raw, quote):
+    if "\\" not in raw and quote == '"':
+        return raw
+    if quote == "'":
+        # Re-quote as a JSON string: \' becomes ', a bare " gets escaped
+        raw = _SINGLE_QUOTED_RE.sub(
+            lambda m: '\\"' if m.group(1) is None else ("'" if m.group(1) == "'" else m.group(0)),
+            raw,
+        )
+    try:
+        return _decoder.decode('"' + raw + '"')
+    except ValueError:
+        return raw
+
+
+def _decode_scalar(token):
+    if token in _LITERALS:
+        return _LITERALS[token]
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+
+class IncrementalParser:
+    """
+    Feed text with feed(); each call returns the (event, value) pairs that
+    completed within it, e.g. ("node", {...}). watch maps a top-level array
+    key to the event name its elements are reported under.
+    """
+
+    def __init__(self, watch=None):
+        self.watch = watch if watch is not None else {"nodes": "node", "edges": "edge"}
+        self.root = None
+        self.done = False
+        # Each frame is [container, pending key (dicts only), key it sits under in its parent,
+        # whether to try decoding its children with the C decoder]
+        self._stack = []
+        self._string = None
+        self._quote = None
+        self._escape = False
+        self._scalar = None
+        self._events = []
+
+    def feed(self, chunk):
+        self._events = events = []
+        i, n = 0, len(chunk)
+        while i < n and not self.done:
+            if self._string is not None:
+                i = self._scan_string(chunk, i)
+                continue
+            if self._scalar is not None:
+                i = self._scan_scalar(chunk, i)
+                continue
+            if not self._stack:
+                # Skip prose and code fences before the object
+                i = chunk.find("{", i)
+                if i < 0:
+                    break
+            ch = chunk[i]
+            if ch == "{" or ch == "[":
+                frame = self._stack[-1] if self._stack else None
+                if frame and frame[3] and not (ch == "[" and len(self._stack) == 1 and frame[1] in self.watch):
+                    # Well-formed values, usually most of them, go through the C decoder
+                    # whole. A failure is costly (the error locates itself by counting
+                    # lines), and siblings tend to share the same defect, so after one
+                    # the rest of this container is stepped through here instead.
+                    try:
+                        value, i = _decoder.raw_decode(chunk, i)
+                    except ValueError:
+                        frame[3] = False
+                    else:
+                        self._attach(value)
+                        continue
+                self._open({} if ch == "{" else [])
+            elif ch == "}" or ch == "]":
+                self._close()
+            elif ch == '"' or ch == "'":
+                self._string = []
+                self._quote = ch
+            elif ch in " \t\r\n,:":
+                # Separators carry no information here; skip the whole run at once
+                i = _SEPARATORS_RE.match(chunk, i).end()
+                continue
+            else:
+                self._scalar = []
+                continue
+            i += 1
+        return events
+
+    def finish(self):
+        """
+        The parsed object, or None if no object was started. If the stream
+        ended mid-object, every completed member is kept.
+        """
+        if self.done or not self._stack:
+            return self.root
+        self._string = self._scalar = None
+        while len(self._stack) > 1:
+            container = self._stack.pop()[0]
+            # A half-written array element would be missing fields; drop it
+            if isinstance(self._stack[-1][0], list) and isinstance(container, dict):
+                continue
+            self._attach(container, emit=False)
+        self.root = self._stack.pop()[0]
+        return self.root
+
+    # ── internals ──────────────────────────────────────────────
+
+    def _scan_string(self, chunk, i):
+        n = len(chunk)
+        parts = self._string
+        stop = _STOP[self._quote]
+        while True:
+            if self._escape:
+                if i >= n:
+                    return n
+                parts.append(chunk[i])
+                self._escape = False
+                i += 1
+            m = stop.search(chunk, i)
+            if m is None:
+                parts.append(chunk[i:])
+                return n
+            j = m.start()
+            if j > i:
+                parts.append(chunk[i:j])
+            if chunk[j] == "\\":
+                parts.append("\\")
+                self._escape = True
+                i = j + 1
+                continue
+            self._string = None
+            self._value(_decode_string("".join(parts), self._quote), quoted=True)
+            return j + 1
+
+    def _scan_scalar(self, chunk, i):
+        m = _SCALAR_RE.match(chunk, i)
+        end = m.end() if m else i
+        self._scalar.append(chunk[i:end])
+        if end == len(chunk):
+            # The token may continue in the next chunk
+            return end
+        token = "".join(self._scalar)
+        self._scalar = None
+        self._value(token, quoted=False)
+        return end
+
+    def _open(self, container):
+        parent = self._stack[-1] if self._stack else None
+        name = parent[1] if parent and isinstance(parent[0], dict) else None
+        self._stack.append([container, _NO_KEY, name, True])
+
+    def _close(self):
+        container = self._stack.pop()[0]
+        if not self._stack:
+            self.root = container
+            self.done = True
+            return
+        self._attach(container)
+
+    def _value(self, value, quoted):
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and frame[1] is _NO_KEY:
+            # Quoted or not, a token where a key belongs is the key
+            frame[1] = value
+            return
+        self._attach(value if quoted else _decode_scalar(value))
+
+    def _attach(self, value, emit=True):
+        frame = self._stack[-1]
+        container = frame[0]
+        if isinstance(container, dict):
+            if frame[1] is not _NO_KEY:
+                container[frame[1]] = value
+                frame[1] = _NO_KEY
+            return
+        container.append(value)
+        if emit and len(self._stack) == 2 and frame[2] in self.watch and isinstance(value, dict):
+            self._events.append((self.watch[frame[2]], value))
+
+
+def parse_tolerant(text, require=None):
+    """
+    Parse a model's JSON object out of text, or return None.
+
+    Well-formed output (the common case) is decoded once by the C decoder,
+    starting at the first brace so fences and surrounding prose cost nothing.
+    Anything else takes a single pass of IncrementalParser, which still hands
+    every intact nested value to the C decoder and only steps through the
+    broken parts itself. A truncated
+    object is returned only if it has the key named by require, since a
+    cut-off answer without it is not worth acting on.
+    """
+    if not text:
+        return None
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        return _decoder.raw_decode(text, start)[0]
+    except ValueError:
+        pass
+
+    parser = IncrementalParser(watch={})
+    parser.feed(text)
+    result = parser.finish()
+    if not parser.done and (require is None or not result.get(require)):
+        return None
+    return result
@@ -0,0 +1,309 @@
+"""
+Long-lived AI provider clients, shared by every request in a process.
+
+Building a Groq or Gemini client per call throws away its HTTP connection
+pool, so each call paid for a fresh TCP + TLS handshake. The registry
+builds one client per provider, keyed by the config it was built from, and
+rebuilds it only when that config changes (e.g. a rotated API key). Both
+SDKs' clients are safe to share between threads.
+
+Every provider call should run inside providers.track(...), which first
+takes the call's share of the provider's rate budget (see rate_limit) and
+then records call counts, errors and latency for
+GET /api/v1/flows/providers/stats and the /metrics latency histogram.
+
+providers.hedge(...) races a secondary provider against a slow or failing
+primary and returns whichever answers usefully first; providers.map(...)
+runs independent calls side by side on the same pool.
+
+The SDKs, with their httpx, pydantic and grpc dependencies, are only
+imported when the first client is built; GEMINI_AVAILABLE and
+GROQ_AVAILABLE are settled at import by locating the packages without
+loading them, so workers that only serve session traffic never pay for them.
+
+With AI_FAKE_PROVIDERS on, both SDKs are replaced by the offline stand-ins
+in ai_fake. The switch is read from the app config on every call, so a
+config class or test that turns it on never reaches the real services;
+ai_fake is imported only then.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from importlib.util import find_spec
+from metrics import metrics
+from rate_limit import limiter
+
+
+def _installed(module):
+    try:
+        return find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# Whether each SDK is installed
+GEMINI_AVAILABLE = _installed("google.genai")
+GROQ_AVAILABLE = _installed("groq")
+
+
+def fake_providers(app_config):
+    return bool(app_config.get("AI_FAKE_PROVIDERS"))
+
+
+def provider_available(provider, app_config):
+    """Whether calls to provider can be made at all: its SDK is installed, or the stand-ins are on."""
+    if fake_providers(app_config):
+        return True
+    return GROQ_AVAILABLE if provider == "groq" else GEMINI_AVAILABLE
+
+
+def gemini_types(app_config):
+    """google.genai.types, imported on first use."""
+    if fake_providers(app_config):
+        import ai_fake
+        return ai_fake.genai_types
+    from google.genai import types
+    return types
+
+
+class _ProviderStats:
+    __slots__ = (
+        "clients_built", "calls", "errors", "total_seconds", "max_seconds", "last_error",
+        "hedge_requests", "hedges_fired", "hedges_won", "throttled", "throttle_seconds",
+    )
+
+    def __init__(self):
+        self.clients_built = 0
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_error = None
+        # As the primary of a hedged request: how often the secondary was fired, and won
+        self.hedge_requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        # Calls the rate limiter held back, and for how long in total
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+
+    def to_dict(self):
+        return {
+            "clients_built": self.clients_built,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_seconds / self.calls * 1000, 1) if self.calls else None,
+            "max_latency_ms": round(self.max_seconds * 1000, 1) if self.calls else None,
+            "last_error": self.last_error,
+            "hedge_requests": self.hedge_requests,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedge_rate": round(self.hedges_fired / self.hedge_requests, 3) if self.hedge_requests else None,
+            "throttled": self.throttled,
+            "throttle_wait_ms": round(self.throttle_seconds * 1000, 1),
+        }
+
+
+class ProviderRegistry:
+    def __init__(self, max_workers=16):
+        self.max_workers = max_workers
+        self._clients = {}   # provider -> (fingerprint, client, http client or None)
+        self._stats = {"groq": _ProviderStats(), "gemini": _ProviderStats()}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="hedge"
+                )
+            return self._executor
+
+    @staticmethod
+    def _pool_settings(app_config):
+        return (
+            app_config.get("AI_HTTP_MAX_CONNECTIONS", 20),
+            app_config.get("AI_HTTP_MAX_KEEPALIVE", 10),
+            app_config.get("AI_HTTP_KEEPALIVE_EXPIRY", 60.0),
+            app_config.get("AI_HTTP_TIMEOUT", 120.0),
+        )
+
+    def _get(self, provider, fingerprint, build):
+        with self._lock:
+            current = self._clients.get(provider)
+            if current and current[0] == fingerprint:
+                return current[1]
+            client, http_client = build()
+            self._clients[provider] = (fingerprint, client, http_client)
+            self._stats[provider].clients_built += 1
+        if current and current[2] is not None:
+            # Config changed — release the superseded pool's sockets
+            try:
+                current[2].close()
+            except Exception:
+                pass
+        return client
+
+    def groq(self, app_config):
+        """The shared Groq client for the configured key and pool settings."""
+        if fake_providers(app_config):
+            import ai_fake
+            fake = ai_fake.settings(app_config)
+            return self._get("groq", fake, lambda: (ai_fake.FakeGroq(fake), None))
+        api_key = app_config.get("GROQ_API_KEY")
+        settings = self._pool_settings(app_config)
+
+        def build():
+            import httpx  # a groq dependency, so always present alongside it
+            from groq import Groq
+            max_connections, max_keepalive, keepalive_expiry, timeout = settings
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive,
+                    keepalive_expiry=keepalive_expiry,
+                ),
+                timeout=timeout,
+            )
+            return Groq(api_key=api_key, http_client=http_client), http_client
+
+        return self._get("groq", (api_key, settings), build)
+
+    def gemini(self, app_config):
+        """The shared Gemini client; the SDK builds its pooled httpx client from client_args."""
+        if fake_providers(app_config):
+            import ai_fake
+            fake = ai_fake.settings(app_config)
+            return self._get("gemini", fake, lambda: (ai_fake.FakeGemini(fake), None))
+        api_key = app_config.get("GEMINI_API_KEY")
+        settings = self._pool_settings(app_config)
+
+        def build():
+            import httpx
+            from google import genai
+            max_connections, max_keepalive, keepalive_expiry, timeout = settings
+            options = gemini_types(app_config).HttpOptions(
+                timeout=int(timeout * 1000),
+                client_args={"limits": httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive,
+                    keepalive_expiry=keepalive_expiry,
+                )},
+            )
+            return genai.Client(api_key=api_key, http_options=options), None
+
+        return self._get("gemini", (api_key, settings), build)
+
+    @contextmanager
+    def track(self, provider, tokens=0):
+        """
+        Wait for rate budget for a call of about tokens tokens (raising
+        RateLimited if that takes too long), then time the call and count it,
+        including failures.
+        """
+        stats = self._stats[provider]
+        waited = limiter.acquire(provider, tokens)
+        if waited:
+            with self._lock:
+                stats.throttled += 1
+                stats.throttle_seconds += waited
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception as exc:
+            failed = True
+            with self._lock:
+                stats.errors += 1
+                stats.last_error = str(exc)[:200]
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats.calls += 1
+                stats.total_seconds += elapsed
+                stats.max_seconds = max(stats.max_seconds, elapsed)
+            metrics.observe_provider(provider, elapsed, failed)
+
+    def hedge(self, primary, secondary, delay, accept):
+        """
+        Race two provider calls. primary and secondary are (provider, fn) pairs;
+        fn() runs on a worker thread, so it must not rely on the app context.
+        The secondary starts once delay seconds pass without an accepted
+        primary result, or as soon as the primary fails.
+
+        Returns (provider, result, fired) for the first result accept() takes.
+        If neither is accepted, the primary's result is returned when it
+        produced one, otherwise its exception is raised. The loser is
+        cancelled if it has not started; a call already in flight cannot be
+        interrupted, so it finishes in the background and is discarded.
+        """
+        pool = self._pool()
+        stats = self._stats[primary[0]]
+        with self._lock:
+            stats.hedge_requests += 1
+
+        pending = {pool.submit(primary[1]): primary[0]}
+        outcomes = {}   # provider -> (result, exception)
+        fired = False
+        while pending:
+            done, _ = wait(pending, timeout=None if fired else delay, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result, error = future.result(), None
+                except Exception as exc:
+                    result, error = None, exc
+                if error is None and accept(result):
+                    for loser in pending:
+                        loser.cancel()
+                    if provider != primary[0]:
+                        with self._lock:
+                            stats.hedges_won += 1
+                    return provider, result, fired
+                outcomes[provider] = (result, error)
+            if not fired:
+                fired = True
+                with self._lock:
+                    stats.hedges_fired += 1
+                pending[pool.submit(secondary[1])] = secondary[0]
+
+        for provider in (primary[0], secondary[0]):
+            result, error = outcomes[provider]
+            if error is None:
+                return provider, result, fired
+        raise outcomes[primary[0]][1]
+
+    def map(self, calls):
+        """
+        Run zero-argument calls concurrently on the shared pool and return
+        their results in order; the first failure is raised once all have
+        finished. Like hedge(), calls must not rely on the app context.
+        """
+        futures = [self._pool().submit(call) for call in calls]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for provider, stats in self._stats.items():
+                data = stats.to_dict()
+                current = self._clients.get(provider)
+                data["client_ready"] = current is not None
+                data["open_connections"] = _open_connections(current[2]) if current else None
+                result[provider] = data
+            return result
+
+
+def _open_connections(http_client):
+    """Best-effort count of pooled connections; httpx exposes it only on the transport."""
+    try:
+        return len(http_client._transport._pool.connections)
+    except Exception:
+        return None
+
+
+providers = ProviderRegistry()
@@ -1,26 +1,73 @@
 import time
-from flask import Flask, g, jsonify
+from flask import Flask, Response, g, jsonify
 from sqlalchemy import text
 
 from config import Config
-from extensions import db, cors
+import db_profiles
+from extensions import db, cors, cache
+from changefeed import feed, DatabaseFeedStore
+from jobs import runner, maintenance, DatabaseJobStore
+from maintenance import add_missing_columns, collect_versions, gc_versions_command, init_db_command
+from ai_cache import generation_cache
+from rate_limit import limiter
+from metrics import metrics
+from query_counter import query_counter
+from compression import compression
+from replica import replica
+from json_provider import FastJSONProvider
+from seed import seed_command
 from models import (  # noqa: F401 — imported to register models with SQLAlchemy
-    Flow, FlowVersion, Node, Edge, Session, SessionStep, AuditLog
+    Flow, FlowVersion, Node, Edge, Session, SessionStep, AuditLog, BackgroundJob, ChangeEvent,
+    ReplicationHeartbeat,
 )
 from routes.flows import flows_bp
 from routes.versions import versions_bp
 from routes.sessions import sessions_bp
 from routes.analytics import analytics_bp
 from routes.ai import ai_bp
+from routes.jobs import jobs_bp
 
 
 def create_app(config=Config):
     app = Flask(__name__)
     app.config.from_object(config)
+    app.json = FastJSONProvider(app)
+
+    if app.config["AI_FAKE_PROVIDERS"]:
+        # The stand-ins need no credentials; fill the keys so both providers count as configured
+        for key in ("GROQ_API_KEY", "GEMINI_API_KEY"):
+            app.config[key] = app.config[key] or "fake"
 
     # Extensions
+    db_profiles.configure(app)
     db.init_app(app)
-    cors.init_app(app, expose_headers=["X-Total-Count", "X-Request-Time", "X-API-Version"])
+    with app.app_context():
+        for engine in db.engines.values():
+            db_profiles.prepare_engine(engine, app.config)
+    cors.init_app(app, expose_headers=["X-Total-Count", "X-Request-Time", "X-API-Version", "X-Query-Count", "X-Read-Source", "ETag"])
+    cache.init_app(app)
+    feed.buffer_size = app.config["CHANGEFEED_BUFFER_SIZE"]
+    if app.config["CHANGEFEED_STORE"] == "database":
+        feed.store = DatabaseFeedStore(
+            app.config["CHANGEFEED_POLL_SECONDS"], app.config["CHANGEFEED_RETENTION_SECONDS"]
+        )
+    runner.max_workers = app.config["JOB_WORKERS"]
+    runner.max_queued = app.config["JOB_MAX_QUEUED"]
+    runner.max_per_actor = app.config["JOB_MAX_PER_ACTOR"]
+    if app.config["JOB_STORE"] == "database":
+        runner.store = DatabaseJobStore(app.config["JOB_RETENTION_DAYS"])
+    maintenance.max_workers = app.config["MAINTENANCE_JOB_WORKERS"]
+    maintenance.max_queued = app.config["JOB_MAX_QUEUED"]
+    maintenance.store = runner.store
+    generation_cache.configure(app.config["AI_CACHE_MAX_ENTRIES"], app.config["AI_CACHE_PATH"])
+    limiter.configure(
+        {
+            "groq": (app.config["GROQ_RPM"], app.config["GROQ_TPM"]),
+            "gemini": (app.config["GEMINI_RPM"], app.config["GEMINI_TPM"]),
+        },
+        max_wait=app.config["AI_RATE_LIMIT_MAX_WAIT"],
+        path=app.config["AI_RATE_LIMIT_PATH"],
+    )
 
     # Blueprints
     app.register_blueprint(flows_bp)
@@ -28,6 +75,20 @@ def create_app(config=Config):
     app.register_blueprint(sessions_bp)
     app.register_blueprint(analytics_bp)
     app.register_blueprint(ai_bp)
+    app.register_blueprint(jobs_bp)
+
+    # Maintenance
+    app.cli.add_command(gc_versions_command)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    if app.config["VERSION_GC_INTERVAL_HOURS"] > 0:
+        maintenance.schedule(
+            app, "versions.gc",
+            lambda job: collect_versions(
+                app.config["VERSION_GC_RETENTION_DAYS"], app.config["PURGE_CHUNK_SIZE"], job=job
+            ),
+            app.config["VERSION_GC_INTERVAL_HOURS"] * 3600,
+        )
 
     # Request timing headers
     @app.before_request
@@ -55,6 +116,26 @@ def create_app(config=Config):
     def server_error(e):
         return jsonify({"error": "Internal server error"}), 500
 
+    replica.init_app(app)
+    with app.app_context():
+        query_counter.init_app(app, db.engine)
+        if replica.engine is not None:
+            query_counter.instrument_engine(replica.engine)
+    if app.config["METRICS_ENABLED"]:
+        with app.app_context():
+            metrics.init_app(app, db.engine)
+        if replica.engine is not None:
+            metrics.instrument_engine(replica.engine, "replica")
+
+        @app.get("/metrics")
+        def prometheus_metrics():
+            return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    # Registered last so it runs before the other after_request hooks: metrics record the
+    # compressed size, and X-Request-Time includes the time spent compressing
+    if app.config["COMPRESS_ENABLED"]:
+        compression.init_app(app)
+
     # Health check
     @app.get("/health")
     def health():
@@ -63,19 +144,23 @@ def create_app(config=Config):
             db_ok = True
         except Exception:
             db_ok = False
-        return jsonify({
+        body = {
             "status": "ok" if db_ok else "degraded",
             "database": "connected" if db_ok else "error",
             "version": config.API_VERSION,
-        })
+        }
+        if replica.engine is not None:
+            body["replica_lag_seconds"] = replica.lag()
+        return jsonify(body)
 
     return app
 
 
+# Importing the app does no database work; create tables with `flask --app app init-db`
 app = create_app()
 
-with app.app_context():
-    db.create_all()
-
 if __name__ == "__main__":
+    with app.app_context():
+        db.create_all()
+        add_missing_columns()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+Load-test the AI endpoints against the offline fake providers.
+
+    cd backend && python -m bench.ai_endpoints [--endpoints generate,stream,suggest]
+        [--requests 40] [--concurrency 8] [--latency lognormal:0.2,0.5]
+        [--truncate 0.1] [--malformed 0.2] [--sparse 0.1] [--errors 0.05]
+        [--provider groq] [--json results.json]
+
+Runs the real app in-process on a throwaway SQLite database with
+AI_FAKE_PROVIDERS=1 (see ai_fake), the generation cache off and, unless
+--rate-limits is given, no client-side provider budget. Each endpoint is
+driven by a pool of threads, one test client each, and reports:
+
+- end-to-end latency percentiles and throughput; for the stream endpoint
+  also the time to the first node event
+- retry amplification: provider calls per request, and the share of
+  generations that re-called the provider because the first answer was
+  truncated, unparseable or too small (_node_count_seems_low)
+- parser cost: time in _parse_ai_json per call and as a share of request
+  time, measured under the same concurrency
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+DESCRIPTIONS = [
+    "Customer reports the internet is down. Check whether the router lights are on. "
+    "If they are off, ask the customer to power cycle the router and wait two minutes. "
+    "Check the outage dashboard for their area. If there is an outage, give the ETA and close. "
+    "Otherwise run a line test from the admin console. If the line test fails, book an engineer "
+    "visit and tell the customer the appointment window. If the line test passes, check the "
+    "WiFi settings on their device and escalate to tier 2 if the connection still drops.",
+    "- verify identity\n- check the order status\n- if shipped give tracking number\n"
+    "- if not shipped check the warehouse queue\n- refund if older than 30 days",
+    "Password reset. Confirm the account email. If the account is locked, unlock it from the "
+    "admin panel. Send the reset link and confirm the customer received it.",
+    "The printer shows a paper jam. Ask the customer to open the front tray and remove any paper. "
+    "Check the rear access door as well. If the jam light stays on, power cycle the printer. "
+    "If it still shows an error, collect the model and serial number and raise a hardware ticket. "
+    "Confirm the test page prints before closing. Offer a replacement if the device is under "
+    "warranty and the fault repeats within a week. Record every step in the ticket history so "
+    "the next agent can see what was tried and what the customer reported at each stage.",
+    # Near the 5000-character limit, so generation runs in sections (AI_CHUNKED_MIN_CHARS)
+    " ".join(
+        f"Stage {i}: check the {area} settings and confirm with the customer that the change took effect. "
+        f"If the {area} check fails, collect the error shown, retry once and escalate to the {area} team."
+        for i, area in enumerate(["billing", "network", "account", "device", "shipping", "security"] * 4, 1)
+    ),
+]
+
+ISSUES = [
+    "my internet keeps dropping since yesterday",
+    "I want my money back for a late order",
+    "can't log in, it says my account is locked",
+    "paper stuck in the office printer",
+    "the app crashes when I upload a photo",
+]
+
+FLOWS = [
+    ("Internet outage", "Connection down or dropping", ["internet", "router", "wifi"]),
+    ("Refund request", "Customer wants money back for an order", ["billing", "refund"]),
+    ("Password reset", "Customer cannot log in or is locked out", ["login", "account"]),
+    ("Printer jam", "Paper stuck or jam light on", ["printer", "hardware"]),
+    ("Order tracking", "Where is my order, delivery status", ["shipping", "order"]),
+    ("Mobile app crash", "App closes or freezes on upload", ["app", "mobile"]),
+]
+
+
+def _environment(args, db_path):
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "AI_FAKE_PROVIDERS": "1",
+        "AI_FAKE_LATENCY": args.latency,
+        "AI_FAKE_TRUNCATE_RATE": str(args.truncate),
+        "AI_FAKE_MALFORMED_RATE": str(args.malformed),
+        "AI_FAKE_SPARSE_RATE": str(args.sparse),
+        "AI_FAKE_ERROR_RATE": str(args.errors),
+        "AI_FAKE_SEED": str(args.seed),
+        "AI_CACHE_ENABLED": "0",
+        "JOB_MAX_PER_ACTOR": "0",
+    })
+    if args.recordings:
+        os.environ["AI_FAKE_RECORDINGS"] = args.recordings
+    if not args.rate_limits:
+        for key in ("GROQ_RPM", "GROQ_TPM", "GEMINI_RPM", "GEMINI_TPM"):
+            os.environ[key] = "0"
+
+
+def _seed_flows(client):
+    for name, description, tags in FLOWS:
+        flow = client.post("/api/v1/flows", json={
+            "name": name, "description": description, "category": "support", "tags": tags,
+        }).get_json()
+        version_id = flow["versions"][0]["id"]
+        client.post(f"/api/v1/versions/{version_id}/import", json={
+            "nodes": [
+                {"id": "0", "title": f"Confirm: {description}", "type": "question", "is_start": True},
+                {"id": "1", "title": "Resolved", "type": "result"},
+            ],
+            "edges": [{"source": "0", "target": "1", "label": "yes"}],
+        })
+        client.post(f"/api/v1/flows/{flow['id']}/versions/{version_id}/publish", json={})
+
+
+class _ParseTimer:
+    """Wraps routes.ai._parse_ai_json to count calls and time spent parsing."""
+
+    def __init__(self, ai):
+        self.calls = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._parse = ai._parse_ai_json
+        ai._parse_ai_json = self
+
+    def __call__(self, raw_text):
+        start = time.perf_counter()
+        try:
+            return self._parse(raw_text)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.calls += 1
+                self.seconds += elapsed
+
+    def snapshot(self):
+        with self._lock:
+            return self.calls, self.seconds
+
+
+def _request(app, endpoint, i, provider):
+    client = app.test_client()
+    start = time.perf_counter()
+    first_node = None
+    attempts = 1   # first-try generation calls, one per section
+    if endpoint == "suggest":
+        resp = client.post("/api/v1/flows/suggest", json={"issue": ISSUES[i % len(ISSUES)], "provider": provider})
+        status = resp.status_code
+    elif endpoint == "generate":
+        resp = client.post("/api/v1/flows/generate-from-text", json={
+            "description": DESCRIPTIONS[i % len(DESCRIPTIONS)], "provider": provider,
+        })
+        status = resp.status_code
+        sections = ((resp.get_json() or {}).get("meta") or {}).get("sections")
+        attempts = sections["count"] if sections else 1
+    else:
+        resp = client.post("/api/v1/flows/generate-from-text/stream", json={
+            "description": DESCRIPTIONS[i % len(DESCRIPTIONS)], "provider": provider,
+        }, buffered=False)
+        status = resp.status_code
+        for chunk in resp.response:
+            text = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if first_node is None and "event: node" in text:
+                first_node = time.perf_counter() - start
+            if "event: error" in text:
+                status = json.loads(text.split("data: ", 1)[1])["status"]
+        resp.close()
+    return status, time.perf_counter() - start, first_node, attempts
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"p50_ms": round(pick(0.50), 1), "p90_ms": round(pick(0.90), 1), "p99_ms": round(pick(0.99), 1)}
+
+
+def run_endpoint(app, providers, parse_timer, endpoint, args):
+    calls_before = sum(s["calls"] for s in providers.stats().values())
+    parses_before, parse_seconds_before = parse_timer.snapshot()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(
+            lambda i: _request(app, endpoint, i, args.provider), range(args.requests)
+        ))
+    wall = time.perf_counter() - start
+
+    calls = sum(s["calls"] for s in providers.stats().values()) - calls_before
+    parses, parse_seconds = parse_timer.snapshot()
+    parses -= parses_before
+    parse_seconds -= parse_seconds_before
+    latencies = [r[1] for r in results]
+    first_nodes = [r[2] for r in results if r[2] is not None]
+
+    report = {
+        "endpoint": endpoint,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "statuses": dict(Counter(str(r[0]) for r in results)),
+        "throughput_rps": round(args.requests / wall, 2),
+        "latency": _percentiles(latencies),
+        "provider_calls_per_request": round(calls / args.requests, 3),
+    }
+    if endpoint == "generate":
+        # Each generation call's output is parsed once, so parses beyond the first tries are re-calls
+        report["retry_rate"] = round((parses - sum(r[3] for r in results)) / args.requests, 3)
+    if endpoint == "stream":
+        report["first_node"] = _percentiles(first_nodes)
+    if parses:
+        report["parse_ms_per_call"] = round(parse_seconds / parses * 1000, 3)
+        report["parse_share"] = round(parse_seconds / sum(latencies), 4)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--endpoints", default="generate,stream,suggest")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--provider", default="groq", choices=("groq", "gemini"))
+    parser.add_argument("--latency", default="lognormal:0.2,0.5")
+    parser.add_argument("--truncate", type=float, default=0.1)
+    parser.add_argument("--malformed", type=float, default=0.2)
+    parser.add_argument("--sparse", type=float, default=0.1)
+    parser.add_argument("--errors", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recordings", help="directory of recorded responses (see ai_fake)")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the configured provider budgets")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-ai-")
+    _environment(args, os.path.join(workdir, "bench.db"))
+
+    # Imported only now so config picks up the environment above
+    import routes.ai as ai
+    from ai_providers import providers
+    from app import app
+    from extensions import db
+
+    app.logger.disabled = True
+    with app.app_context():
+        db.create_all()
+    _seed_flows(app.test_client())
+    parse_timer = _ParseTimer(ai)
+
+    reports = []
+    for endpoint in args.endpoints.split(","):
+        report = run_endpoint(app, providers, parse_timer, endpoint, args)
+        reports.append(report)
+        latency = report["latency"]
+        print(
+            f"{endpoint:<9} {report['throughput_rps']:7.2f} req/s"
+            f"  p50 {latency['p50_ms']:8.1f}ms  p90 {latency['p90_ms']:8.1f}ms  p99 {latency['p99_ms']:8.1f}ms"
+            f"  calls/req {report['provider_calls_per_request']:5.2f}"
+            + (f"  retries {report['retry_rate']:5.1%}" if "retry_rate" in report else "")
+            + (f"  first node p50 {report['first_node'].get('p50_ms', 0):7.1f}ms" if "first_node" in report else "")
+            + (f"  parse {report['parse_ms_per_call']:6.3f}ms ({report['parse_share']:.2%})"
+               if "parse_ms_per_call" in report else "")
+            + f"  {report['statuses']}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
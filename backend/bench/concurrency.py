@@ -0,0 +1,213 @@
+"""
+Sustained session throughput under concurrent agents, per database profile.
+
+    cd backend && python -m bench.concurrency [--profiles basic,sqlite] [--postgres-url URL]
+        [--agents 50] [--workers 2] [--duration 20] [--flows 20] [--nodes 40] [--json results.json]
+
+For each profile (see db_profiles) a fresh database is created and seeded,
+then --workers processes, standing in for gunicorn workers, share --agents
+threads between them. Each agent works tickets the way the UI does: start
+a session on a published flow, answer until it reaches a result, start
+another. Requests go through the Flask test client, so there is no HTTP
+server in the way, but every process and thread has its own connections
+and contends for the database like production workers do.
+
+Reports completed steps per second over the whole run and in its slowest
+second (a stall shows up there), step latency percentiles, and failed
+requests, with "database is locked" errors counted separately. The basic
+and sqlite profiles run on throwaway SQLite files. postgres needs
+--postgres-url pointing at an empty local database, e.g.
+postgresql://localhost/guided_bench; its tables are dropped and recreated.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from bench.endpoints import _percentiles
+
+
+# ── Worker process ────────────────────────────────────────────
+
+def _agent(app, published, deadline, start, rng, tally, lock):
+    client = app.test_client()
+    agent_id = f"agent-{rng.randrange(10 ** 6)}"
+    state = None
+    while time.time() < deadline:
+        began = time.perf_counter()
+        if not state or not state.get("options"):
+            resp = client.post("/api/v1/sessions", json={"flow_id": rng.choice(published), "agent_id": agent_id})
+            kind = "start"
+        else:
+            edge_id = rng.choice(state["options"])["edge_id"]
+            resp = client.post(f"/api/v1/sessions/{state['session_id']}/step", json={"edge_id": edge_id})
+            kind = "step"
+        elapsed = time.perf_counter() - began
+        ok = resp.status_code < 400
+        state = resp.get_json() if ok else None
+        with lock:
+            if not ok:
+                tally["failures"][str(resp.status_code)] += 1
+            elif kind == "start":
+                tally["sessions"] += 1
+            else:
+                tally["latencies"].append(elapsed)
+                second = int(time.time() - start)
+                tally["per_second"][second] = tally["per_second"].get(second, 0) + 1
+
+
+def run_worker(args):
+    from flask import got_request_exception
+    from sqlalchemy.exc import OperationalError
+    from app import app
+    from extensions import db
+    from models import Flow
+
+    app.logger.disabled = True
+    with app.app_context():
+        published = [row.id for row in db.session.query(Flow.id).filter(Flow.active_version_id.isnot(None))]
+    tally = {"sessions": 0, "latencies": [], "per_second": {}, "failures": Counter(), "locked": 0}
+    lock = threading.Lock()
+
+    def on_exception(sender, exception, **extra):
+        if isinstance(exception, OperationalError) and "locked" in str(exception):
+            with lock:
+                tally["locked"] += 1
+    got_request_exception.connect(on_exception, app)
+
+    # Tell the driver this worker has imported the app, and wait for the common start time
+    print("ready", flush=True)
+    start_at = float(sys.stdin.readline())
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = start_at + args.duration
+    threads = [
+        threading.Thread(target=_agent, args=(
+            app, published, deadline, start_at, random.Random(f"{args.seed}:{i}"), tally, lock,
+        ))
+        for i in range(args.agents)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    json.dump(tally, sys.stdout)
+
+
+def run_setup(args):
+    from app import app
+    from extensions import db
+    from seed import seed_database
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(flows=args.flows, versions=1, nodes=args.nodes, sessions=0, audit_logs=0, seed=args.seed)
+
+
+# ── Driver ────────────────────────────────────────────────────
+
+def _run(args, *extra, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "bench.concurrency", *extra, "--seed", str(args.seed),
+         "--flows", str(args.flows), "--nodes", str(args.nodes)],
+        env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+
+
+def run_profile(profile, url, args):
+    env = dict(os.environ, DATABASE_URL=url, DATABASE_PROFILE=profile,
+               QUERY_REPEAT_THRESHOLD="0", METRICS_ENABLED="0")
+    env.pop("DATABASE_REPLICA_URL", None)
+    setup = _run(args, "--setup", env=env)
+    if setup.wait():
+        sys.exit(f"seeding the {profile} database failed")
+
+    workers = []
+    for i in range(args.workers):
+        agents = args.agents // args.workers + (i < args.agents % args.workers)
+        workers.append(_run(args, "--worker", "--agents", str(agents), "--duration", str(args.duration), env=env))
+    # Start every worker at once, after the slowest has imported the app
+    for worker in workers:
+        worker.stdout.readline()
+    start_at = time.time() + 0.5
+    for worker in workers:
+        worker.stdin.write(f"{start_at}\n")
+        worker.stdin.flush()
+    tallies = []
+    for worker in workers:
+        out, _ = worker.communicate()
+        if worker.returncode:
+            sys.exit(f"a {profile} worker failed")
+        tallies.append(json.loads(out))
+
+    latencies = [v for t in tallies for v in t["latencies"]]
+    per_second = Counter()
+    failures = Counter()
+    for t in tallies:
+        per_second.update({int(s): n for s, n in t["per_second"].items()})
+        failures.update(t["failures"])
+    # The last second is cut short by the deadline
+    whole = [per_second.get(s, 0) for s in range(int(args.duration))]
+    return {
+        "profile": profile,
+        "steps": len(latencies),
+        "sessions_started": sum(t["sessions"] for t in tallies),
+        "steps_per_second": round(len(latencies) / args.duration, 1),
+        "slowest_second_steps": min(whole) if whole else 0,
+        "latency": _percentiles(latencies) if latencies else None,
+        "failures": dict(failures),
+        "database_locked": sum(t["locked"] for t in tallies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--profiles", default="basic,sqlite", help="comma-separated: basic, sqlite, postgres")
+    parser.add_argument("--postgres-url", help="an empty database for the postgres profile")
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--flows", type=int, default=20)
+    parser.add_argument("--nodes", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--setup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup:
+        return run_setup(args)
+    if args.worker:
+        return run_worker(args)
+
+    reports = []
+    for profile in args.profiles.split(","):
+        if profile == "postgres":
+            if not args.postgres_url:
+                print("postgres             skipped: pass --postgres-url")
+                continue
+            url = args.postgres_url
+        else:
+            url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-concurrency-'), 'bench.db')}"
+        report = run_profile(profile, url, args)
+        reports.append(report)
+        latency = report["latency"] or {"p50_ms": 0, "p99_ms": 0}
+        print(f"{profile:<10} {args.agents} agents  {report['steps_per_second']:8.1f} steps/s"
+              f"  slowest second {report['slowest_second_steps']:5d}"
+              f"  p50 {latency['p50_ms']:8.2f}ms  p99 {latency['p99_ms']:8.2f}ms"
+              f"  failed {sum(report['failures'].values())} (locked {report['database_locked']})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"agents": args.agents, "workers": args.workers, "duration": args.duration,
+                       "results": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
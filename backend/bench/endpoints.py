@@ -0,0 +1,268 @@
+"""
+Benchmark the hot API endpoints on a seeded database, and compare runs across commits.
+
+    cd backend && python -m bench.endpoints [--database-url URL] [--reset | --reuse]
+        [--flows 200] [--versions 3] [--nodes 40] [--sessions 50] [--steps 12]
+        [--audit-logs 5000] [--seed 0] [--iterations 200] [--warmup 10]
+        [--only submit_step,get_session] [--accept-encoding gzip] [--json results.json]
+        [--compare baseline.json] [--tolerance 0.2]
+
+Seeds the database with seed.seed_database (see `flask seed`), then times
+each endpoint through the Flask test client, one request at a time, so the
+numbers are handler, ORM and database time without a network or server in
+between. Without --database-url the run uses a throwaway SQLite file. To
+benchmark Postgres, point it at an empty local database, e.g.
+--database-url postgresql://localhost/guided_bench; --reset drops and
+recreates its tables first, and --reuse benchmarks whatever is there.
+
+Targets (sessions, flows) are picked by --seed, so two runs with the same
+arguments make the same requests against the same rows. Each endpoint
+reports latency percentiles, SQL statements per request and the mean
+response size; --accept-encoding sends that header on every request, to
+measure the cost and savings of response compression.
+
+--json writes the results with the commit, database and settings they came
+from. --compare prints the p50 change against an earlier --json file, and
+exits non-zero when any endpoint got slower than --tolerance (a fraction).
+Only compare runs with the same settings and database.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from statistics import mean
+
+
+# ── Cases: prepare(client, targets, rng) does any untimed setup and returns the timed request ─
+
+def _submit_step(client, targets, rng):
+    state = targets.get("step_state")
+    if not state or not state.get("options"):
+        # The previous walk reached a result; start another one, off the clock
+        state = client.post("/api/v1/sessions", json={"flow_id": rng.choice(targets["published"])}).get_json()
+    session_id, edge_id = state["session_id"], rng.choice(state["options"])["edge_id"]
+
+    def request():
+        resp = client.post(f"/api/v1/sessions/{session_id}/step", json={"edge_id": edge_id})
+        targets["step_state"] = resp.get_json()
+        return resp
+    return request
+
+
+def _get_session(client, targets, rng):
+    session_id = rng.choice(targets["sessions"])
+    return lambda: client.get(f"/api/v1/sessions/{session_id}")
+
+
+def _get_version(client, targets, rng):
+    flow_id, version_id = rng.choice(targets["active_versions"])
+    return lambda: client.get(f"/api/v1/flows/{flow_id}/versions/{version_id}")
+
+
+def _list_flows(client, targets, rng):
+    return lambda: client.get("/api/v1/flows?stats=1")
+
+
+def _flow_analytics(client, targets, rng):
+    flow_id = rng.choice(targets["published"])
+    return lambda: client.get(f"/api/v1/analytics/flows/{flow_id}")
+
+
+def _overview(client, targets, rng):
+    return lambda: client.get("/api/v1/analytics/overview")
+
+
+def _batch_import(client, targets, rng):
+    from seed import import_payload
+
+    flow = client.post("/api/v1/flows", json={"name": "Benchmark import", "category": "bench"}).get_json()
+    version_id = flow["versions"][0]["id"]
+    payload = import_payload(rng, targets["nodes"])
+    return lambda: client.post(f"/api/v1/versions/{version_id}/import", json=payload)
+
+
+def _create_new_version(client, targets, rng):
+    flow_id = rng.choice(targets["flows"])
+    return lambda: client.post(f"/api/v1/flows/{flow_id}/versions", json={})
+
+
+CASES = {
+    "submit_step": _submit_step,
+    "get_session": _get_session,
+    "get_version": _get_version,
+    "list_flows_stats": _list_flows,
+    "analytics_flow": _flow_analytics,
+    "analytics_overview": _overview,
+    "batch_import": _batch_import,
+    "create_new_version": _create_new_version,
+}
+
+
+def _targets(db, args):
+    """Ids the cases pick from, read back from the database so --reuse works too."""
+    from models import Flow, Session
+
+    flows = db.session.query(Flow.id, Flow.active_version_id).filter(Flow.deleted_at.is_(None)).order_by(Flow.id)
+    live = flows.filter(Flow.active_version_id.isnot(None)).limit(2000).all()
+    return {
+        "flows": [row.id for row in flows.limit(2000)],
+        "published": [row.id for row in live],
+        "active_versions": [tuple(row) for row in live],
+        "sessions": [row.id for row in db.session.query(Session.id).order_by(Session.id).limit(2000)],
+        "nodes": args.nodes,
+    }
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {
+        "p50_ms": round(pick(0.50), 3), "p90_ms": round(pick(0.90), 3), "p99_ms": round(pick(0.99), 3),
+        "mean_ms": round(mean(ordered) * 1000, 3),
+    }
+
+
+def run_case(app, query_counter, name, targets, args):
+    client = app.test_client()
+    if args.accept_encoding:
+        client.environ_base["HTTP_ACCEPT_ENCODING"] = args.accept_encoding
+    rng = random.Random(f"{args.seed}:{name}")
+    latencies, statements, sizes, statuses = [], [], [], Counter()
+    for i in range(args.warmup + args.iterations):
+        request = CASES[name](client, targets, rng)
+        with query_counter.count() as scope:
+            start = time.perf_counter()
+            resp = request()
+            elapsed = time.perf_counter() - start
+        if i >= args.warmup:
+            latencies.append(elapsed)
+            statements.append(scope.total)
+            sizes.append(len(resp.get_data()))
+            statuses[str(resp.status_code)] += 1
+    return {
+        "endpoint": name,
+        "iterations": args.iterations,
+        "statuses": dict(statuses),
+        "latency": _percentiles(latencies),
+        "statements_per_request": round(mean(statements), 2),
+        "response_bytes": round(mean(sizes)),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(reports, baseline_path, tolerance):
+    """Print the p50 change per endpoint against a baseline file. Returns the endpoints that regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {r["endpoint"]: r for r in baseline["results"]}
+    print(f"\nagainst {baseline_path} ({baseline.get('commit')}, {baseline.get('database')})")
+    regressed = []
+    for report in reports:
+        old = before.get(report["endpoint"])
+        if not old:
+            continue
+        was, now = old["latency"]["p50_ms"], report["latency"]["p50_ms"]
+        change = (now - was) / was if was else 0.0
+        flag = ""
+        if change > tolerance:
+            regressed.append(report["endpoint"])
+            flag = "  REGRESSED"
+        print(f"{report['endpoint']:<20} p50 {was:8.2f}ms -> {now:8.2f}ms  {change:+7.1%}"
+              f"  statements {old['statements_per_request']:6.1f} -> {report['statements_per_request']:6.1f}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    data = parser.add_mutually_exclusive_group()
+    data.add_argument("--reset", action="store_true", help="drop and recreate every table before seeding")
+    data.add_argument("--reuse", action="store_true", help="benchmark the data already there, seed nothing")
+    parser.add_argument("--flows", type=int, default=200)
+    parser.add_argument("--versions", type=int, default=3)
+    parser.add_argument("--nodes", type=int, default=40)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=12)
+    parser.add_argument("--audit-logs", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--only", help="comma-separated endpoints: " + ", ".join(CASES))
+    parser.add_argument("--accept-encoding", help="Accept-Encoding header to send, e.g. gzip or br")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--compare", help="a previous --json file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-endpoints-'), 'bench.db')}"
+    os.environ.update({"DATABASE_URL": url, "QUERY_REPEAT_THRESHOLD": "0", "JOB_MAX_PER_ACTOR": "0"})
+
+    # Imported only now so config picks up the environment above
+    from app import app
+    from extensions import db
+    from flow_index import flow_index
+    from models import Flow
+    from query_counter import query_counter
+    from seed import seed_database
+
+    app.logger.disabled = True
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if not args.reuse:
+            if existing := Flow.query.count():
+                sys.exit(f"The database already has {existing} flows; pass --reset or --reuse.")
+            start = time.perf_counter()
+            counts = seed_database(args.flows, args.versions, args.nodes, args.sessions, args.steps,
+                                   args.audit_logs, args.seed)
+            print(f"seeded in {time.perf_counter() - start:.1f}s: "
+                  + ", ".join(f"{n} {table}" for table, n in counts.items()))
+            flow_index.invalidate()
+        targets = _targets(db, args)
+        database = db.engine.dialect.name
+    if not targets["published"]:
+        sys.exit("No published flows to benchmark against.")
+
+    reports = []
+    for name in args.only.split(",") if args.only else CASES:
+        report = run_case(app, query_counter, name, targets, args)
+        reports.append(report)
+        latency = report["latency"]
+        print(f"{name:<20} p50 {latency['p50_ms']:8.2f}ms  p90 {latency['p90_ms']:8.2f}ms"
+              f"  p99 {latency['p99_ms']:8.2f}ms  statements {report['statements_per_request']:6.1f}"
+              f"  {report['response_bytes'] / 1024:8.1f}KiB"
+              f"  {report['statuses']}")
+
+    if args.json:
+        settings = {k: v for k, v in vars(args).items() if k not in ("database_url", "json", "compare")}
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": _commit(),
+                "database": database,
+                "python": platform.python_version(),
+                "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+                "settings": settings,
+                "results": reports,
+            }, f, indent=2)
+    if args.compare and compare(reports, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
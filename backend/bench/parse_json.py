@@ -0,0 +1,171 @@
+"""
+Benchmark the tolerant JSON parser against the previous multi-pass repair
+chain, over a corpus of malformed provider outputs.
+
+    cd backend && python -m bench.parse_json [--repeat N] [--corpus DIR]
+
+The bundled corpus is synthetic: hand-built responses, not captured ones.
+Raw provider output is not logged anywhere we could collect it from, and
+real responses quote customers' support processes, so they would need
+scrubbing before they could be committed. The files reproduce the shapes
+provider output goes wrong in: fences and prose around the object,
+trailing commas, single quotes, Python literals, raw newlines, and
+max-token truncation mid-node, mid-string and mid-edges, at both typical
+and 16k-token sizes. To measure against recorded, anonymised responses,
+lay them out the same way in a directory and pass it as --corpus.
+
+Each corpus file has an entry in corpus/expected.json: how many nodes and
+edges a correct recovery yields (or which keys it has), or recoverable:
+false when the right answer is None. Reports per-case recovery and overall
+throughput for both implementations.
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+from ai_json import parse_tolerant
+
+CORPUS = Path(__file__).parent / "corpus"
+
+
+def legacy_parse(raw_text):
+    """_parse_ai_json as it was before the single-pass parser, kept as the baseline."""
+    if not raw_text:
+        return None
+
+    text = raw_text.strip()
+    text = re.sub(r'^```(?:json)?\s*', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'\s*```\s*$', '', text).strip()
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    brace_start = text.find('{')
+    brace_end = text.rfind('}')
+    if brace_start != -1 and brace_end > brace_start:
+        candidate = text[brace_start:brace_end + 1]
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+        fixed = re.sub(r',\s*([}\]])', r'\1', candidate)
+        try:
+            return json.loads(fixed)
+        except json.JSONDecodeError:
+            pass
+        fixed2 = re.sub(r"(?<![\\])'", '"', fixed)
+        try:
+            return json.loads(fixed2)
+        except json.JSONDecodeError:
+            pass
+
+    if brace_start != -1:
+        candidate = text[brace_start:]
+        depth_curly = depth_square = 0
+        in_string = escape_next = False
+        last_complete_node_end = -1
+
+        for i, ch in enumerate(candidate):
+            if escape_next:
+                escape_next = False
+                continue
+            if in_string:
+                if ch == '\\':
+                    escape_next = True
+                elif ch == '"':
+                    in_string = False
+                continue
+            if ch == '"':
+                in_string = True
+            elif ch == '{':
+                depth_curly += 1
+            elif ch == '}':
+                depth_curly -= 1
+                if depth_curly >= 1 and depth_square == 1:
+                    last_complete_node_end = i
+            elif ch == '[':
+                depth_square += 1
+            elif ch == ']':
+                depth_square -= 1
+
+        attempts = [
+            candidate + (']' * max(0, depth_square)) + ('}' * max(0, depth_curly)),
+        ]
+        if last_complete_node_end > 0:
+            rewound = candidate[:last_complete_node_end + 1].rstrip().rstrip(',')
+            attempts.append(rewound + "]}")
+
+        for attempt in attempts:
+            attempt = re.sub(r',\s*([}\]])', r'\1', attempt)
+            try:
+                result = json.loads(attempt)
+                if isinstance(result, dict) and result.get("nodes"):
+                    return result
+            except json.JSONDecodeError:
+                pass
+
+    return None
+
+
+def current_parse(raw_text):
+    return parse_tolerant(raw_text, require="nodes")
+
+
+def recovered(result, expect):
+    if not expect["recoverable"]:
+        return result is None
+    if not isinstance(result, dict):
+        return False
+    if "nodes" in expect and len(result.get("nodes") or []) != expect["nodes"]:
+        return False
+    if "edges" in expect and len(result.get("edges") or []) != expect["edges"]:
+        return False
+    return all(key in result for key in expect.get("keys", ()))
+
+
+def timed(parse, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--corpus", type=Path, default=CORPUS, help="a directory of responses and expected.json")
+    args = parser.parse_args()
+
+    corpus = args.corpus
+    expected = json.loads((corpus / "expected.json").read_text())
+    impls = {"legacy": legacy_parse, "current": current_parse}
+    totals = {name: {"ok": 0, "seconds": 0.0} for name in impls}
+    total_bytes = 0
+
+    print(f"{'case':<28}{'bytes':>8}  {'legacy':>16}  {'current':>16}")
+    for name in sorted(expected):
+        text = (corpus / name).read_text()
+        total_bytes += len(text)
+        cells = []
+        for impl, parse in impls.items():
+            ok = recovered(parse(text), expected[name])
+            seconds = timed(parse, text, args.repeat)
+            totals[impl]["ok"] += ok
+            totals[impl]["seconds"] += seconds
+            cells.append(f"{'ok  ' if ok else 'FAIL'} {seconds * 1000:8.3f}ms")
+        print(f"{name:<28}{len(text):>8}  {cells[0]:>16}  {cells[1]:>16}")
+
+    print()
+    for impl, total in totals.items():
+        print(
+            f"{impl:<8} recovered {total['ok']}/{len(expected)}"
+            f"  throughput {total_bytes / total['seconds'] / 1e6:6.1f} MB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
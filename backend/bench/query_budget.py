@@ -0,0 +1,219 @@
+"""
+Check each endpoint's SQL statement count against its budget, and fail when it grows with the data.
+
+    cd backend && python -m bench.query_budget [--small 3] [--large 30] [--only flows.list,...]
+
+Every case seeds a fresh SQLite database twice, once at --small and once
+at --large rows (flows, path steps, nodes or sessions, depending on the
+endpoint), warms the endpoint once and then counts the statements a
+second request runs with query_counter.count(). A case fails when:
+
+- the large count is higher than the small one: the handler issues a query
+  per row somewhere, which is an N+1 however low the numbers still are
+- either count is over the case's budget
+
+The statement shapes that repeated are printed for every failure. Exits
+non-zero on any failure, so CI can run it as is. A new endpoint that reads
+a variable number of rows should get a case in CASES.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+
+def _chain(client, flow_name, length, category="support"):
+    """A published flow whose start node leads through length questions to one result."""
+    flow = client.post("/api/v1/flows", json={"name": flow_name, "category": category}).get_json()
+    version_id = flow["versions"][0]["id"]
+    nodes = [
+        {"id": str(i), "title": f"Step {i}", "type": "question", "is_start": i == 0}
+        for i in range(length)
+    ] + [{"id": "done", "title": "Resolved", "type": "result"}]
+    edges = [
+        {"source": str(i), "target": str(i + 1) if i + 1 < length else "done", "label": "yes"}
+        for i in range(length)
+    ]
+    client.post(f"/api/v1/versions/{version_id}/import", json={"nodes": nodes, "edges": edges})
+    client.post(f"/api/v1/flows/{flow['id']}/versions/{version_id}/publish", json={})
+    return flow["id"], version_id
+
+
+def _walk(client, flow_id, steps):
+    """Start a session on flow_id and answer steps questions. Returns the session state."""
+    state = client.post("/api/v1/sessions", json={"flow_id": flow_id}).get_json()
+    for _ in range(steps):
+        if not state.get("options"):
+            break
+        state = client.post(
+            f"/api/v1/sessions/{state['session_id']}/step", json={"edge_id": state["options"][0]["edge_id"]},
+        ).get_json()
+    return state
+
+
+# ── Cases: setup(client, n) seeds n rows and returns the request to count ─
+
+def _list_flows(client, n):
+    for i in range(n):
+        flow_id, _ = _chain(client, f"Flow {i}", 2)
+        client.post(f"/api/v1/flows/{flow_id}/versions", json={})
+        _walk(client, flow_id, 3)
+    return lambda c: c.get("/api/v1/flows?stats=1&limit=200")
+
+
+def _list_archived(client, n):
+    for i in range(n):
+        flow_id, _ = _chain(client, f"Flow {i}", 1)
+        client.delete(f"/api/v1/flows/{flow_id}")
+    return lambda c: c.get("/api/v1/flows/archived")
+
+
+def _get_flow(client, n):
+    flow_id, _ = _chain(client, "Flow", 2)
+    for _ in range(n):
+        client.post(f"/api/v1/flows/{flow_id}/versions", json={})
+        _walk(client, flow_id, 3)
+    return lambda c: c.get(f"/api/v1/flows/{flow_id}")
+
+
+def _session_state(client, n):
+    flow_id, _ = _chain(client, "Flow", n + 1)
+    session_id = _walk(client, flow_id, n)["session_id"]
+    return lambda c: c.get(f"/api/v1/sessions/{session_id}")
+
+
+def _session_step(client, n):
+    flow_id, _ = _chain(client, "Flow", n + 2)
+    session_id = _walk(client, flow_id, n + 1)["session_id"]
+
+    def step(c):
+        # Going back first keeps the path at the same length for the second request
+        state = c.post(f"/api/v1/sessions/{session_id}/back", json={}).get_json()
+        return c.post(f"/api/v1/sessions/{session_id}/step", json={"edge_id": state["options"][0]["edge_id"]})
+    return step
+
+
+def _session_export(client, n):
+    flow_id, _ = _chain(client, "Flow", n)
+    session_id = _walk(client, flow_id, n)["session_id"]
+    return lambda c: c.get(f"/api/v1/sessions/{session_id}/export")
+
+
+def _flow_analytics(client, n):
+    flow = client.post("/api/v1/flows", json={"name": "Fan-out"}).get_json()
+    version_id = flow["versions"][0]["id"]
+    # One question with a result per answer, so sessions end on n different nodes
+    client.post(f"/api/v1/versions/{version_id}/import", json={
+        "nodes": [{"id": "q", "title": "Which?", "type": "question", "is_start": True}]
+        + [{"id": str(i), "title": f"Result {i}", "type": "result"} for i in range(n)],
+        "edges": [{"source": "q", "target": str(i), "label": f"answer {i}"} for i in range(n)],
+    })
+    client.post(f"/api/v1/flows/{flow['id']}/versions/{version_id}/publish", json={})
+    for i in range(n):
+        state = client.post("/api/v1/sessions", json={"flow_id": flow["id"]}).get_json()
+        client.post(f"/api/v1/sessions/{state['session_id']}/step",
+                    json={"edge_id": state["options"][i]["edge_id"]})
+    return lambda c: c.get(f"/api/v1/analytics/flows/{flow['id']}")
+
+
+def _get_version(client, n):
+    flow_id, version_id = _chain(client, "Flow", n)
+    return lambda c: c.get(f"/api/v1/flows/{flow_id}/versions/{version_id}")
+
+
+def _bulk_positions(client, n):
+    flow_id, version_id = _chain(client, "Flow", n)
+    nodes = client.get(f"/api/v1/flows/{flow_id}/versions/{version_id}").get_json()["nodes"]
+    calls = []
+
+    def move(c):
+        # Somewhere new on every call, so each request writes every node
+        calls.append(1)
+        positions = [{"id": node["id"], "x": i * 10 + len(calls), "y": i * 20} for i, node in enumerate(nodes)]
+        return c.put(f"/api/v1/versions/{version_id}/nodes/bulk-position", json={"positions": positions})
+    return move
+
+
+def _overview(client, n):
+    for i in range(n):
+        _walk(client, _chain(client, f"Flow {i}", 1, category=f"cat {i}")[0], 1)
+    return lambda c: c.get("/api/v1/analytics/overview")
+
+
+# name -> (setup, statement budget)
+CASES = {
+    "flows.list": (_list_flows, 8),
+    "flows.archived": (_list_archived, 2),
+    "flows.get": (_get_flow, 8),
+    "sessions.get": (_session_state, 6),
+    "sessions.step": (_session_step, 19),   # back and step together
+    "sessions.export": (_session_export, 4),
+    "analytics.flow": (_flow_analytics, 4),
+    "analytics.overview": (_overview, 8),
+    "versions.get": (_get_version, 4),
+    "versions.bulk_position": (_bulk_positions, 4),
+}
+
+
+def measure(app, db, count, setup, n):
+    """
+    Statement count of the case's request, warmed once, on a fresh database
+    seeded with n rows. count is query_counter.count, or the query_count fixture.
+    """
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    request = setup(client, n)
+    resp = request(client)
+    if resp.status_code >= 400:
+        raise RuntimeError(f"{resp.status_code}: {resp.get_data(as_text=True)[:300]}")
+    with count() as scope:
+        resp = request(client)
+    if resp.status_code >= 400:
+        raise RuntimeError(f"{resp.status_code}: {resp.get_data(as_text=True)[:300]}")
+    return scope
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--small", type=int, default=3)
+    parser.add_argument("--large", type=int, default=30)
+    parser.add_argument("--only", help="comma-separated case names")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-queries-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'budget.db')}",
+        "AI_CACHE_ENABLED": "0",
+        "QUERY_REPEAT_THRESHOLD": "0",
+    })
+
+    # Imported only now so config picks up the environment above
+    from app import app
+    from extensions import db
+    from query_counter import query_counter
+
+    app.logger.disabled = True
+    names = args.only.split(",") if args.only else list(CASES)
+    failures = 0
+    print(f"{'case':<24}{'budget':>8}{'n=' + str(args.small):>8}{'n=' + str(args.large):>8}")
+    for name in names:
+        setup, budget = CASES[name]
+        small = measure(app, db, query_counter.count, setup, args.small)
+        large = measure(app, db, query_counter.count, setup, args.large)
+        problems = []
+        if large.total > small.total:
+            problems.append(f"grows with input ({small.total} -> {large.total})")
+        if max(small.total, large.total) > budget:
+            problems.append(f"over budget ({max(small.total, large.total)} > {budget})")
+        print(f"{name:<24}{budget:>8}{small.total:>8}{large.total:>8}  {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+        if problems:
+            failures += 1
+            for shape, times in large.repeated(2):
+                print(f"    {times:>4}x {shape[:160]}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
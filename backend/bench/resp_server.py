@@ -0,0 +1,122 @@
+"""
+A small in-memory stand-in for Redis, to try CACHE_BACKEND=redis locally.
+
+    cd backend && python -m bench.resp_server [--host 127.0.0.1] [--port 6399]
+    CACHE_BACKEND=redis CACHE_URL=redis://127.0.0.1:6399/0 flask --app app run
+
+Speaks enough RESP for shared_cache.RespStore: PING, AUTH, SELECT, GET,
+SET, DEL, EXISTS, DBSIZE, FLUSHDB, PUBLISH and SUBSCRIBE. Every database
+number shares one keyspace, and nothing expires or is persisted.
+"""
+import argparse
+import socketserver
+import threading
+
+
+class _Error(str):
+    """An error reply."""
+
+
+def _encode(value):
+    if isinstance(value, _Error):
+        return b"-%s\r\n" % value.encode()
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    return b"+%s\r\n" % value.encode()
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _Handler)
+        self.data = {}
+        self.subscribers = {}   # channel -> set of handlers
+        self.lock = threading.Lock()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()   # inline command, e.g. from telnet
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def send(self, value):
+        with self.send_lock:
+            self.wfile.write(_encode(value))
+
+    def handle(self):
+        self.send_lock = threading.Lock()
+        self.channels = set()
+        try:
+            while (args := self._read_command()) is not None:
+                if args:
+                    self.send(self._run(args[0].upper().decode(), args[1:]))
+        finally:
+            with self.server.lock:
+                for channel in self.channels:
+                    self.server.subscribers.get(channel, set()).discard(self)
+
+    def _run(self, command, args):
+        server = self.server
+        with server.lock:
+            if command in ("PING", "AUTH", "SELECT"):
+                return "PONG" if command == "PING" else "OK"
+            if command == "GET":
+                return server.data.get(args[0])
+            if command == "SET":
+                server.data[args[0]] = args[1]
+                return "OK"
+            if command == "DEL":
+                return sum(server.data.pop(key, None) is not None for key in args)
+            if command == "EXISTS":
+                return sum(key in server.data for key in args)
+            if command == "DBSIZE":
+                return len(server.data)
+            if command == "FLUSHDB":
+                server.data.clear()
+                return "OK"
+            if command == "PUBLISH":
+                receivers = list(server.subscribers.get(args[0], ()))
+            elif command == "SUBSCRIBE":
+                for channel in args:
+                    server.subscribers.setdefault(channel, set()).add(self)
+                    self.channels.add(channel)
+                return [b"subscribe", args[-1], len(self.channels)]
+            else:
+                return _Error(f"ERR unknown command '{command}'")
+        # Deliver outside the server lock; a slow subscriber must not stall every client
+        for receiver in receivers:
+            try:
+                receiver.send([b"message", args[0], args[1]])
+            except OSError:
+                pass
+        return len(receivers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    with RespServer((args.host, args.port)) as server:
+        print(f"RESP stand-in listening on {args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
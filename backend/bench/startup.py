@@ -0,0 +1,87 @@
+"""
+Measure how long importing the app takes, and fail when it regresses.
+
+    cd backend && python -m bench.startup [--budget-ms 800] [--repeat 5] [--top 15]
+
+Each run imports app in a fresh interpreter under `python -X importtime`,
+which is what a worker pays on boot or scale-out. Reports the best total
+over --repeat runs and the packages that cost the most. Exits non-zero if
+the best run is over --budget-ms or if any module in LAZY was imported:
+those are only needed by some requests and must load on first use.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Loaded on first use, never at startup
+LAZY = ("google.genai", "groq", "httpx", "grpc", "pydantic")
+
+BUDGET_MS = 800
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_profile():
+    """Import app in a fresh interpreter. Returns {module: (self us, cumulative us, depth)}."""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/startup.db")
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app"],
+            cwd=BACKEND, env=env, capture_output=True, text=True,
+        )
+    if proc.returncode:
+        sys.exit(f"import app failed:\n{proc.stderr[-2000:]}")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            profile[m.group(4)] = (int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2)
+    return profile
+
+
+def eager_imports(profile):
+    """Modules in LAZY, or inside them, that the profile shows were imported."""
+    return sorted(m for m in profile if any(m == lazy or m.startswith(lazy + ".") for lazy in LAZY))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [import_profile() for _ in range(args.repeat)]
+    best = min(runs, key=lambda profile: profile["app"][1])
+    total_ms = best["app"][1] / 1000
+
+    by_package = defaultdict(int)
+    for module, (self_us, _, _) in best.items():
+        by_package[module.split(".")[0]] += self_us
+    print(f"{'package':<28}{'self ms':>10}")
+    for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{package:<28}{self_us / 1000:>10.1f}")
+    print()
+    print(f"import app: best {total_ms:.1f}ms of {args.repeat} runs "
+          f"(median {sorted(r['app'][1] for r in runs)[len(runs) // 2] / 1000:.1f}ms), budget {args.budget_ms:.0f}ms")
+
+    failures = []
+    eager = eager_imports(best)
+    if eager:
+        failures.append(f"imported at startup but should load lazily: {', '.join(eager[:10])}")
+    if total_ms > args.budget_ms:
+        failures.append(f"over budget by {total_ms - args.budget_ms:.1f}ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Change feed streamed to clients over server-sent events.
+
+Write paths publish compact deltas to a named channel ("version:<id>",
+"session:<id>"). Each channel keeps a short ring buffer of recent events with
+monotonically increasing sequence numbers, so a reconnecting client can
+resume from the last id it saw (EventSource sends it as Last-Event-ID). If
+the client has fallen further behind than the buffer reaches, it receives a
+single "reset" event and should refetch the resource.
+
+Events reach the buffers through a swappable store, as job records do (see
+jobs.py). MemoryFeedStore hands each event straight to this process's
+channels, which is enough for a single worker. DatabaseFeedStore
+(CHANGEFEED_STORE=database) appends it to the change_events table, and one
+thread per worker polls the table every CHANGEFEED_POLL_SECONDS, so streams
+in every worker see every write. Sequence numbers are then the table's ids,
+the same in every worker, so a client can resume on whichever worker it
+reconnects to while the rows are kept (CHANGEFEED_RETENTION_SECONDS).
+
+Each open stream holds a worker thread for up to CHANGEFEED_STREAM_SECONDS.
+Under gunicorn use a threaded or async worker class (--worker-class gthread
+with --threads sized for the open editors, or gevent): a sync worker serves
+nothing else while a stream is open. A warning is logged when that happens.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque, OrderedDict
+from flask import Response, current_app, request, has_request_context
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.exc import SQLAlchemyError
+from extensions import db
+from models import ChangeEvent
+import json_provider
+
+log = logging.getLogger(__name__)
+
+
+class _Channel:
+    __slots__ = ("events", "seq", "cond")
+
+    def __init__(self, buffer_size, seq=0):
+        self.events = deque(maxlen=buffer_size)
+        self.seq = seq
+        self.cond = threading.Condition()
+
+
+class MemoryFeedStore:
+    """Events go straight to this process's channels, numbered per channel."""
+
+    def publish(self, feed, name, event_type, payload):
+        return feed.deliver(name, None, event_type, payload)
+
+    def start(self, feed, app):
+        pass
+
+    def history(self, name, limit):
+        return []
+
+    @property
+    def watermark(self):
+        return 0
+
+
+class DatabaseFeedStore:
+    """
+    Events are rows in change_events, written through their own short
+    transaction on the engine, never db.session. A daemon thread per process
+    polls for new rows and delivers them to that process's channels.
+    """
+
+    table = ChangeEvent.__table__
+    PRUNE_EVERY_SECONDS = 60
+
+    def __init__(self, poll_seconds=0.25, retention_seconds=600):
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self._watermark = 0
+        self._engine = None
+        self._pid = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def publish(self, feed, name, event_type, payload):
+        with db.engine.begin() as conn:
+            seq = conn.execute(
+                insert(self.table).values(
+                    channel=name, event_type=event_type, payload=payload, created_at=time.time(),
+                )
+            ).inserted_primary_key[0]
+        # Streams in this worker need not wait out the poll interval
+        self._wake.set()
+        return seq
+
+    def start(self, feed, app):
+        """Start this process's poller, once, after any fork. Call from an app context."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Kept for channels created later, outside any app context, by a stream in progress
+            self._engine = db.engine
+            with self._engine.connect() as conn:
+                self._watermark = conn.execute(select(func.coalesce(func.max(self.table.c.id), 0))).scalar()
+            self._pid = os.getpid()
+        threading.Thread(target=self._poll, args=(feed,), name="changefeed-poll", daemon=True).start()
+
+    def history(self, name, limit):
+        """The channel's newest events, oldest first, to fill a buffer created after they were written."""
+        t = self.table
+        with self._engine.connect() as conn:
+            rows = conn.execute(
+                select(t.c.id, t.c.event_type, t.c.payload)
+                .where(t.c.channel == name)
+                .order_by(t.c.id.desc())
+                .limit(limit)
+            ).all()
+        return [tuple(row) for row in reversed(rows)]
+
+    @property
+    def watermark(self):
+        """The newest event id this process has delivered."""
+        return self._watermark
+
+    def _poll(self, feed):
+        t = self.table
+        pruned_at = 0.0
+        while True:
+            try:
+                with self._engine.connect() as conn:
+                    rows = conn.execute(
+                        select(t.c.id, t.c.channel, t.c.event_type, t.c.payload)
+                        .where(t.c.id > self._watermark)
+                        .order_by(t.c.id)
+                        .limit(1000)
+                    ).all()
+                for seq, name, event_type, payload in rows:
+                    feed.deliver(name, seq, event_type, payload, create=False)
+                    self._watermark = seq
+                if time.time() - pruned_at > self.PRUNE_EVERY_SECONDS:
+                    pruned_at = time.time()
+                    with self._engine.begin() as conn:
+                        conn.execute(delete(t).where(t.c.created_at < pruned_at - self.retention_seconds))
+                if len(rows) == 1000:
+                    continue
+            except SQLAlchemyError as e:
+                log.warning("Change feed poll failed: %s", e)
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+class ChangeFeed:
+    def __init__(self, buffer_size=500, max_channels=5000, store=None):
+        self.buffer_size = buffer_size
+        self.max_channels = max_channels
+        self.store = store or MemoryFeedStore()
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _channel(self, name, create=True):
+        with self._lock:
+            channel = self._channels.get(name)
+            if channel is not None:
+                self._channels.move_to_end(name)
+                return channel
+            if not create:
+                return None
+            # Starts at the store's watermark, so a stream opened now waits for newer events only
+            channel = self._channels[name] = _Channel(self.buffer_size, self.store.watermark)
+            # Held until the buffer is filled, so nothing is delivered into it before its history
+            channel.cond.acquire()
+            # Forget the least recently active channels; their clients will get a reset
+            while len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        try:
+            channel.events.extend(self.store.history(name, self.buffer_size))
+            if channel.events:
+                channel.seq = max(channel.seq, channel.events[-1][0])
+        finally:
+            channel.cond.release()
+        return channel
+
+    def publish(self, name, event_type, data):
+        """Publish an event through the store. Returns its sequence number."""
+        return self.store.publish(self, name, event_type, json_provider.dumps(data))
+
+    def deliver(self, name, seq, event_type, payload, create=True):
+        """
+        Append an event to a channel and wake any waiting streams. seq None
+        numbers it after the channel's last event. Events at or below the
+        channel's sequence number are already there and are skipped.
+        """
+        channel = self._channel(name, create)
+        if channel is None:
+            return seq
+        with channel.cond:
+            if seq is None:
+                seq = channel.seq + 1
+            elif seq <= channel.seq:
+                return seq
+            channel.seq = seq
+            channel.events.append((seq, event_type, payload))
+            channel.cond.notify_all()
+            return seq
+
+    def since(self, name, seq):
+        """
+        Return (events after seq, reset). reset is True when events between seq
+        and the oldest buffered one were already dropped.
+        """
+        channel = self._channel(name)
+        with channel.cond:
+            return self._since(channel, seq)
+
+    def wait(self, name, seq, timeout):
+        """Block up to timeout seconds for events after seq."""
+        channel = self._channel(name)
+        with channel.cond:
+            if channel.seq <= seq:
+                channel.cond.wait(timeout)
+            return self._since(channel, seq)
+
+    def current(self, name):
+        return self._channel(name).seq
+
+    @staticmethod
+    def _since(channel, seq):
+        if seq > channel.seq:
+            # Sequence numbers from a previous process lifetime or an evicted channel
+            return [], True
+        if seq >= channel.seq:
+            return [], False
+        oldest = channel.events[0][0] if channel.events else channel.seq + 1
+        if seq < oldest - 1:
+            return [], True
+        return [e for e in channel.events if e[0] > seq], False
+
+
+feed = ChangeFeed()
+
+
+def publish(name, event_type, data):
+    """Publish a delta, tagged with the writer's client id so it can ignore its own echoes."""
+    origin = request.headers.get("X-Client-Id") if has_request_context() else None
+    return feed.publish(name, event_type, {"origin": origin, **data})
+
+
+def _format(seq, event_type, payload):
+    return f"id: {seq}\nevent: {event_type}\ndata: {payload}\n\n"
+
+
+_warned_sync_worker = False
+
+
+def _warn_if_sync_worker(environ):
+    global _warned_sync_worker
+    if _warned_sync_worker or environ.get("wsgi.multithread"):
+        return
+    if not environ.get("SERVER_SOFTWARE", "").startswith("gunicorn"):
+        return
+    if "gevent" in sys.modules or "eventlet" in sys.modules:
+        return
+    _warned_sync_worker = True
+    log.warning(
+        "Change feed streams are holding sync gunicorn workers; "
+        "run with --worker-class gthread --threads N (or gevent)"
+    )
+
+
+def stream_response(name, app_config):
+    """Build a text/event-stream response for one channel, resuming from ?since= or Last-Event-ID."""
+    _warn_if_sync_worker(request.environ)
+    feed.store.start(feed, current_app._get_current_object())
+    # Created now, while the app context is still there to fill it from the store
+    feed.current(name)
+    raw = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        since = int(raw) if raw is not None else feed.current(name)
+    except ValueError:
+        since = feed.current(name)
+
+    keepalive = app_config.get("CHANGEFEED_KEEPALIVE_SECONDS", 15)
+    lifetime = app_config.get("CHANGEFEED_STREAM_SECONDS", 300)
+
+    def generate():
+        last = since
+        # Clients reconnect quickly after the stream's lifetime ends
+        yield "retry: 500\n\n"
+        deadline = time.monotonic() + lifetime
+        while time.monotonic() < deadline:
+            events, reset = feed.wait(name, last, keepalive)
+            if reset:
+                last = feed.current(name)
+                yield _format(last, "reset", json_provider.dumps({"channel": name}))
+                continue
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for seq, event_type, payload in events:
+                last = seq
+                yield _format(seq, event_type, payload)
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
@@ -0,0 +1,74 @@
+"""
+Negotiated response compression.
+
+compression.init_app(app) compresses response bodies of at least
+COMPRESS_MIN_SIZE bytes with brotli when the client accepts it and the
+brotli package is installed, otherwise with gzip. Only text-like types are
+compressed (JSON, text, CSV, JavaScript). Streamed responses are left
+alone: server-sent events must reach the client one event at a time, and
+compressing them would buffer them.
+
+A compressed response gets Vary: Accept-Encoding, and a strong ETag is
+made weak: the compressed bytes differ from the identity ones, and
+routes.not_modified already compares tags weakly, so 304s keep working.
+Turn COMPRESS_ENABLED off when a proxy in front compresses instead.
+"""
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ("application/json", "text/plain", "text/html", "text/csv", "application/javascript")
+
+
+class Compression:
+    def __init__(self):
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 4
+
+    def init_app(self, app):
+        self.min_size = app.config["COMPRESS_MIN_SIZE"]
+        self.gzip_level = app.config["COMPRESS_GZIP_LEVEL"]
+        self.brotli_quality = app.config["COMPRESS_BROTLI_QUALITY"]
+        app.after_request(self._compress)
+
+    def _encoding(self):
+        """The best encoding the request accepts, or None."""
+        accepted = request.accept_encodings
+        br, gz = accepted.quality("br") if brotli else 0, accepted.quality("gzip")
+        if br and br >= gz:
+            return "br"
+        return "gzip" if gz else None
+
+    def _compress(self, response):
+        if (
+            response.is_streamed
+            or response.direct_passthrough
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        if (response.content_length or 0) < self.min_size or not (encoding := self._encoding()):
+            return response
+
+        body = response.get_data()
+        if encoding == "br":
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
@@ -16,8 +16,124 @@ class Config:
         "pool_pre_ping": True,
         "pool_recycle": 300,
     }
+    # Engine tuning per deployment (see db_profiles): auto, basic, sqlite or postgres
+    DATABASE_PROFILE = os.getenv("DATABASE_PROFILE", "auto")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    # SQLite: how long a writer waits for the lock, and how much of the file to mmap and cache
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    # Postgres server-side limits in ms (0 disables). AI requests can hold a transaction open
+    # for as long as a provider call, so keep the idle limit above AI_HTTP_TIMEOUT if set.
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "0"))
+    DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "guided-resolution")
+    # Compiled SQL kept per engine, and runs before psycopg 3 prepares a statement server-side
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "1000"))
+    DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))
+    # Read replica for analytics, listings and exports (see replica.py); unset reads the primary
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+    SQLALCHEMY_BINDS = {"replica": DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    # Reads fall back to the primary while the replica lags further behind than this
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    # How often the primary's heartbeat row is rewritten and the replica's lag re-read
+    REPLICA_HEARTBEAT_SECONDS = float(os.getenv("REPLICA_HEARTBEAT_SECONDS", "1"))
+    # After a write, the same client reads from the primary for this long
+    REPLICA_READ_YOUR_WRITES_SECONDS = float(os.getenv("REPLICA_READ_YOUR_WRITES_SECONDS", "10"))
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-05-20")
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    # Flows shortlisted by the local index and sent to the LLM per suggest request
+    SUGGEST_CANDIDATES = int(os.getenv("SUGGEST_CANDIDATES", "15"))
+    # Answer suggest with the in-process ranker when providers are missing or rate-limited
+    SUGGEST_LOCAL_FALLBACK = os.getenv("SUGGEST_LOCAL_FALLBACK", "1") == "1"
+    # Shared HTTP pools for AI provider clients
+    AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20"))
+    AI_HTTP_MAX_KEEPALIVE = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "10"))
+    AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "60"))
+    AI_HTTP_TIMEOUT = float(os.getenv("AI_HTTP_TIMEOUT", "120"))
+    # Client-side provider budgets (0 = unlimited). Defaults match the free tiers of
+    # llama-3.3-70b-versatile and gemini flash; raise them for paid plans.
+    GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+    GROQ_TPM = int(os.getenv("GROQ_TPM", "12000"))
+    GEMINI_RPM = int(os.getenv("GEMINI_RPM", "10"))
+    GEMINI_TPM = int(os.getenv("GEMINI_TPM", "250000"))
+    # How long a call may queue for budget before failing with 429
+    AI_RATE_LIMIT_MAX_WAIT = float(os.getenv("AI_RATE_LIMIT_MAX_WAIT", "10"))
+    # Set to a SQLite file path to share the budget between worker processes
+    AI_RATE_LIMIT_PATH = os.getenv("AI_RATE_LIMIT_PATH")
+    # Opt-in: race the other configured provider when the requested one is slow or fails.
+    # suggest hedges immediately by default; generate waits first since it is costlier.
+    AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "0") == "1"
+    AI_HEDGE_DELAY_SECONDS = float(os.getenv("AI_HEDGE_DELAY_SECONDS", "8"))
+    AI_HEDGE_SUGGEST_DELAY_SECONDS = float(os.getenv("AI_HEDGE_SUGGEST_DELAY_SECONDS", "0"))
+    # Offline stand-ins for both providers (see ai_fake), for load tests without real quotas.
+    # Latency is fixed:S, uniform:LO,HI, lognormal:MEDIAN,SIGMA or recorded; rates are 0-1.
+    AI_FAKE_PROVIDERS = os.getenv("AI_FAKE_PROVIDERS", "0") == "1"
+    AI_FAKE_LATENCY = os.getenv("AI_FAKE_LATENCY", "lognormal:1.5,0.5")
+    AI_FAKE_TRUNCATE_RATE = float(os.getenv("AI_FAKE_TRUNCATE_RATE", "0"))
+    AI_FAKE_MALFORMED_RATE = float(os.getenv("AI_FAKE_MALFORMED_RATE", "0"))
+    AI_FAKE_SPARSE_RATE = float(os.getenv("AI_FAKE_SPARSE_RATE", "0"))
+    AI_FAKE_ERROR_RATE = float(os.getenv("AI_FAKE_ERROR_RATE", "0"))
+    AI_FAKE_ERROR_STATUS = int(os.getenv("AI_FAKE_ERROR_STATUS", "429"))
+    AI_FAKE_SEED = int(os.getenv("AI_FAKE_SEED", "0"))
+    AI_FAKE_RECORDINGS = os.getenv("AI_FAKE_RECORDINGS")
+    # Rewritten descriptions at least this long are generated in sections concurrently and
+    # stitched, instead of in one call that truncates or gets cut down; 0 disables
+    AI_CHUNKED_MIN_CHARS = int(os.getenv("AI_CHUNKED_MIN_CHARS", "2500"))
+    AI_CHUNK_MAX_CHARS = int(os.getenv("AI_CHUNK_MAX_CHARS", "1200"))
+    AI_CHUNK_MAX_SECTIONS = int(os.getenv("AI_CHUNK_MAX_SECTIONS", "6"))
+    # Alternate sections between both configured providers to spread their rate budgets
+    AI_CHUNKED_SPREAD = os.getenv("AI_CHUNKED_SPREAD", "0") == "1"
+    # generate-from-text result cache; set AI_CACHE_PATH to persist it to a SQLite file
+    AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1") == "1"
+    AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "256"))
+    AI_CACHE_PATH = os.getenv("AI_CACHE_PATH")
+    # Cache shared by worker processes (see shared_cache): memory, sqlite or redis
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_LOCAL_ENTRIES = int(os.getenv("CACHE_LOCAL_ENTRIES", "512"))
+    # sqlite: the shared file (e.g. /dev/shm/guided-cache.db), its size and how often workers poll it
+    CACHE_PATH = os.getenv("CACHE_PATH")
+    CACHE_SHARED_ENTRIES = int(os.getenv("CACHE_SHARED_ENTRIES", "10000"))
+    CACHE_POLL_SECONDS = float(os.getenv("CACHE_POLL_SECONDS", "0.5"))
+    # redis: any RESP server; the prefix keeps keys and the channel apart from other apps
+    CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+    CACHE_PREFIX = os.getenv("CACHE_PREFIX", "guided:")
+    # Background jobs: AI generation, and a separate pool for purges and garbage collection
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    MAINTENANCE_JOB_WORKERS = int(os.getenv("MAINTENANCE_JOB_WORKERS", "1"))
+    JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+    # Queued or running jobs allowed per X-Actor-Id (or client address); 0 disables the limit
+    JOB_MAX_PER_ACTOR = int(os.getenv("JOB_MAX_PER_ACTOR", "2"))
+    # "memory" (single worker) or "database" (shared by every worker via background_jobs)
+    JOB_STORE = os.getenv("JOB_STORE", "memory")
+    JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+    PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "500"))
+    # Versions older than this that are neither active nor newest, with no sessions, are garbage collected
+    VERSION_GC_RETENTION_DAYS = int(os.getenv("VERSION_GC_RETENTION_DAYS", "30"))
+    # 0 disables the scheduled run; `flask gc-versions` works either way
+    VERSION_GC_INTERVAL_HOURS = float(os.getenv("VERSION_GC_INTERVAL_HOURS", "0"))
+    # Server-sent change feeds. Each open stream holds a thread, so run gunicorn with a threaded
+    # or async worker class (see changefeed.py)
+    CHANGEFEED_BUFFER_SIZE = int(os.getenv("CHANGEFEED_BUFFER_SIZE", "500"))
+    CHANGEFEED_KEEPALIVE_SECONDS = 15
+    CHANGEFEED_STREAM_SECONDS = int(os.getenv("CHANGEFEED_STREAM_SECONDS", "300"))
+    # "memory" (single worker) or "database" (events reach every worker via change_events)
+    CHANGEFEED_STORE = os.getenv("CHANGEFEED_STORE", "memory")
+    CHANGEFEED_POLL_SECONDS = float(os.getenv("CHANGEFEED_POLL_SECONDS", "0.25"))
+    CHANGEFEED_RETENTION_SECONDS = int(os.getenv("CHANGEFEED_RETENTION_SECONDS", "600"))
+    # X-Query-Count on every response (always on in debug mode), and a warning when one
+    # statement runs this many times in a single request, the mark of an N+1 (0 disables)
+    QUERY_COUNT_HEADER = os.getenv("QUERY_COUNT_HEADER", "0") == "1"
+    QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "10"))
+    # gzip/brotli for responses of at least COMPRESS_MIN_SIZE bytes; off when a proxy compresses
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1") == "1"
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+    # Per-route request, SQL and AI provider metrics, served at /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
     API_VERSION = "1.0.0"
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Named database profiles: pool settings and connection setup per deployment.
+
+DATABASE_PROFILE picks one for the primary and any replica. "auto" (the
+default) picks sqlite or postgres from each database URL, and basic for
+anything else.
+
+basic     pool_pre_ping and pool_recycle, as before profiles existed.
+sqlite    WAL, so readers and the writer stop blocking each other, with
+          synchronous=NORMAL (safe in WAL; commits reach disk at checkpoints
+          rather than on every commit). Write transactions begin IMMEDIATE and
+          busy_timeout makes a writer queue for the lock instead of failing
+          with "database is locked". mmap and a larger page cache speed up
+          reads, and temp tables stay in memory.
+postgres  A LIFO pool of DB_POOL_SIZE connections plus DB_MAX_OVERFLOW, so
+          surplus connections go idle and time out. statement_timeout and
+          idle_in_transaction_session_timeout are set when connecting, and
+          application_name names the app in pg_stat_activity. SQLAlchemy's
+          compiled statement cache is sized for the app's queries. With the
+          psycopg 3 driver (postgresql+psycopg://), statements are prepared
+          on the server after DB_PREPARE_THRESHOLD runs. psycopg2 has no
+          server-side prepared statements.
+
+bench/concurrency.py compares the profiles under concurrent session traffic.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+PROFILES = ("basic", "sqlite", "postgres")
+
+
+def resolve(profile, url):
+    """The profile for one database URL."""
+    if profile != "auto":
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown DATABASE_PROFILE {profile!r}; use auto, {', '.join(PROFILES)}")
+        return profile
+    backend = make_url(url).get_backend_name()
+    return {"sqlite": "sqlite", "postgresql": "postgres"}.get(backend, "basic")
+
+
+def _in_memory(url):
+    return make_url(url).database in (None, "", ":memory:")
+
+
+def engine_options(url, config, base):
+    """create_engine options for url under the configured profile, starting from base."""
+    options = dict(base)
+    profile = resolve(config["DATABASE_PROFILE"], url)
+    if profile == "sqlite":
+        # Connections are local files: nothing to ping and nothing for a server to drop
+        options.pop("pool_pre_ping", None)
+        options.pop("pool_recycle", None)
+        if not _in_memory(url):
+            options.update(
+                pool_size=config["DB_POOL_SIZE"],
+                max_overflow=config["DB_MAX_OVERFLOW"],
+                pool_timeout=config["DB_POOL_TIMEOUT"],
+            )
+    elif profile == "postgres":
+        options.update(
+            pool_size=config["DB_POOL_SIZE"],
+            max_overflow=config["DB_MAX_OVERFLOW"],
+            pool_timeout=config["DB_POOL_TIMEOUT"],
+            pool_use_lifo=True,
+            pool_pre_ping=True,
+            query_cache_size=config["DB_STATEMENT_CACHE_SIZE"],
+        )
+        server_settings = {
+            "statement_timeout": config["DB_STATEMENT_TIMEOUT_MS"],
+            "idle_in_transaction_session_timeout": config["DB_IDLE_IN_TRANSACTION_TIMEOUT_MS"],
+        }
+        connect_args = dict(options.get("connect_args", {}))
+        connect_args["options"] = " ".join(f"-c {k}={v}" for k, v in server_settings.items())
+        connect_args["application_name"] = config["DB_APPLICATION_NAME"]
+        if make_url(url).get_driver_name() == "psycopg":
+            connect_args["prepare_threshold"] = config["DB_PREPARE_THRESHOLD"]
+        options["connect_args"] = connect_args
+    return options
+
+
+def configure(app):
+    """Apply the profile's engine options to the primary and every bind. Call before db.init_app."""
+    config = app.config
+    base = config["SQLALCHEMY_ENGINE_OPTIONS"]
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(config["SQLALCHEMY_DATABASE_URI"], config, base)
+    config["SQLALCHEMY_BINDS"] = {
+        key: {"url": value, **engine_options(value, config, base)} if isinstance(value, str) else value
+        for key, value in config["SQLALCHEMY_BINDS"].items()
+    }
+
+
+def prepare_engine(engine, config):
+    """Run the profile's per-connection setup on engine. Call before its first connection."""
+    url = engine.url.render_as_string(hide_password=False)
+    if resolve(config["DATABASE_PROFILE"], url) != "sqlite":
+        return
+    pragmas = [
+        f"PRAGMA busy_timeout = {config['SQLITE_BUSY_TIMEOUT_MS']}",
+        "PRAGMA synchronous = NORMAL",
+        f"PRAGMA mmap_size = {config['SQLITE_MMAP_SIZE']}",
+        f"PRAGMA cache_size = -{config['SQLITE_CACHE_SIZE_KB']}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if not _in_memory(url):
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+        # The driver opens a transaction just before the first write; IMMEDIATE takes the write
+        # lock right then, through busy_timeout. A deferred one takes a read snapshot first, and
+        # when another writer commits in between, SQLite fails it at once as "database is locked".
+        dbapi_connection.isolation_level = "IMMEDIATE"
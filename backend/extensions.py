@@ -1,5 +1,29 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_cors import CORS
+from sqlalchemy.sql import Select
+from shared_cache import SharedCache
 
-db = SQLAlchemy()
-cors = CORS()
\ No newline at end of file
+
+class RoutingSession(Session):
+    """
+    Sends plain SELECTs to session.info["read_engine"] when one is set (see
+    replica.py). Writes, flushes and SELECT ... FOR UPDATE stay on the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        read_engine = self.info.get("read_engine")
+        if (
+            read_engine is not None
+            and bind is None
+            and not self._flushing
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+        ):
+            return read_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+cors = CORS()
+cache = SharedCache()
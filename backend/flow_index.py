@@ -0,0 +1,332 @@
+"""
+Local BM25 index over published flows. It shortlists candidates for
+POST /flows/suggest so the LLM prompt carries the top few flows instead of
+the whole catalog, and on its own powers the offline "local" provider.
+
+Each flow is indexed from its name, description, category, tags and the
+node titles and text of its active version, with per-field weights. The index is
+built lazily on first use and then kept current incrementally: write paths
+invalidate the flow in the shared cache after committing, which marks it
+stale in every worker, and the next use re-indexes or drops just that flow.
+
+Every change bumps a monotonically increasing catalog version. Each flow's
+compact JSON prompt fragment is serialized once, when the flow is indexed,
+so a suggest request only joins precomputed strings and never touches the
+database.
+"""
+import json
+import math
+import re
+import threading
+from collections import Counter
+from extensions import db, cache
+from models import Flow, Node
+
+# Repeating a field's tokens is a cheap BM25F: a name match outweighs a body match
+FIELD_WEIGHTS = {
+    "name": 3,
+    "tags": 2,
+    "category": 2,
+    "description": 1,
+    "node_titles": 2,
+    "node_text": 1,
+}
+
+# BM25 score at which the strength half of a local confidence reaches 0.5
+LOCAL_SCORE_HALF = 6.0
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can cannot do does for from has have how i if in into is it "
+    "its my no not of on or our so that the their then there this to was we what when where "
+    "which who why will with you your".split()
+)
+
+
+def _stem(token):
+    """
+    Deliberately tiny: enough to bring "restarting"/"restarted"/"restarts" to
+    "restart", "charge"/"charged"/"charging" to "charg" and "dropping" to "drop".
+    """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            if suffix == "s" and token.endswith("ss"):
+                break
+            token = token[: -len(suffix)]
+            # "dropp" -> "drop", but "call" and "pass" keep their double letter
+            if len(token) > 3 and token[-1] == token[-2] and token[-1] not in "lsz":
+                token = token[:-1]
+            break
+    # A trailing e comes and goes with the suffix ("charge", "charged"), so it never counts
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [_stem(t) for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}        # doc id -> Counter of term frequencies
+        self.lengths = {}     # doc id -> weighted token count
+        self.postings = {}    # term -> {doc id: tf}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def upsert(self, doc_id, fields):
+        self.remove(doc_id)
+        tf = Counter()
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1)
+            for token in tokenize(text):
+                tf[token] += weight
+        self.docs[doc_id] = tf
+        length = sum(tf.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+        for term, count in tf.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, doc_id):
+        tf = self.docs.pop(doc_id, None)
+        if tf is None:
+            return
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in tf:
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+
+    def _idf(self, term):
+        n = len(self.docs)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query, limit=None):
+        """
+        Return [(doc id, score, matched terms, coverage)] best first, omitting
+        docs that match no term. coverage is the idf-weighted share of the
+        query's terms the doc contains, from 0 to 1. Terms no doc contains
+        ("customer", "please", "needs") are left out of it: they say nothing
+        about which flow fits, and would otherwise weigh the most.
+        """
+        n = len(self.docs)
+        if not n:
+            return []
+        avg_length = self.total_length / n or 1
+        terms = {term for term in tokenize(query) if term in self.postings}
+        idfs = {term: self._idf(term) for term in terms}
+        query_weight = sum(idfs.values()) or 1
+        scores = {}
+        matched = {}
+        for term in terms:
+            posting = self.postings[term]
+            idf = idfs[term]
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                matched.setdefault(doc_id, []).append(term)
+        ranked = sorted(scores.items(), key=lambda kv: -kv[1])
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [
+            (doc_id, score, matched[doc_id], sum(idfs[t] for t in matched[doc_id]) / query_weight)
+            for doc_id, score in ranked
+        ]
+
+
+def _flow_entry(flow):
+    """The fields sent to the LLM for a candidate flow."""
+    return {
+        "flow_id": flow.id,
+        "flow_name": flow.name,
+        "active_version_id": flow.active_version_id,
+        "description": flow.description or "",
+        "category": flow.category or "",
+        "tags": flow.tags or [],
+    }
+
+
+def _node_text(version_ids):
+    """Map version id -> (node titles, node bodies) for the given versions, in one query."""
+    text = {}
+    if version_ids:
+        rows = (
+            db.session.query(Node.flow_version_id, Node.title, Node.body)
+            .filter(Node.flow_version_id.in_(version_ids))
+            .all()
+        )
+        for version_id, title, body in rows:
+            titles, bodies = text.setdefault(version_id, ([], []))
+            titles.append(title)
+            if body:
+                bodies.append(body)
+    return text
+
+
+def _is_listed(flow):
+    return (
+        flow is not None and not flow.is_archived and flow.deleted_at is None
+        and flow.active_version_id is not None
+    )
+
+
+class FlowIndex:
+    """The published-flow catalog plus its BM25 index, shared by all requests in a process."""
+
+    def __init__(self):
+        self.entries = {}
+        self.fragments = {}   # flow id -> compact JSON of its entry, for prompts
+        self.index = BM25Index()
+        self.built = False
+        self.version = 0
+        self._catalog = None  # (version, context, ids) when the whole catalog fits a prompt
+        self._stale = set()   # flow ids written since they were indexed
+        self._lock = threading.RLock()
+
+    def _add(self, flow, node_text):
+        titles, bodies = node_text or ([], [])
+        entry = self.entries[flow.id] = _flow_entry(flow)
+        self.fragments[flow.id] = json.dumps(entry, separators=(",", ":"))
+        self.index.upsert(flow.id, {
+            "name": flow.name,
+            "description": flow.description,
+            "category": flow.category,
+            "tags": " ".join(flow.tags or []),
+            "node_titles": " ".join(titles),
+            "node_text": " ".join(bodies),
+        })
+
+    def _drop(self, flow_id):
+        self.entries.pop(flow_id, None)
+        self.fragments.pop(flow_id, None)
+        self.index.remove(flow_id)
+
+    def ensure_built(self):
+        with self._lock:
+            if self.built:
+                while self._stale:
+                    self.refresh_flow(self._stale.pop())
+                return
+            flows = (
+                Flow.query
+                .filter_by(is_archived=False, deleted_at=None)
+                .filter(Flow.active_version_id.isnot(None))
+                .all()
+            )
+            text = _node_text([f.active_version_id for f in flows])
+            for flow in flows:
+                self._add(flow, text.get(flow.active_version_id))
+            self.built = True
+            self.version += 1
+
+    def refresh_flow(self, flow_id):
+        """Re-index one flow after a write. A no-op until the index is first built."""
+        with self._lock:
+            if not self.built:
+                return
+            flow = Flow.query.get(flow_id)
+            if _is_listed(flow):
+                self._add(flow, _node_text([flow.active_version_id]).get(flow.active_version_id))
+            else:
+                self._drop(flow_id)
+            self.version += 1
+
+    def mark_stale(self, flow_id):
+        """
+        Re-index a flow on next use, or with flow_id None the whole catalog.
+        Needs no app context, so any thread may call it.
+        """
+        if flow_id is None:
+            self.invalidate()
+            return
+        with self._lock:
+            if self.built:
+                self._stale.add(flow_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._stale = set()
+            self.entries = {}
+            self.fragments = {}
+            self.index = BM25Index()
+            self.built = False
+            self.version += 1
+
+    def candidates(self, query, limit):
+        """
+        Up to limit catalog entries for the prompt, best lexical matches first.
+        When fewer than limit flows match any term, the rest are filled in name
+        order so the LLM can still make semantic matches the index misses.
+        """
+        self.ensure_built()
+        with self._lock:
+            return [self.entries[flow_id] for flow_id in self._candidate_ids(query, limit)]
+
+    def _candidate_ids(self, query, limit):
+        if len(self.entries) <= limit:
+            return list(self.entries)
+        ranked = [hit[0] for hit in self.index.search(query, limit)]
+        if len(ranked) < limit:
+            chosen = set(ranked)
+            rest = sorted(
+                (e for e in self.entries.values() if e["flow_id"] not in chosen),
+                key=lambda e: e["flow_name"].lower(),
+            )
+            ranked += [e["flow_id"] for e in rest[: limit - len(ranked)]]
+        return ranked
+
+    def prompt_context(self, query, limit):
+        """
+        The candidates for a suggest prompt as (JSON array text, frozenset of
+        their ids, catalog version), assembled from precomputed fragments.
+        When the whole catalog fits, the result is reused until the version
+        changes.
+        """
+        self.ensure_built()
+        with self._lock:
+            whole = len(self.entries) <= limit
+            if whole and self._catalog and self._catalog[0] == self.version:
+                return self._catalog[1], self._catalog[2], self.version
+            ids = self._candidate_ids(query, limit)
+            context = "[" + ",".join(self.fragments[flow_id] for flow_id in ids) + "]"
+            result = (context, frozenset(ids), self.version)
+            if whole:
+                self._catalog = result
+            return result
+
+    def rank(self, query, limit):
+        """
+        Score flows for the offline "local" provider. Returns up to limit
+        (entry, confidence, matched terms), best first. Confidence blends how
+        much of the query a flow covers with how strongly it matches, so a
+        flow that shares one common word never looks like a sure thing.
+        """
+        self.ensure_built()
+        with self._lock:
+            hits = self.index.search(query, limit)
+            return [
+                (
+                    self.entries[doc_id],
+                    round(min(0.99, 0.6 * coverage + 0.4 * score / (score + LOCAL_SCORE_HALF)), 2),
+                    matched,
+                )
+                for doc_id, score, matched, coverage in hits
+            ]
+
+    def __len__(self):
+        self.ensure_built()
+        return len(self.entries)
+
+
+flow_index = FlowIndex()
+cache.on_invalidate("flows", flow_index.mark_stale)
@@ -0,0 +1,315 @@
+"""
+Graph compilation, validation and runtime indexes for flow versions.
+
+A version's nodes and edges are compiled once into an integer-indexed
+adjacency list. Every check and index below is a single BFS/DFS pass over
+that structure, so validating a version is O(V + E) — cheap enough to run
+on every editor save, even for graphs with tens of thousands of nodes.
+"""
+from collections import deque
+from extensions import db, cache
+from models import FlowVersion, Node, Edge
+
+
+class CompiledGraph:
+    """Integer-indexed adjacency for one flow version."""
+
+    __slots__ = ("ids", "types", "titles", "starts", "out", "inc", "dangling")
+
+    def __init__(self, nodes, edges):
+        self.ids = []
+        self.types = []
+        self.titles = []
+        self.starts = []
+        index = {}
+        for node_id, node_type, title, is_start in nodes:
+            index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+            self.types.append(node_type)
+            self.titles.append(title)
+            if is_start:
+                self.starts.append(index[node_id])
+
+        # out[i] holds (target index, edge id, label) in sort order
+        self.out = [[] for _ in self.ids]
+        self.inc = [[] for _ in self.ids]
+        self.dangling = []
+        for edge_id, source, target, label in edges:
+            src = index.get(source)
+            tgt = index.get(target)
+            if src is None or tgt is None:
+                self.dangling.append(edge_id)
+                continue
+            self.out[src].append((tgt, edge_id, label or ""))
+            self.inc[tgt].append(src)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def is_result(self, i):
+        return self.types[i] == "result"
+
+
+def load_graph(version_id):
+    """Compile a version straight from column tuples, skipping ORM object construction."""
+    nodes = (
+        db.session.query(Node.id, Node.type, Node.title, Node.is_start)
+        .filter(Node.flow_version_id == version_id)
+        .all()
+    )
+    edges = (
+        db.session.query(Edge.id, Edge.source_node_id, Edge.target_node_id, Edge.condition_label)
+        .filter(Edge.flow_version_id == version_id)
+        .order_by(Edge.sort_order)
+        .all()
+    )
+    return CompiledGraph(nodes, edges)
+
+
+# ── Traversals ────────────────────────────────────────────────
+
+def _forward_reachable(graph, sources):
+    seen = [False] * len(graph)
+    queue = deque(sources)
+    for s in sources:
+        seen[s] = True
+    while queue:
+        i = queue.popleft()
+        for tgt, _, _ in graph.out[i]:
+            if not seen[tgt]:
+                seen[tgt] = True
+                queue.append(tgt)
+    return seen
+
+
+def _distance_to_result(graph):
+    """Multi-source reverse BFS: edges from each node to its nearest result (None if unreachable)."""
+    dist = [None] * len(graph)
+    queue = deque()
+    for i in range(len(graph)):
+        if graph.is_result(i):
+            dist[i] = 0
+            queue.append(i)
+    while queue:
+        i = queue.popleft()
+        for src in graph.inc[i]:
+            if dist[src] is None:
+                dist[src] = dist[i] + 1
+                queue.append(src)
+    return dist
+
+
+def _strongly_connected_components(graph):
+    """Iterative Tarjan. Components come out sinks-first (reverse topological order)."""
+    n = len(graph)
+    order = [None] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    components = []
+    counter = 0
+
+    for root in range(n):
+        if order[root] is not None:
+            continue
+        work = [(root, 0)]
+        while work:
+            v, pos = work.pop()
+            if pos == 0:
+                order[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                on_stack[v] = True
+            recursed = False
+            out = graph.out[v]
+            while pos < len(out):
+                w = out[pos][0]
+                pos += 1
+                if order[w] is None:
+                    work.append((v, pos))
+                    work.append((w, 0))
+                    recursed = True
+                    break
+                if on_stack[w]:
+                    low[v] = min(low[v], order[w])
+            if recursed:
+                continue
+            if low[v] == order[v]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component.append(w)
+                    if w == v:
+                        break
+                components.append(component)
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[v])
+    return components
+
+
+# ── Validation ────────────────────────────────────────────────
+
+def _issue(code, severity, message, node_id=None, edge_id=None):
+    issue = {"code": code, "severity": severity, "message": message}
+    if node_id is not None:
+        issue["node_id"] = node_id
+    if edge_id is not None:
+        issue["edge_id"] = edge_id
+    return issue
+
+
+def validate_graph(graph):
+    """
+    Report every structural problem in one pass instead of stopping at the first.
+    Issues with severity "error" block publishing; "warning" issues do not.
+    """
+    issues = []
+
+    if not graph.starts:
+        issues.append(_issue("no_start_node", "error", "Flow must have a start node."))
+    elif len(graph.starts) > 1:
+        for i in graph.starts[1:]:
+            issues.append(_issue(
+                "multiple_start_nodes", "error",
+                f"'{graph.titles[i]}' is marked as an additional start node.", graph.ids[i],
+            ))
+
+    for edge_id in graph.dangling:
+        issues.append(_issue(
+            "dangling_edge", "error",
+            "Connection points to a step that is not part of this version.", edge_id=edge_id,
+        ))
+
+    reachable = _forward_reachable(graph, graph.starts[:1]) if graph.starts else None
+    dist = _distance_to_result(graph)
+
+    for i in range(len(graph)):
+        node_id, title, out = graph.ids[i], graph.titles[i], graph.out[i]
+        if graph.is_result(i):
+            if out:
+                issues.append(_issue(
+                    "result_has_outgoing", "error",
+                    f"Result '{title}' has outgoing connections.", node_id,
+                ))
+        elif not out:
+            issues.append(_issue(
+                "dead_end_question", "error",
+                f"Question '{title}' has no outgoing connections.", node_id,
+            ))
+        elif dist[i] is None:
+            issues.append(_issue(
+                "no_path_to_result", "error",
+                f"No path from '{title}' ever reaches a result (cycle without an exit).", node_id,
+            ))
+
+        if reachable is not None and not reachable[i]:
+            issues.append(_issue(
+                "unreachable_node", "error",
+                f"'{title}' cannot be reached from the start node.", node_id,
+            ))
+
+        if len(out) > 1:
+            labels = set()
+            for _, edge_id, label in out:
+                key = label.strip().lower()
+                if not key:
+                    issues.append(_issue(
+                        "empty_condition_label", "warning",
+                        f"A connection from '{title}' has no label.", node_id, edge_id,
+                    ))
+                elif key in labels:
+                    issues.append(_issue(
+                        "duplicate_condition_label", "warning",
+                        f"'{title}' has more than one '{label}' option.", node_id, edge_id,
+                    ))
+                labels.add(key)
+
+    return issues
+
+
+def has_errors(issues):
+    return any(i["severity"] == "error" for i in issues)
+
+
+# ── Runtime index ─────────────────────────────────────────────
+
+def build_runtime_index(graph):
+    """
+    Derive per-node lookups stored on a published version so session endpoints
+    never walk the graph: remaining steps to the nearest result, and the set of
+    results still reachable from each node.
+
+    Reachable sets are computed once per strongly connected component and
+    interned, since most nodes in a tree-shaped flow share them. Graphs
+    whose nodes each reach a different subset of results do not share
+    them, so result_sets can grow to O(V·R): a chain of questions each
+    branching off to its own result stores a set per node, and a
+    5000-node chain with 2000 results stores about 2M ids.
+    """
+    dist = _distance_to_result(graph)
+
+    result_pos = {}
+    for i in range(len(graph)):
+        if graph.is_result(i):
+            result_pos[i] = len(result_pos)
+
+    interned = {}
+    sets = []
+    node_set = [None] * len(graph)
+    # Sinks come first, so every successor component is already resolved
+    for component in _strongly_connected_components(graph):
+        members = set(component)
+        reach = {result_pos[v] for v in component if v in result_pos}
+        for v in component:
+            for tgt, _, _ in graph.out[v]:
+                if tgt not in members:
+                    reach |= sets[node_set[tgt]]
+        key = frozenset(reach)
+        if key not in interned:
+            interned[key] = len(sets)
+            sets.append(key)
+        for v in component:
+            node_set[v] = interned[key]
+
+    return {
+        "results": [graph.ids[i] for i in result_pos],
+        "result_sets": [sorted(s) for s in sets],
+        "depth": {graph.ids[i]: dist[i] for i in range(len(graph))},
+        "reachable": {graph.ids[i]: node_set[i] for i in range(len(graph))},
+    }
+
+
+def get_runtime_index(version_id):
+    """
+    Return a version's stored runtime index, through the shared cache.
+    Only published indexes are stored; editing a published version rebuilds
+    its index and invalidates the cached copy (see routes/versions.py).
+    """
+    if (index := cache.get("runtime_index", version_id)) is not None:
+        return index
+    index = (
+        db.session.query(FlowVersion.runtime_index)
+        .filter(FlowVersion.id == version_id)
+        .scalar()
+    )
+    if index is not None:
+        cache.set("runtime_index", version_id, index)
+    return index
+
+
+def steps_remaining(index, node_id):
+    if not index:
+        return None
+    return index.get("depth", {}).get(node_id)
+
+
+def reachable_results(index, node_id):
+    if not index:
+        return None
+    set_idx = index.get("reachable", {}).get(node_id)
+    if set_idx is None:
+        return None
+    results = index["results"]
+    return [results[i] for i in index["result_sets"][set_idx]]
@@ -0,0 +1,336 @@
+"""
+Background jobs for work that is too slow to do inside a request.
+
+Jobs run on a small thread pool, each inside its own app context, and report
+progress through a job record that GET /api/v1/jobs/<id> returns. AI
+generation runs on `runner`; purges and garbage collection run on
+`maintenance`, a pool and queue of their own, so a slow provider call never
+holds them back. Both keep records in the same store.
+
+Records live in a swappable store. MemoryJobStore keeps them in this
+process, which is enough for a single worker. DatabaseJobStore keeps them in
+the background_jobs table, so with several workers any of them can answer a
+poll or take a cancellation; the SQLite default stands in for a shared
+database locally. Either way a job runs in the process that accepted it.
+"""
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, func
+from extensions import db
+from models import BackgroundJob
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """Raised by Job.check_cancelled() to stop a job at a safe point."""
+
+
+class JobLimitExceeded(Exception):
+    """The queue is full or the actor already has its limit of active jobs."""
+
+
+class Job:
+    def __init__(self, kind, payload=None, actor=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.payload = payload or {}
+        self.actor = actor
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._store = None
+
+    def update(self, **progress):
+        self.progress.update(progress)
+        if self._store:
+            self._store.save(self)
+
+    def check_cancelled(self):
+        """Call between steps of long work; raises JobCancelled once cancellation is requested."""
+        if self.cancel_requested or (self._store and self._store.cancel_requested(self.id)):
+            self.cancel_requested = True
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "actor": self.actor,
+            "payload": self.payload,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class MemoryJobStore:
+    def __init__(self, max_finished=500):
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+
+    def save(self, job):
+        pass
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find_active(self, kind, **payload):
+        with self._lock:
+            for job in self._jobs.values():
+                if (
+                    job.kind == kind and job.status in ACTIVE_STATUSES
+                    and all(job.payload.get(k) == v for k, v in payload.items())
+                ):
+                    return job
+        return None
+
+    def count_active(self, actor):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.actor == actor and j.status in ACTIVE_STATUSES)
+
+    def request_cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job.status in ACTIVE_STATUSES:
+                job.cancel_requested = True
+                if job.status == "queued":
+                    job.status = "cancelled"
+                    job.finished_at = datetime.utcnow()
+            return job
+
+    def cancel_requested(self, job_id):
+        job = self._jobs.get(job_id)
+        return bool(job and job.cancel_requested)
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.finished_at]
+        if len(finished) > self.max_finished:
+            finished.sort(key=lambda j: j.finished_at)
+            for j in finished[:len(finished) - self.max_finished]:
+                del self._jobs[j.id]
+
+
+class DatabaseJobStore:
+    """
+    Job records in the app database. Writes go through their own short
+    transactions on the engine, never db.session, so recording progress
+    cannot commit or roll back a job's own unit of work.
+    """
+
+    table = BackgroundJob.__table__
+
+    def __init__(self, retention_days=7):
+        self.retention_days = retention_days
+        self._adds = 0
+
+    def _row(self, job):
+        return {
+            "kind": job.kind,
+            "actor_id": job.actor,
+            "status": job.status,
+            "payload": job.payload,
+            "progress": job.progress,
+            "result": job.result,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+
+    @staticmethod
+    def _job(row):
+        job = Job(row.kind, row.payload, row.actor_id)
+        job.id = row.id
+        job.status = row.status
+        job.progress = row.progress or {}
+        job.result = row.result
+        job.error = row.error
+        job.cancel_requested = row.cancel_requested
+        job.created_at = row.created_at
+        job.started_at = row.started_at
+        job.finished_at = row.finished_at
+        return job
+
+    def add(self, job):
+        with db.engine.begin() as conn:
+            conn.execute(insert(self.table).values(id=job.id, cancel_requested=False, **self._row(job)))
+        self._adds += 1
+        if self._adds % 100 == 0:
+            self.prune(datetime.utcnow() - timedelta(days=self.retention_days))
+
+    def save(self, job):
+        with db.engine.begin() as conn:
+            conn.execute(update(self.table).where(self.table.c.id == job.id).values(**self._row(job)))
+
+    def get(self, job_id):
+        with db.engine.connect() as conn:
+            row = conn.execute(select(self.table).where(self.table.c.id == job_id)).first()
+        return self._job(row) if row else None
+
+    def find_active(self, kind, **payload):
+        query = (
+            select(self.table)
+            .where(self.table.c.kind == kind, self.table.c.status.in_(ACTIVE_STATUSES))
+            .order_by(self.table.c.created_at)
+        )
+        with db.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        for row in rows:
+            if all((row.payload or {}).get(k) == v for k, v in payload.items()):
+                return self._job(row)
+        return None
+
+    def count_active(self, actor):
+        query = select(func.count()).select_from(self.table).where(
+            self.table.c.actor_id == actor, self.table.c.status.in_(ACTIVE_STATUSES)
+        )
+        with db.engine.connect() as conn:
+            return conn.execute(query).scalar()
+
+    def request_cancel(self, job_id):
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(self.table)
+                .where(self.table.c.id == job_id, self.table.c.status == "queued")
+                .values(cancel_requested=True, status="cancelled", finished_at=now)
+            )
+            conn.execute(
+                update(self.table)
+                .where(self.table.c.id == job_id, self.table.c.status == "running")
+                .values(cancel_requested=True)
+            )
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id):
+        with db.engine.connect() as conn:
+            return bool(conn.execute(
+                select(self.table.c.cancel_requested).where(self.table.c.id == job_id)
+            ).scalar())
+
+    def prune(self, before):
+        """Delete records of jobs that finished before the given time."""
+        with db.engine.begin() as conn:
+            return conn.execute(
+                delete(self.table).where(self.table.c.finished_at < before)
+            ).rowcount
+
+
+class JobRunner:
+    def __init__(self, max_workers=2, max_queued=100, max_per_actor=2, store=None):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_per_actor = max_per_actor
+        self.store = store or MemoryJobStore()
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        # Created lazily so importing the module never starts threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="job"
+                )
+            return self._executor
+
+    def submit(self, app, kind, fn, payload=None, actor=None):
+        """
+        Queue fn(job) to run inside an app context. Returns the Job immediately.
+        Raises JobLimitExceeded when this worker's queue is full or actor
+        already has max_per_actor jobs queued or running.
+        """
+        with self._lock:
+            if self._queued >= self.max_queued:
+                raise JobLimitExceeded("Too many jobs are queued. Please try again shortly.")
+            if actor and self.max_per_actor and self.store.count_active(actor) >= self.max_per_actor:
+                raise JobLimitExceeded(
+                    f"You already have {self.max_per_actor} jobs running. Wait for one to finish or cancel it."
+                )
+            job = Job(kind, payload, actor)
+            job._store = self.store
+            self.store.add(job)
+            self._queued += 1
+        self._pool().submit(self._run, app, job, fn)
+        return job
+
+    def schedule(self, app, kind, fn, interval_seconds):
+        """Submit fn every interval_seconds on a daemon timer, skipping a run if one is still active."""
+        def tick():
+            try:
+                with app.app_context():
+                    if not self.find_active(kind):
+                        self.submit(app, kind, fn)
+            except Exception:
+                # A full queue or a database error skips this run, never the schedule
+                app.logger.exception("Could not submit scheduled %s job", kind)
+            finally:
+                timer = threading.Timer(interval_seconds, tick)
+                timer.daemon = True
+                timer.start()
+
+        timer = threading.Timer(interval_seconds, tick)
+        timer.daemon = True
+        timer.start()
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def find_active(self, kind, **payload):
+        """Return a queued or running job of this kind whose payload matches, if any."""
+        return self.store.find_active(kind, **payload)
+
+    def cancel(self, job_id):
+        """
+        Ask a job to stop. A queued job never starts; a running one stops at
+        its next check_cancelled(). Returns the job, or None if unknown.
+        """
+        return self.store.request_cancel(job_id)
+
+    def _run(self, app, job, fn):
+        with self._lock:
+            self._queued -= 1
+        with app.app_context():
+            try:
+                job.check_cancelled()
+                job.status = "running"
+                job.started_at = datetime.utcnow()
+                self.store.save(job)
+                job.result = fn(job)
+                job.status = "succeeded"
+            except JobCancelled:
+                db.session.rollback()
+                job.status = "cancelled"
+            except Exception as exc:
+                db.session.rollback()
+                job.status = "failed"
+                job.error = str(exc)
+                app.logger.error("Job %s (%s) failed: %s\n%s", job.id, job.kind, exc, traceback.format_exc())
+            job.finished_at = datetime.utcnow()
+            self.store.save(job)
+
+
+runner = JobRunner()
+maintenance = JobRunner(max_workers=1, max_per_actor=0)
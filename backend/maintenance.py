@@ -0,0 +1,221 @@
+"""
+Bulk maintenance operations that must not hold long locks or load whole
+tables into memory: every delete is issued in bounded chunks selected by a
+subquery, and each chunk is committed on its own.
+"""
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, func, exists, and_, inspect, literal, text
+from extensions import db
+from models import Flow, FlowVersion, Node, Edge, Session, SessionStep
+from graph import load_graph, build_runtime_index
+
+
+def delete_in_chunks(model, criterion, chunk_size, on_chunk=None):
+    """
+    Delete rows of model matching criterion, chunk_size rows per statement.
+    No ids are pulled into Python, so memory and bound-parameter counts stay
+    constant however many rows match. Returns the number of rows deleted.
+    """
+    total = 0
+    while True:
+        chunk = select(model.id).where(criterion).limit(chunk_size)
+        deleted = (
+            model.query
+            .filter(model.id.in_(chunk))
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        if not deleted:
+            return total
+        total += deleted
+        if on_chunk:
+            on_chunk(total)
+
+
+def purge_flow(flow_id, chunk_size, job=None):
+    """Permanently remove a flow and everything that hangs off it, in FK-dependency order."""
+    versions = select(FlowVersion.id).where(FlowVersion.flow_id == flow_id)
+    sessions = select(Session.id).where(Session.flow_version_id.in_(versions))
+    plan = [
+        ("session_steps", SessionStep, SessionStep.session_id.in_(sessions)),
+        ("sessions", Session, Session.flow_version_id.in_(versions)),
+        ("edges", Edge, Edge.flow_version_id.in_(versions)),
+        ("nodes", Node, Node.flow_version_id.in_(versions)),
+        ("versions", FlowVersion, FlowVersion.flow_id == flow_id),
+    ]
+
+    counts = {}
+    for name, model, criterion in plan:
+        if job:
+            job.update(phase=name)
+
+        def report(total, name=name):
+            counts[name] = total
+            if job:
+                job.update(deleted=dict(counts))
+
+        counts[name] = delete_in_chunks(model, criterion, chunk_size, report)
+
+    Flow.query.filter_by(id=flow_id).delete(synchronize_session=False)
+    db.session.commit()
+    if job:
+        job.update(phase="done", deleted=dict(counts))
+    return counts
+
+
+# ── Version garbage collection ────────────────────────────────
+
+def _unreferenced(version_id):
+    """Nothing points at the version: not a flow's active version, and no session ran on it."""
+    return (
+        ~exists().where(Flow.active_version_id == version_id),
+        ~exists().where(Session.flow_version_id == version_id),
+    )
+
+
+def _collectable_versions(retention_days):
+    """
+    Versions nothing can reach any more: abandoned drafts and superseded
+    published versions that are not a flow's active version, not its newest
+    version (the draft being edited), older than the retention window and
+    never used by a session.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    newest = (
+        select(FlowVersion.flow_id, func.max(FlowVersion.version_number).label("version_number"))
+        .group_by(FlowVersion.flow_id)
+        .subquery()
+    )
+    return select(FlowVersion.id).where(
+        FlowVersion.created_at < cutoff,
+        *_unreferenced(FlowVersion.id),
+        ~exists().where(
+            newest.c.flow_id == FlowVersion.flow_id,
+            newest.c.version_number == FlowVersion.version_number,
+        ),
+    )
+
+
+def collect_versions(retention_days, chunk_size, dry_run=False, job=None):
+    """
+    Delete the graph rows of unreachable versions, then the versions themselves.
+    Returns the number of rows reclaimed (or that would be, with dry_run).
+    """
+    candidates = _collectable_versions(retention_days)
+    if dry_run:
+        return {
+            "dry_run": True,
+            "versions": db.session.query(func.count()).select_from(candidates.subquery()).scalar(),
+            "nodes": Node.query.filter(Node.flow_version_id.in_(candidates)).count(),
+            "edges": Edge.query.filter(Edge.flow_version_id.in_(candidates)).count(),
+        }
+
+    counts = {"dry_run": False, "versions": 0, "nodes": 0, "edges": 0}
+    while True:
+        # A bounded batch of version ids keeps every statement's IN list small
+        batch = db.session.execute(candidates.limit(chunk_size)).scalars().all()
+        if not batch:
+            break
+        # Every delete checks again: a session may have started on a version since it was selected
+        counts["edges"] += delete_in_chunks(
+            Edge, and_(Edge.flow_version_id.in_(batch), *_unreferenced(Edge.flow_version_id)), chunk_size
+        )
+        counts["nodes"] += delete_in_chunks(
+            Node, and_(Node.flow_version_id.in_(batch), *_unreferenced(Node.flow_version_id)), chunk_size
+        )
+        counts["versions"] += (
+            FlowVersion.query
+            .filter(FlowVersion.id.in_(batch), *_unreferenced(FlowVersion.id))
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        if job:
+            job.update(reclaimed=dict(counts))
+    return counts
+
+
+@click.command("gc-versions")
+@click.option("--dry-run", is_flag=True, help="Report what would be reclaimed without deleting.")
+@click.option("--retention-days", type=int, default=None,
+              help="Only collect versions older than this. Defaults to VERSION_GC_RETENTION_DAYS.")
+@with_appcontext
+def gc_versions_command(dry_run, retention_days):
+    """Delete abandoned drafts and superseded versions, with their nodes and edges."""
+    config = current_app.config
+    counts = collect_versions(
+        retention_days if retention_days is not None else config["VERSION_GC_RETENTION_DAYS"],
+        config["PURGE_CHUNK_SIZE"],
+        dry_run=dry_run,
+    )
+    verb = "Would reclaim" if dry_run else "Reclaimed"
+    click.echo(
+        f"{verb} {counts['versions']} versions, {counts['nodes']} nodes, {counts['edges']} edges."
+    )
+
+
+# ── Schema ────────────────────────────────────────────────────
+
+def add_missing_columns():
+    """
+    Add model columns that existing tables lack. create_all only creates
+    missing tables, so a database made by an older release keeps its old
+    columns until this runs. Each column is added with its scalar default,
+    and NOT NULL only when it has one. Safe to run repeatedly. Returns the
+    "table.column" names added.
+    """
+    engine = db.engine
+    dialect = engine.dialect
+    quote = dialect.identifier_preparer.quote
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect)}"
+                default = column.default
+                if default is not None and default.is_scalar:
+                    value = literal(default.arg, column.type).compile(
+                        dialect=dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    ddl += f" DEFAULT {value}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def backfill_runtime_indexes():
+    """Build the runtime index of published versions that predate it. Returns how many were built."""
+    missing = (
+        db.session.query(FlowVersion.id)
+        .filter(FlowVersion.status == "published", FlowVersion.runtime_index.is_(None))
+        .all()
+    )
+    for (version_id,) in missing:
+        FlowVersion.query.filter_by(id=version_id).update(
+            {"runtime_index": build_runtime_index(load_graph(version_id))}, synchronize_session=False
+        )
+        db.session.commit()
+    return len(missing)
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Create missing tables and columns, and fill in data older releases did not store."""
+    db.create_all()
+    for name in add_missing_columns():
+        click.echo(f"Added column {name}.")
+    if built := backfill_runtime_indexes():
+        click.echo(f"Built the runtime index of {built} published versions.")
+    click.echo("Database tables are in place.")
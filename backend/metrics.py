@@ -0,0 +1,247 @@
+"""
+Process-local request, database and AI provider metrics in Prometheus text format.
+
+metrics.init_app(app) times every request per blueprint and route (the URL
+rule, so flow ids do not multiply series), counts the SQL statements each
+one runs and the time they take (SQLAlchemy cursor events), measures how
+long connections wait to be checked out of the pool, and records response
+sizes. providers.track() reports AI call latency here too. GET /metrics
+renders it all.
+
+Everything is recorded at teardown, so streamed responses (SSE) count their
+whole stream. Statements issued outside a request, by background jobs, are
+recorded under route "background". Recording is a few dict updates under
+one lock per request, cheap enough to leave on in production.
+
+Each worker process keeps its own numbers; scrape every worker, or run one
+worker per scrape target.
+"""
+import threading
+import time
+from bisect import bisect_left
+from flask import request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.series = {}
+
+    def inc(self, values=(), amount=1):
+        self.series[values] = self.series.get(values, 0) + amount
+
+    def render(self):
+        for values, total in sorted(self.series.items()):
+            yield f"{self.name}{_labels(self.labels, values)} {_number(total)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.series = {}   # label values -> [per-bucket counts (last is +Inf), sum, count]
+
+    def observe(self, values, value):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        for values, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {count}"
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._engines = []
+        route = ("blueprint", "route")
+        self.requests = Counter("http_requests_total", "Requests handled.", route + ("method", "status"))
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Request time, including any streamed body.",
+            LATENCY_BUCKETS, route + ("method",),
+        )
+        self.response_size = Histogram(
+            "http_response_size_bytes", "Response body size; streamed responses are not included.",
+            SIZE_BUCKETS, route,
+        )
+        self.statements = Counter("db_statements_total", "SQL statements executed.", route)
+        self.statements_per_request = Histogram(
+            "db_statements_per_request", "SQL statements executed per request.", STATEMENT_BUCKETS, route,
+        )
+        self.db_time = Histogram(
+            "db_time_per_request_seconds", "Time spent executing SQL per request.", LATENCY_BUCKETS, route,
+        )
+        self.pool_wait = Histogram(
+            "db_pool_checkout_wait_seconds", "Time to get a connection from the pool.", WAIT_BUCKETS, ("engine",),
+        )
+        self.provider_latency = Histogram(
+            "ai_provider_call_duration_seconds", "AI provider call time, failures included.",
+            LATENCY_BUCKETS, ("provider", "outcome"),
+        )
+        self.read_routing = Counter(
+            "db_read_routing_total", "Replica-eligible requests by the database that served them, and why.",
+            ("target", "reason"),
+        )
+        self.cache_lookups = Counter(
+            "cache_lookups_total", "Cache lookups by namespace and where they were answered (local, shared, miss).",
+            ("namespace", "result"),
+        )
+        self.cache_evictions = Counter(
+            "cache_evictions_total", "Cache entries dropped, by namespace and reason.", ("namespace", "reason"),
+        )
+        self._all = (
+            self.requests, self.latency, self.response_size, self.statements,
+            self.statements_per_request, self.db_time, self.pool_wait, self.provider_latency,
+            self.read_routing, self.cache_lookups, self.cache_evictions,
+        )
+
+    def init_app(self, app, engine):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        self.instrument_engine(engine, "primary")
+
+    def instrument_engine(self, engine, name):
+        """Count statements run on engine and time its pool checkouts."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        pool = engine.pool
+        connect = pool.connect
+
+        # The pool has no event before a checkout starts, so its connect() is wrapped
+        def timed_connect():
+            start = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.pool_wait.observe((name,), elapsed)
+
+        pool.connect = timed_connect
+        self._engines.append((name, engine))
+
+    # ── Request hooks ─────────────────────────────────────────
+
+    # Per-request state lives in a thread local rather than flask.g, since the
+    # SQL hooks run for every statement and must stay cheap
+
+    def _before_request(self):
+        self._local.request = [time.perf_counter(), 0, 0.0, None, None]   # start, statements, SQL s, status, size
+
+    def _after_request(self, response):
+        state = getattr(self._local, "request", None)
+        if state is not None:
+            state[3] = response.status_code
+            state[4] = None if response.is_streamed else response.content_length
+        return response
+
+    def _teardown_request(self, exc):
+        state = getattr(self._local, "request", None)
+        if state is None:
+            return
+        self._local.request = None
+        start, statements, sql_seconds, status, size = state
+        elapsed = time.perf_counter() - start
+        rule = request.url_rule
+        route = (request.blueprint or "app", rule.rule if rule else "unmatched")
+        with self._lock:
+            self.requests.inc(route + (request.method, status or 500))
+            self.latency.observe(route + (request.method,), elapsed)
+            if size is not None:
+                self.response_size.observe(route, size)
+            self.statements.inc(route, statements)
+            self.statements_per_request.observe(route, statements)
+            self.db_time.observe(route, sql_seconds)
+
+    # ── SQL hooks ─────────────────────────────────────────────
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - self._local.start
+        state = getattr(self._local, "request", None)
+        if state is not None:
+            state[1] += 1
+            state[2] += elapsed
+        else:
+            with self._lock:
+                self.statements.inc(("", "background"))
+
+    # ── AI providers ──────────────────────────────────────────
+
+    def observe_provider(self, provider, seconds, failed):
+        with self._lock:
+            self.provider_latency.observe((provider, "error" if failed else "ok"), seconds)
+
+    # ── Read replica ──────────────────────────────────────────
+
+    def observe_read_routing(self, target, reason):
+        with self._lock:
+            self.read_routing.inc((target, reason))
+
+    # ── Shared cache ──────────────────────────────────────────
+
+    def observe_cache(self, namespace, result):
+        with self._lock:
+            self.cache_lookups.inc((namespace, result))
+
+    def observe_cache_eviction(self, namespace, reason, count=1):
+        with self._lock:
+            self.cache_evictions.inc((namespace, reason), count)
+
+    # ── Exposition ────────────────────────────────────────────
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric in self._all:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.render())
+        lines.append("# HELP db_pool_connections_in_use Connections currently checked out of the pool.")
+        lines.append("# TYPE db_pool_connections_in_use gauge")
+        for name, engine in self._engines:
+            checked_out = getattr(engine.pool, "checkedout", None)
+            if checked_out:
+                lines.append(f'db_pool_connections_in_use{{engine="{name}"}} {checked_out()}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
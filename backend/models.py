@@ -13,54 +13,92 @@ class Flow(db.Model):
     tags = db.Column(db.JSON, nullable=True, default=list)
     active_version_id = db.Column(db.String(36), nullable=True)
     is_archived = db.Column(db.Boolean, default=False, nullable=False)
+    # Set when a permanent delete is queued; the flow is hidden while its rows are purged
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    # Bumped on every write that changes what the API returns for this row (used for ETags)
+    revision = db.Column(db.Integer, nullable=False, default=1)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def to_dict(self, include_stats=False):
-        all_versions = (
-            FlowVersion.query
-            .filter_by(flow_id=self.id)
-            .order_by(FlowVersion.version_number.desc())
-            .all()
-        )
-        data = {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "category": self.category,
-            "tags": self.tags or [],
-            "active_version_id": self.active_version_id,
-            "is_archived": self.is_archived,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            "versions": [
-                {"id": v.id, "status": v.status, "version_number": v.version_number}
-                for v in all_versions
-            ],
-        }
-        if include_stats:
-            version_ids = [v.id for v in all_versions]
-            sessions = (
-                Session.query.filter(Session.flow_version_id.in_(version_ids)).all()
-                if version_ids else []
-            )
-            completed = [s for s in sessions if s.status == "completed"]
-            data["stats"] = {
-                "total_sessions": len(sessions),
-                "completed_sessions": len(completed),
-                "avg_duration_seconds": (
-                    round(
-                        sum(s.duration_seconds for s in completed if s.duration_seconds)
-                        / len(completed)
-                    )
-                    if completed else None
-                ),
-                "node_count": (
-                    Node.query.filter(Node.flow_version_id.in_(version_ids)).count()
-                    if version_ids else 0
-                ),
+        return Flow.to_dicts([self], include_stats)[0]
+
+    @staticmethod
+    def to_dicts(flows, include_stats=False):
+        """Serialize a page of flows with one query for versions and two for stats, however many flows."""
+        flow_ids = [f.id for f in flows]
+        versions = {flow_id: [] for flow_id in flow_ids}
+        if flow_ids:
+            for v in (
+                FlowVersion.query
+                .filter(FlowVersion.flow_id.in_(flow_ids))
+                .order_by(FlowVersion.version_number.desc())
+                .all()
+            ):
+                versions[v.flow_id].append(v)
+        stats = _flow_stats(flow_ids) if include_stats else {}
+
+        result = []
+        for flow in flows:
+            data = {
+                "id": flow.id,
+                "name": flow.name,
+                "description": flow.description,
+                "category": flow.category,
+                "tags": flow.tags or [],
+                "active_version_id": flow.active_version_id,
+                "is_archived": flow.is_archived,
+                "created_at": flow.created_at,
+                "updated_at": flow.updated_at,
+                "versions": [
+                    {"id": v.id, "status": v.status, "version_number": v.version_number}
+                    for v in versions[flow.id]
+                ],
             }
-        return data
+            if include_stats:
+                data["stats"] = stats[flow.id]
+            result.append(data)
+        return result
+
+
+def _flow_stats(flow_ids):
+    """Session and node counts per flow, across all of its versions, aggregated in SQL."""
+    stats = {
+        flow_id: {
+            "total_sessions": 0, "completed_sessions": 0, "avg_duration_seconds": None, "node_count": 0,
+        }
+        for flow_id in flow_ids
+    }
+    if not flow_ids:
+        return stats
+    completed = Session.status == "completed"
+    sessions = (
+        db.session.query(
+            FlowVersion.flow_id,
+            db.func.count(Session.id),
+            db.func.sum(db.case((completed, 1), else_=0)),
+            db.func.sum(db.case((completed, db.func.coalesce(Session.duration_seconds, 0)), else_=0)),
+        )
+        .join(Session, Session.flow_version_id == FlowVersion.id)
+        .filter(FlowVersion.flow_id.in_(flow_ids))
+        .group_by(FlowVersion.flow_id)
+    )
+    for flow_id, total, n_completed, duration in sessions:
+        stats[flow_id].update({
+            "total_sessions": total,
+            "completed_sessions": n_completed or 0,
+            # Completed sessions without a duration count towards the average as zero
+            "avg_duration_seconds": round(duration / n_completed) if n_completed else None,
+        })
+    nodes = (
+        db.session.query(FlowVersion.flow_id, db.func.count(Node.id))
+        .join(Node, Node.flow_version_id == FlowVersion.id)
+        .filter(FlowVersion.flow_id.in_(flow_ids))
+        .group_by(FlowVersion.flow_id)
+    )
+    for flow_id, count in nodes:
+        stats[flow_id]["node_count"] = count
+    return stats
 
 
 class FlowVersion(db.Model):
@@ -72,6 +110,10 @@ class FlowVersion(db.Model):
     status = db.Column(db.String(20), nullable=False, default="draft")
     graph_data = db.Column(db.JSON, nullable=False, default=lambda: {"nodes": [], "edges": []})
     change_notes = db.Column(db.Text, nullable=True)
+    # Derived lookups (depth to nearest result, reachable results) computed at publish
+    runtime_index = db.Column(db.JSON, nullable=True)
+    # Bumped on any node/edge write within the version
+    revision = db.Column(db.Integer, nullable=False, default=1)
     published_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -82,8 +124,8 @@ class FlowVersion(db.Model):
             "version_number": self.version_number,
             "status": self.status,
             "change_notes": self.change_notes,
-            "published_at": self.published_at.isoformat() if self.published_at else None,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "published_at": self.published_at,
+            "created_at": self.created_at,
         }
         if include_graph:
             data["graph_data"] = self.graph_data
@@ -156,6 +198,7 @@ class Session(db.Model):
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     duration_seconds = db.Column(db.Integer, nullable=True)
+    revision = db.Column(db.Integer, nullable=False, default=1)
 
     def to_dict(self):
         return {
@@ -171,8 +214,8 @@ class Session(db.Model):
             "final_node_id": self.final_node_id,
             "feedback_rating": self.feedback_rating,
             "feedback_note": self.feedback_note,
-            "started_at": self.started_at.isoformat() if self.started_at else None,
-            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "started_at": self.started_at,
+            "completed_at": self.completed_at,
             "duration_seconds": self.duration_seconds,
         }
 
@@ -198,4 +241,50 @@ class AuditLog(db.Model):
     resource_id = db.Column(db.String(36), nullable=True)
     actor_id = db.Column(db.String(100), nullable=True)
     payload = db.Column(db.JSON, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ReplicationHeartbeat(db.Model):
+    """One row the primary rewrites every few seconds; its age on the replica is the replica's lag."""
+    __tablename__ = "replication_heartbeat"
+
+    id = db.Column(db.Integer, primary_key=True)
+    written_at = db.Column(db.Float, nullable=False)
+
+
+class ChangeEvent(db.Model):
+    """Change feed events for CHANGEFEED_STORE=database, so streams in every worker see every write."""
+    __tablename__ = "change_events"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    channel = db.Column(db.String(100), nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.Float, nullable=False, index=True)
+
+    __table_args__ = (
+        db.Index("ix_change_events_channel_id", "channel", "id"),
+    )
+
+
+class BackgroundJob(db.Model):
+    """Job records for JOB_STORE=database, so every worker sees every job."""
+    __tablename__ = "background_jobs"
+
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    actor_id = db.Column(db.String(100), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    payload = db.Column(db.JSON, nullable=True)
+    progress = db.Column(db.JSON, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_background_jobs_actor_status", "actor_id", "status"),
+        db.Index("ix_background_jobs_kind_status", "kind", "status"),
+    )
@@ -0,0 +1,120 @@
+"""
+Per-request SQL statement counting and N+1 detection.
+
+query_counter.init_app(app, engine) counts the statements each request
+runs. In debug mode (or with QUERY_COUNT_HEADER) the count is returned in
+an X-Query-Count header. When a single statement shape runs
+QUERY_REPEAT_THRESHOLD times or more within one request, which is what a
+query issued per row of a loop looks like, a warning names the route and
+the statement.
+
+query_counter.count() opens the same kind of scope anywhere, for tests and
+bench/query_budget.py:
+
+    with query_counter.count() as scope:
+        client.get(...)
+    assert scope.total <= 5, scope.repeated(2)
+"""
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, request
+from sqlalchemy import event
+
+# Lists of bound parameters, e.g. the expansion of IN (...), collapse so that
+# the same query over a different number of ids has one shape
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_PARAM_LIST_RE = re.compile(r"\(\s*" + _PARAM + r"(?:\s*,\s*" + _PARAM + r")+\s*\)")
+
+
+def statement_shape(statement):
+    return _PARAM_LIST_RE.sub("(...)", " ".join(statement.split()))
+
+
+class QueryScope:
+    def __init__(self):
+        self.total = 0
+        self.statements = Counter()
+
+    def shapes(self):
+        shapes = Counter()
+        for statement, n in self.statements.items():
+            shapes[statement_shape(statement)] += n
+        return shapes
+
+    def repeated(self, threshold):
+        """(shape, times) for every statement shape run at least threshold times, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes().most_common() if n >= threshold]
+
+
+class QueryCounter:
+    def __init__(self):
+        self._local = threading.local()
+        self.header = False
+        self.repeat_threshold = 0
+
+    def init_app(self, app, engine):
+        self.header = app.config.get("QUERY_COUNT_HEADER", False)
+        self.repeat_threshold = app.config.get("QUERY_REPEAT_THRESHOLD", 0)
+        self.instrument_engine(engine)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def instrument_engine(self, engine):
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _scopes(self):
+        scopes = getattr(self._local, "scopes", None)
+        if scopes is None:
+            scopes = self._local.scopes = []
+        return scopes
+
+    @contextmanager
+    def count(self):
+        """Count the statements this thread runs inside the block."""
+        scope = QueryScope()
+        scopes = self._scopes()
+        scopes.append(scope)
+        try:
+            yield scope
+        finally:
+            scopes.remove(scope)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        scopes = getattr(self._local, "scopes", None)
+        if scopes:
+            for scope in scopes:
+                scope.total += 1
+                scope.statements[statement] += 1
+
+    # ── Request hooks ─────────────────────────────────────────
+
+    def _before_request(self):
+        scope = self._local.request = QueryScope()
+        self._scopes().append(scope)
+
+    def _after_request(self, response):
+        scope = getattr(self._local, "request", None)
+        if scope is not None and (self.header or current_app.debug):
+            # Streamed bodies run their statements later; those count only towards the warning
+            response.headers["X-Query-Count"] = str(scope.total)
+        return response
+
+    def _teardown_request(self, exc):
+        scope = getattr(self._local, "request", None)
+        if scope is None:
+            return
+        self._local.request = None
+        self._scopes().remove(scope)
+        if self.repeat_threshold and scope.total >= self.repeat_threshold:
+            for shape, n in scope.repeated(self.repeat_threshold):
+                rule = request.url_rule
+                current_app.logger.warning(
+                    "Possible N+1 on %s %s: statement ran %d times: %s",
+                    request.method, rule.rule if rule else request.path, n, shape[:300],
+                )
+
+
+query_counter = QueryCounter()
@@ -0,0 +1,155 @@
+"""
+Client-side rate limiting for AI providers.
+
+Each provider gets two token buckets, one for requests per minute and one
+for tokens per minute, sized from config. Before a call goes out its prompt
+tokens are estimated and taken from both buckets at once. If either is
+short, the caller waits for the refill, up to AI_RATE_LIMIT_MAX_WAIT
+seconds, instead of sending a request the provider would reject with a 429.
+Past that wait, RateLimited is raised so the route can fall back or report it.
+
+Buckets live in a store. MemoryBucketStore is per process and serves tests
+and single-worker setups. SQLiteBucketStore keeps them in a file every
+worker process on the host opens, with each take done in one IMMEDIATE
+transaction, so the workers share one budget.
+"""
+import math
+import sqlite3
+import threading
+import time
+
+
+class RateLimited(Exception):
+    """A call would exceed the provider budget for longer than we are willing to wait."""
+
+    def __init__(self, provider, retry_after):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(
+            f"Client-side rate_limit for {provider}: budget exhausted, retry in {math.ceil(retry_after)}s"
+        )
+
+
+def estimate_tokens(*texts, output=0):
+    """
+    Rough token count for a prompt: about four characters per token for
+    English, which is what both providers' tokenizers average. output is the
+    completion length to reserve, since TPM budgets count both sides.
+    """
+    return sum(len(t or "") for t in texts) // 4 + 1 + output
+
+
+def _refill(level, updated, capacity, rate, now):
+    return min(capacity, level + (now - updated) * rate)
+
+
+def _take(state, costs, now):
+    """
+    Shared bucket arithmetic. state maps bucket key -> (level, updated);
+    costs maps bucket key -> (capacity, refill per second, amount). Takes every
+    amount or none. Returns (seconds to wait, new state entries).
+    """
+    levels = {}
+    wait = 0.0
+    for key, (capacity, rate, amount) in costs.items():
+        level, updated = state.get(key, (capacity, now))
+        level = _refill(level, updated, capacity, rate, now)
+        levels[key] = level
+        # A request larger than the whole bucket can still go once the bucket is full
+        need = min(amount, capacity)
+        if level < need:
+            wait = max(wait, (need - level) / rate)
+    if wait > 0:
+        return wait, {}
+    return 0.0, {key: (levels[key] - costs[key][2], now) for key in costs}
+
+
+class MemoryBucketStore:
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def take(self, costs, now):
+        with self._lock:
+            wait, changes = _take(self._state, costs, now)
+            self._state.update(changes)
+            return wait
+
+
+class SQLiteBucketStore:
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        if self._db is None:
+            # Autocommit mode so take() controls its own IMMEDIATE transaction
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                " key TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        return self._db
+
+    def take(self, costs, now):
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                keys = list(costs)
+                rows = conn.execute(
+                    f"SELECT key, level, updated FROM rate_buckets WHERE key IN ({','.join('?' * len(keys))})",
+                    keys,
+                ).fetchall()
+                wait, changes = _take({k: (level, updated) for k, level, updated in rows}, costs, now)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_buckets (key, level, updated) VALUES (?, ?, ?)",
+                    [(k, level, updated) for k, (level, updated) in changes.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return wait
+
+
+class RateLimiter:
+    def __init__(self, store=None, max_wait=10.0):
+        self.store = store or MemoryBucketStore()
+        self.max_wait = max_wait
+        self.limits = {}   # provider -> (requests per minute, tokens per minute)
+
+    def configure(self, limits, max_wait=None, path=None):
+        self.limits = {p: lim for p, lim in limits.items() if any(lim)}
+        if max_wait is not None:
+            self.max_wait = max_wait
+        self.store = SQLiteBucketStore(path) if path else MemoryBucketStore()
+
+    def acquire(self, provider, tokens):
+        """
+        Block until one request of about tokens tokens fits the provider's
+        budget. Returns the seconds spent waiting; raises RateLimited if that
+        would exceed max_wait.
+        """
+        rpm, tpm = self.limits.get(provider, (0, 0))
+        costs = {}
+        if rpm:
+            costs[f"{provider}:requests"] = (rpm, rpm / 60.0, 1)
+        if tpm:
+            costs[f"{provider}:tokens"] = (tpm, tpm / 60.0, tokens)
+        if not costs:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            wait = self.store.take(costs, time.time())
+            if not wait:
+                return waited
+            if waited + wait > self.max_wait:
+                raise RateLimited(provider, wait)
+            time.sleep(wait)
+            waited += wait
+
+
+limiter = RateLimiter()
@@ -0,0 +1,160 @@
+"""
+Read replica routing for analytics, listings and exports.
+
+With DATABASE_REPLICA_URL set, views marked @replica.reads run their
+SELECTs on the replica (through extensions.RoutingSession); every other
+view, and every write, uses the primary. A marked view still reads the
+primary when:
+
+- the client wrote something in the last REPLICA_READ_YOUR_WRITES_SECONDS,
+  so an agent who just finished a session finds it in the listing. Within
+  a worker clients are told apart by X-Actor-Id (or address); across
+  workers a short-lived cookie carries the same deadline.
+- the replica is more than REPLICA_MAX_LAG_SECONDS behind, or cannot be
+  read. The primary rewrites the replication_heartbeat row at most every
+  REPLICA_HEARTBEAT_SECONDS while replica reads are wanted, and the row's
+  age as read back from the replica is the lag.
+
+Marked views answer with X-Read-Source (replica or primary), and /metrics
+counts the decisions in db_read_routing_total.
+
+Two local databases are enough to try it: point DATABASE_REPLICA_URL at a
+copy of the primary (`sqlite3 primary.db ".backup replica.db"`, or
+`createdb -T guided guided_replica` for Postgres). Listings read the copy
+until its heartbeat is REPLICA_MAX_LAG_SECONDS old, then the primary again
+until the copy is refreshed.
+"""
+import logging
+import threading
+import time
+from flask import current_app, g, request
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from extensions import db
+from metrics import metrics
+from models import ReplicationHeartbeat
+
+log = logging.getLogger(__name__)
+
+COOKIE = "read_primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+MAX_TRACKED_WRITERS = 10000
+
+
+def _actor():
+    return request.headers.get("X-Actor-Id") or f"ip:{request.remote_addr}"
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.max_lag = 5.0
+        self.heartbeat_interval = 1.0
+        self.read_your_writes = 10.0
+        self.primary = self.engine = None
+        self._lag = None          # seconds behind the primary; None when unreadable
+        self._checked_at = 0.0
+        self._check_lock = threading.Lock()
+        self._writers_lock = threading.Lock()
+        self._writers = {}        # actor -> time until which it reads the primary
+
+    def init_app(self, app):
+        if "replica" not in app.config["SQLALCHEMY_BINDS"]:
+            return
+        self.max_lag = app.config["REPLICA_MAX_LAG_SECONDS"]
+        self.heartbeat_interval = app.config["REPLICA_HEARTBEAT_SECONDS"]
+        self.read_your_writes = app.config["REPLICA_READ_YOUR_WRITES_SECONDS"]
+        with app.app_context():
+            self.primary, self.engine = db.engines[None], db.engines["replica"]
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @staticmethod
+    def reads(view):
+        """Mark a view that only reads, and may read slightly stale data from the replica."""
+        view.replica_reads = True
+        return view
+
+    # ── Lag ───────────────────────────────────────────────────
+
+    def lag(self):
+        """Seconds the replica is behind, or None when it cannot be read. Re-measured every heartbeat interval."""
+        if time.time() - self._checked_at >= self.heartbeat_interval:
+            # One thread measures; the rest carry on with the previous answer
+            if self._check_lock.acquire(blocking=False):
+                try:
+                    self._lag = self._measure()
+                    self._checked_at = time.time()
+                finally:
+                    self._check_lock.release()
+        return self._lag
+
+    def _measure(self):
+        table = ReplicationHeartbeat.__table__
+        now = time.time()
+        try:
+            with self.primary.begin() as conn:
+                if not conn.execute(update(table).where(table.c.id == 1).values(written_at=now)).rowcount:
+                    conn.execute(insert(table).values(id=1, written_at=now))
+        except SQLAlchemyError as e:
+            log.warning("Could not write the replication heartbeat: %s", e)
+        try:
+            with self.engine.connect() as conn:
+                written_at = conn.execute(select(table.c.written_at).where(table.c.id == 1)).scalar()
+        except SQLAlchemyError as e:
+            log.warning("Replica unreadable, reading from the primary: %s", e)
+            return None
+        return None if written_at is None else max(0.0, now - written_at)
+
+    # ── Request hooks ─────────────────────────────────────────
+
+    def _wrote_recently(self):
+        try:
+            until = float(request.cookies.get(COOKIE, 0))
+        except ValueError:
+            until = 0.0
+        with self._writers_lock:
+            until = max(until, self._writers.get(_actor(), 0.0))
+        return until > time.time()
+
+    def _before_request(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if not getattr(view, "replica_reads", False):
+            return
+        if self._wrote_recently():
+            reason = "recent_write"
+        elif (lag := self.lag()) is None:
+            reason = "unavailable"
+        elif lag > self.max_lag:
+            reason = "lagging"
+        else:
+            reason = "ok"
+        g.read_source = "replica" if reason == "ok" else "primary"
+        if g.read_source == "replica":
+            db.session.info["read_engine"] = self.engine
+        metrics.observe_read_routing(g.read_source, reason)
+
+    def _after_request(self, response):
+        if source := g.get("read_source"):
+            response.headers["X-Read-Source"] = source
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            now = time.time()
+            until = now + self.read_your_writes
+            with self._writers_lock:
+                if len(self._writers) >= MAX_TRACKED_WRITERS:
+                    self._writers = {a: t for a, t in self._writers.items() if t > now}
+                self._writers[_actor()] = until
+            response.set_cookie(
+                COOKIE, str(int(until) + 1), max_age=int(self.read_your_writes) + 1,
+                httponly=True, samesite="Lax",
+            )
+        return response
+
+    def _teardown_request(self, exc):
+        if g.get("read_source") == "replica":
+            # End the replica transaction too, so the next request starts from a fresh snapshot
+            db.session.info.pop("read_engine", None)
+            db.session.close()
+
+
+replica = ReplicaRouter()
@@ -1,11 +1,16 @@
-from flask import request, jsonify
+import hashlib
+from flask import request, jsonify, make_response, has_request_context
 from extensions import db
 from models import AuditLog
 
 
-def audit(action, resource_type=None, resource_id=None, payload=None):
-    """Write an audit log entry. Committed with the next db.session.commit()."""
-    actor = request.headers.get("X-Actor-Id")
+def audit(action, resource_type=None, resource_id=None, payload=None, actor=None):
+    """
+    Write an audit log entry. Committed with the next db.session.commit().
+    The actor defaults to the request's X-Actor-Id; background jobs pass their own.
+    """
+    if actor is None and has_request_context():
+        actor = request.headers.get("X-Actor-Id")
     db.session.add(AuditLog(
         action=action,
         resource_type=resource_type,
@@ -39,4 +44,35 @@ def validate_required(data, *fields):
     return None
 
 
+def bump_revision(model, resource_id):
+    """Increment a row's revision counter in SQL, so concurrent writers never lose a bump."""
+    model.query.filter_by(id=resource_id).update(
+        {model.revision: model.revision + 1}, synchronize_session=False
+    )
+
+
+def make_etag(*parts):
+    """Collapse cheap version markers (ids, revisions, counts) into a short opaque tag."""
+    raw = "|".join(str(p) for p in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+
+def not_modified(etag, weak=False):
+    """
+    Return a 304 response if the request's If-None-Match already covers etag,
+    otherwise None. Call before loading or serializing anything heavy.
+    """
+    if request.if_none_match.contains_weak(etag):
+        resp = make_response("", 304)
+        return with_etag(resp, etag, weak)
+    return None
+
+
+def with_etag(resp, etag, weak=False):
+    """Attach an ETag and force clients to revalidate rather than reuse stale copies."""
+    resp.set_etag(etag, weak=weak)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
 VALID_NODE_TYPES = {"question", "result"}
\ No newline at end of file
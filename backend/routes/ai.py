@@ -1,20 +1,17 @@
 import re
-import json
-from flask import Blueprint, request, jsonify, current_app
+import hashlib
+import math
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from extensions import db
+import json_provider
 from routes import audit
-
-try:
-    from google import genai as _genai
-    from google.genai import types as _genai_types
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-
-try:
-    from groq import Groq as _Groq
-    GROQ_AVAILABLE = True
-except ImportError:
-    GROQ_AVAILABLE = False
+from jobs import runner, JobLimitExceeded
+from rate_limit import RateLimited, estimate_tokens
+from ai_cache import generation_cache, cache_key
+from ai_json import IncrementalParser, parse_tolerant
+from ai_providers import (  # noqa: F401 — provider_available is re-exported for routes.flows
+    providers, gemini_types, provider_available, fake_providers, GEMINI_AVAILABLE, GROQ_AVAILABLE,
+)
 
 ai_bp = Blueprint("ai", __name__, url_prefix="/api/v1/flows")
 
@@ -93,87 +90,63 @@ Quality rules:
 
 Return ONLY the JSON object. No markdown fences. No explanation."""
 
+# Prefixed to each section of a long description generated in parts
+SECTION_PROMPT = """This is part {part} of {parts} of a longer support process. The other parts are converted separately, so build the flow for this part only.
+{handover}
 
-# ── JSON parser ────────────────────────────────────────────────
+{section}"""
 
-def _parse_ai_json(raw_text):
-    if not raw_text:
-        return None
+SECTION_HANDOVER = 'Where this part hands over to the next part of the process, end that path at a single "result" node titled exactly "CONTINUE".'
 
-    text = raw_text.strip()
-    text = re.sub(r'^```(?:json)?\s*', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'\s*```\s*$', '', text).strip()
+# Part of every generation cache key, so editing any prompt invalidates old results
+PROMPT_VERSION = hashlib.sha1(
+    (REWRITE_PROMPT + TEXT_TO_FLOW_PROMPT + SECTION_PROMPT + SECTION_HANDOVER).encode()
+).hexdigest()[:12]
 
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-
-    brace_start = text.find('{')
-    brace_end = text.rfind('}')
-    if brace_start != -1 and brace_end > brace_start:
-        candidate = text[brace_start:brace_end + 1]
-        try:
-            return json.loads(candidate)
-        except json.JSONDecodeError:
-            pass
-        fixed = re.sub(r',\s*([}\]])', r'\1', candidate)
-        try:
-            return json.loads(fixed)
-        except json.JSONDecodeError:
-            pass
-        fixed2 = re.sub(r"(?<![\\])'", '"', fixed)
-        try:
-            return json.loads(fixed2)
-        except json.JSONDecodeError:
-            pass
-
-    if brace_start != -1:
-        candidate = text[brace_start:]
-        depth_curly = depth_square = 0
-        in_string = escape_next = False
-        last_complete_node_end = -1
-
-        for i, ch in enumerate(candidate):
-            if escape_next:
-                escape_next = False
-                continue
-            if in_string:
-                if ch == '\\':
-                    escape_next = True
-                elif ch == '"':
-                    in_string = False
-                continue
-            if ch == '"':
-                in_string = True
-            elif ch == '{':
-                depth_curly += 1
-            elif ch == '}':
-                depth_curly -= 1
-                if depth_curly >= 1 and depth_square == 1:
-                    last_complete_node_end = i
-            elif ch == '[':
-                depth_square += 1
-            elif ch == ']':
-                depth_square -= 1
-
-        attempts = [
-            candidate + (']' * max(0, depth_square)) + ('}' * max(0, depth_curly)),
-        ]
-        if last_complete_node_end > 0:
-            rewound = candidate[:last_complete_node_end + 1].rstrip().rstrip(',')
-            attempts.append(rewound + "]}")
-
-        for attempt in attempts:
-            attempt = re.sub(r',\s*([}\]])', r'\1', attempt)
-            try:
-                result = json.loads(attempt)
-                if isinstance(result, dict) and result.get("nodes"):
-                    return result
-            except json.JSONDecodeError:
-                pass
+# Completion tokens reserved against a provider's TPM budget per call: typical
+# output sizes, not max_tokens, which would leave most of the budget idle
+REWRITE_OUTPUT_TOKENS = 600
+FLOW_OUTPUT_TOKENS = 3000
+SUGGEST_OUTPUT_TOKENS = 300
 
-    return None
+
+def _configured_model(provider, app_config):
+    if provider == "groq":
+        return app_config.get("GROQ_MODEL", "llama-3.3-70b-versatile")
+    return app_config.get("GEMINI_MODEL", "gemini-2.0-flash").replace("models/", "")
+
+
+def _provider_ready(provider, app_config):
+    if provider == "groq":
+        return provider_available("groq", app_config) and bool(app_config.get("GROQ_API_KEY"))
+    return provider_available("gemini", app_config) and bool(app_config.get("GEMINI_API_KEY"))
+
+
+def _hedged_call(provider, call, delay, app_config, accept=None):
+    """
+    Run call(provider), which returns (parsed, model). With AI_HEDGE_ENABLED
+    and the other provider ready, the other one is raced against it after
+    delay seconds. Returns (parsed, model, winning provider, hedge meta).
+    """
+    other = "gemini" if provider == "groq" else "groq"
+    if not app_config.get("AI_HEDGE_ENABLED") or not _provider_ready(other, app_config):
+        parsed, model_used = call(provider)
+        return parsed, model_used, provider, None
+
+    winner, (parsed, model_used), fired = providers.hedge(
+        (provider, lambda: call(provider)),
+        (other, lambda: call(other)),
+        delay,
+        accept or (lambda result: result[0] is not None),
+    )
+    return parsed, model_used, winner, {"requested": provider, "fired": fired, "winner": winner}
+
+
+# ── JSON parser ────────────────────────────────────────────────
+
+def _parse_ai_json(raw_text):
+    """The JSON object in a provider response; truncated output only counts if it has nodes."""
+    return parse_tolerant(raw_text, require="nodes")
 
 
 def _is_truncated(response):
@@ -189,23 +162,30 @@ def _node_count_seems_low(parsed, description):
     return len(description.split()) > 60 and node_count < 5
 
 
+def _normalize_node(node, i):
+    raw_id = node.get("id")
+    node["id"] = str(raw_id) if raw_id is not None else str(i)
+    node.setdefault("title", f"Step {i + 1}")
+    node["type"] = "result" if node.get("type") == "result" else "question"
+    node.setdefault("body", "")
+    node.setdefault("resolution", "")
+    node.setdefault("is_start", False)
+    node.setdefault("position", {"x": (i % 4) * 300 + 60, "y": (i // 4) * 180 + 60})
+    pos = node["position"]
+    if not isinstance(pos, dict):
+        pos = node["position"] = {}
+    if not isinstance(pos.get("x"), (int, float)):
+        pos["x"] = (i % 4) * 300 + 60
+    if not isinstance(pos.get("y"), (int, float)):
+        pos["y"] = (i // 4) * 180 + 60
+    return node
+
+
 def _normalize_nodes_and_edges(nodes, edges):
     warnings = []
 
     for i, node in enumerate(nodes):
-        raw_id = node.get("id")
-        node["id"] = str(raw_id) if raw_id is not None else str(i)
-        node.setdefault("title", f"Step {i + 1}")
-        node["type"] = "result" if node.get("type") == "result" else "question"
-        node.setdefault("body", "")
-        node.setdefault("resolution", "")
-        node.setdefault("is_start", False)
-        node.setdefault("position", {"x": (i % 4) * 300 + 60, "y": (i // 4) * 180 + 60})
-        pos = node["position"]
-        if not isinstance(pos.get("x"), (int, float)):
-            pos["x"] = (i % 4) * 300 + 60
-        if not isinstance(pos.get("y"), (int, float)):
-            pos["y"] = (i // 4) * 180 + 60
+        _normalize_node(node, i)
 
     start_nodes = [n for n in nodes if n.get("is_start")]
     if not start_nodes and nodes:
@@ -243,23 +223,24 @@ def _normalize_nodes_and_edges(nodes, edges):
 
 def _rewrite_description_gemini(description, app_config, logger):
     """Use Gemini to rewrite the user's input into a branching narrative."""
-    api_key = app_config.get("GEMINI_API_KEY")
     model = app_config.get("GEMINI_MODEL", "gemini-2.0-flash").replace("models/", "")
-    client = _genai.Client(api_key=api_key)
 
     try:
-        response = client.models.generate_content(
-            model=model,
-            contents=(
-                "Rewrite this support process description into a clear branching narrative:\n\n"
-                + description
-            ),
-            config=_genai_types.GenerateContentConfig(
-                system_instruction=REWRITE_PROMPT,
-                temperature=0.1,
-                max_output_tokens=2048,
-            ),
-        )
+        client = providers.gemini(app_config)
+        tokens = estimate_tokens(REWRITE_PROMPT, description, output=REWRITE_OUTPUT_TOKENS)
+        with providers.track("gemini", tokens=tokens):
+            response = client.models.generate_content(
+                model=model,
+                contents=(
+                    "Rewrite this support process description into a clear branching narrative:\n\n"
+                    + description
+                ),
+                config=gemini_types(app_config).GenerateContentConfig(
+                    system_instruction=REWRITE_PROMPT,
+                    temperature=0.1,
+                    max_output_tokens=2048,
+                ),
+            )
         rewritten = (response.text or "").strip()
         if rewritten and len(rewritten) > 20:
             logger.info(
@@ -275,26 +256,27 @@ def _rewrite_description_gemini(description, app_config, logger):
 
 def _rewrite_description_groq(description, app_config, logger):
     """Use Groq to rewrite the user's input into a branching narrative."""
-    api_key = app_config.get("GROQ_API_KEY")
     model = app_config.get("GROQ_MODEL", "llama-3.3-70b-versatile")
-    client = _Groq(api_key=api_key)
 
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": REWRITE_PROMPT},
-                {
-                    "role": "user",
-                    "content": (
-                        "Rewrite this support process description into a clear branching narrative:\n\n"
-                        + description
-                    ),
-                },
-            ],
-            temperature=0.1,
-            max_tokens=2048,
-        )
+        client = providers.groq(app_config)
+        tokens = estimate_tokens(REWRITE_PROMPT, description, output=REWRITE_OUTPUT_TOKENS)
+        with providers.track("groq", tokens=tokens):
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": REWRITE_PROMPT},
+                    {
+                        "role": "user",
+                        "content": (
+                            "Rewrite this support process description into a clear branching narrative:\n\n"
+                            + description
+                        ),
+                    },
+                ],
+                temperature=0.1,
+                max_tokens=2048,
+            )
         rewritten = (response.choices[0].message.content or "").strip()
         if rewritten and len(rewritten) > 20:
             logger.info(
@@ -330,9 +312,9 @@ def _rewrite_description(description, provider, app_config, logger):
         looks_like_list, has_branching,
     )
 
-    if provider == "groq" and GROQ_AVAILABLE and app_config.get("GROQ_API_KEY"):
+    if provider == "groq" and _provider_ready("groq", app_config):
         return _rewrite_description_groq(description, app_config, logger)
-    elif GEMINI_AVAILABLE and app_config.get("GEMINI_API_KEY"):
+    elif _provider_ready("gemini", app_config):
         return _rewrite_description_gemini(description, app_config, logger)
 
     # No provider available — use original as-is
@@ -342,27 +324,29 @@ def _rewrite_description(description, provider, app_config, logger):
 # ── Provider implementations ───────────────────────────────────
 
 def _generate_with_gemini(description, app_config, logger):
-    if not GEMINI_AVAILABLE:
+    if not provider_available("gemini", app_config):
         raise RuntimeError("google-genai not installed. Run: pip install google-genai")
     api_key = app_config.get("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY not configured. Add it to your .env file.")
 
     model = app_config.get("GEMINI_MODEL", "gemini-2.0-flash")
-    client = _genai.Client(api_key=api_key)
+    client = providers.gemini(app_config)
     model_id = model.replace("models/", "")
 
     def _call(prompt, temperature=0.2):
-        return client.models.generate_content(
-            model=model_id,
-            contents=prompt,
-            config=_genai_types.GenerateContentConfig(
-                system_instruction=TEXT_TO_FLOW_PROMPT,
-                temperature=temperature,
-                max_output_tokens=16384,
-                response_mime_type="application/json",
-            ),
-        )
+        tokens = estimate_tokens(TEXT_TO_FLOW_PROMPT, prompt, output=FLOW_OUTPUT_TOKENS)
+        with providers.track("gemini", tokens=tokens):
+            return client.models.generate_content(
+                model=model_id,
+                contents=prompt,
+                config=gemini_types(app_config).GenerateContentConfig(
+                    system_instruction=TEXT_TO_FLOW_PROMPT,
+                    temperature=temperature,
+                    max_output_tokens=16384,
+                    response_mime_type="application/json",
+                ),
+            )
 
     response = _call(
         f"Convert this flow description into a structured JSON flow:\n\n{description}"
@@ -396,26 +380,28 @@ def _generate_with_gemini(description, app_config, logger):
 
 
 def _generate_with_groq(description, app_config, logger):
-    if not GROQ_AVAILABLE:
+    if not provider_available("groq", app_config):
         raise RuntimeError("groq not installed. Run: pip install groq")
     api_key = app_config.get("GROQ_API_KEY")
     if not api_key:
         raise RuntimeError("GROQ_API_KEY not configured. Add it to your .env file.")
 
     model = app_config.get("GROQ_MODEL", "llama-3.3-70b-versatile")
-    client = _Groq(api_key=api_key)
+    client = providers.groq(app_config)
 
     def _call(prompt, temperature=0.2):
-        return client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": TEXT_TO_FLOW_PROMPT},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=temperature,
-            max_tokens=8192,
-            response_format={"type": "json_object"},
-        )
+        tokens = estimate_tokens(TEXT_TO_FLOW_PROMPT, prompt, output=FLOW_OUTPUT_TOKENS)
+        with providers.track("groq", tokens=tokens):
+            return client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": TEXT_TO_FLOW_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=temperature,
+                max_tokens=8192,
+                response_format={"type": "json_object"},
+            )
 
     response = _call(
         f"Convert this flow description into a structured JSON flow:\n\n{description}"
@@ -443,6 +429,212 @@ def _generate_with_groq(description, app_config, logger):
     return parsed, model
 
 
+def _stream_with_gemini(description, app_config):
+    """Yield the raw text of a Gemini generation as it arrives."""
+    if not provider_available("gemini", app_config):
+        raise RuntimeError("google-genai not installed. Run: pip install google-genai")
+    if not app_config.get("GEMINI_API_KEY"):
+        raise RuntimeError("GEMINI_API_KEY not configured. Add it to your .env file.")
+
+    client = providers.gemini(app_config)
+    tokens = estimate_tokens(TEXT_TO_FLOW_PROMPT, description, output=FLOW_OUTPUT_TOKENS)
+    with providers.track("gemini", tokens=tokens):
+        for chunk in client.models.generate_content_stream(
+            model=_configured_model("gemini", app_config),
+            contents=f"Convert this flow description into a structured JSON flow:\n\n{description}",
+            config=gemini_types(app_config).GenerateContentConfig(
+                system_instruction=TEXT_TO_FLOW_PROMPT,
+                temperature=0.2,
+                max_output_tokens=16384,
+                response_mime_type="application/json",
+            ),
+        ):
+            if chunk.text:
+                yield chunk.text
+
+
+def _stream_with_groq(description, app_config):
+    """Yield the raw text of a Groq generation as it arrives."""
+    if not provider_available("groq", app_config):
+        raise RuntimeError("groq not installed. Run: pip install groq")
+    if not app_config.get("GROQ_API_KEY"):
+        raise RuntimeError("GROQ_API_KEY not configured. Add it to your .env file.")
+
+    client = providers.groq(app_config)
+    tokens = estimate_tokens(TEXT_TO_FLOW_PROMPT, description, output=FLOW_OUTPUT_TOKENS)
+    with providers.track("groq", tokens=tokens):
+        stream = client.chat.completions.create(
+            model=_configured_model("groq", app_config),
+            messages=[
+                {"role": "system", "content": TEXT_TO_FLOW_PROMPT},
+                {
+                    "role": "user",
+                    "content": f"Convert this flow description into a structured JSON flow:\n\n{description}",
+                },
+            ],
+            temperature=0.2,
+            max_tokens=8192,
+            response_format={"type": "json_object"},
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+# ── Chunked generation for long descriptions ─────────────────
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"[^.!?]+(?:[.!?]+|$)")
+# Sentences that only make sense next to the one before them
+_CONTINUATION_RE = re.compile(r"^(otherwise|else|if not|if that|if this|if it|then)\b", re.I)
+
+
+def _use_sections(description, app_config):
+    min_chars = app_config.get("AI_CHUNKED_MIN_CHARS", 0)
+    return bool(min_chars) and len(description) >= min_chars
+
+
+def _split_sections(text, max_chars, max_sections):
+    """
+    Split a narrative into consecutive sections of about max_chars, breaking
+    at paragraphs where possible and otherwise between sentences, but never
+    before an "otherwise"/"if not" sentence that answers the previous one.
+    """
+    max_chars = max(max_chars, math.ceil(len(text) / max_sections))
+    pieces = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(s.strip() for s in _SENTENCE_RE.findall(paragraph) if s.strip())
+
+    sections, current = [], ""
+    for piece in filter(None, pieces):
+        joined = f"{current} {piece}" if current else piece
+        if current and len(joined) > max_chars and not _CONTINUATION_RE.match(piece):
+            sections.append(current)
+            current = piece
+        else:
+            current = joined
+    if current:
+        sections.append(current)
+    return sections
+
+
+def _stitch_sections(parts):
+    """
+    Join per-section flows, in order, into one. Each section's CONTINUE
+    nodes become edges to the next section's start (or, without any, its
+    last question links there); identical result nodes are merged; sections
+    are stacked vertically. Node and edge fields are left for
+    _normalize_nodes_and_edges to validate.
+    """
+    nodes, edges, warnings = [], [], []
+    explicit = False
+    results = {}   # (title, body) -> id of the result node already kept
+    handovers = []  # (node id, label) to link to the next section's start
+    bottom = 0
+
+    for number, part in enumerate(parts, 1):
+        part_nodes = [n for n in (part or {}).get("nodes") or [] if isinstance(n, dict)]
+        if not part_nodes:
+            warnings.append(f"Part {number} of the description could not be generated and is missing.")
+            continue
+        for i, node in enumerate(part_nodes):
+            _normalize_node(node, i)
+        start_id = next((n for n in part_nodes if n.get("is_start")), part_nodes[0])["id"]
+        top = min(n["position"]["y"] for n in part_nodes)
+
+        ids, continue_ids, last_question = {}, set(), None
+        # A section with no CONTINUE node hands over from its last question
+        for node in part_nodes:
+            # setdefault leaves an explicit null from the model in place
+            title, body = str(node.get("title") or "").strip(), str(node.get("body") or "").strip()
+            if node["type"] == "result" and title.upper() == "CONTINUE":
+                continue_ids.add(node["id"])
+                continue
+            if node["type"] == "result":
+                key = (title.lower(), body.lower())
+                if key in results:
+                    ids[node["id"]] = results[key]
+                    continue
+            new_id = ids[node["id"]] = str(len(nodes))
+            if node["type"] == "result":
+                results[key] = new_id
+            else:
+                last_question = new_id
+            node["is_start"] = not nodes
+            node["position"]["y"] += bottom - top
+            node["id"] = new_id
+            nodes.append(node)
+
+        entry = ids.get(start_id)
+        if entry is not None:
+            edges.extend({"source": source, "target": entry, "label": label} for source, label in handovers)
+        handovers = []
+        for edge in (part or {}).get("edges") or []:
+            source, target = str(edge.get("source")), str(edge.get("target"))
+            if target in continue_ids:
+                if source in ids:
+                    handovers.append((ids[source], edge.get("label") or "continue"))
+                continue
+            # Unknown ids stay unmatched so normalization reports the edge
+            edges.append(dict(
+                edge,
+                source=ids.get(source, f"part{number}:{source}"),
+                target=ids.get(target, f"part{number}:{target}"),
+            ))
+        explicit = bool(handovers)
+        if not handovers and last_question is not None:
+            handovers.append((last_question, "continue"))
+        warnings.extend(part.get("suggestions") or [])
+        bottom = max(n["position"]["y"] for n in nodes) + 200
+
+    if explicit:
+        # The last part handed over to a part that does not exist: those paths end here
+        end_id = str(len(nodes))
+        nodes.append(_normalize_node({
+            "id": end_id, "title": "Process complete", "type": "result",
+            "body": "The process is complete. Confirm the outcome with the customer and close the ticket.",
+            "position": {"x": 60, "y": bottom},
+        }, len(nodes)))
+        edges.extend({"source": source, "target": end_id, "label": label} for source, label in handovers)
+
+    return {"nodes": nodes, "edges": edges, "suggestions": warnings}
+
+
+def _generate_in_sections(description, provider, app_config, logger):
+    """
+    Generate a long description section by section, all sections at once,
+    and stitch the results. Returns (parsed, model, provider, meta). With
+    AI_CHUNKED_SPREAD and both providers ready, sections alternate between
+    them so neither rate budget takes the whole burst.
+    """
+    sections = _split_sections(
+        description, app_config.get("AI_CHUNK_MAX_CHARS", 1200), app_config.get("AI_CHUNK_MAX_SECTIONS", 6)
+    )
+    other = "gemini" if provider == "groq" else "groq"
+    names = [provider]
+    if app_config.get("AI_CHUNKED_SPREAD") and _provider_ready(other, app_config):
+        names.append(other)
+    generators = {"groq": _generate_with_groq, "gemini": _generate_with_gemini}
+
+    def call(i, section):
+        name = names[i % len(names)]
+        prompt = SECTION_PROMPT.format(
+            part=i + 1, parts=len(sections), section=section,
+            handover=SECTION_HANDOVER if i + 1 < len(sections) else "",
+        )
+        return generators[name](prompt, app_config, logger)
+
+    logger.info("Generating %d chars in %d sections", len(description), len(sections))
+    results = providers.map([lambda i=i, s=s: call(i, s) for i, s in enumerate(sections)])
+    parsed = _stitch_sections([r[0] for r in results])
+    return parsed, results[0][1], provider, {"count": len(sections), "providers": names}
+
+
 # ── Flow suggestion prompt & helpers ──────────────────────────
 
 SUGGEST_PROMPT = """You are a support flow matching engine. Given a customer issue description and a list of published support flows, identify the best matching flow(s).
@@ -481,14 +673,14 @@ Rules:
 
 def _suggest_with_groq(issue, flows_context, app_config, logger):
     """Use Groq to match an issue against published flows and return ranked suggestions."""
-    if not GROQ_AVAILABLE:
+    if not provider_available("groq", app_config):
         raise RuntimeError("groq not installed. Run: pip install groq")
     api_key = app_config.get("GROQ_API_KEY")
     if not api_key:
         raise RuntimeError("GROQ_API_KEY not configured. Add it to your .env file.")
 
     model = app_config.get("GROQ_MODEL", "llama-3.3-70b-versatile")
-    client = _Groq(api_key=api_key)
+    client = providers.groq(app_config)
 
     prompt = (
         f"Customer issue:\n{issue}\n\n"
@@ -496,16 +688,19 @@ def _suggest_with_groq(issue, flows_context, app_config, logger):
         "Return the best matching flow(s) as a JSON object following the specified format."
     )
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": SUGGEST_PROMPT},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.1,
-        max_tokens=1024,
-        response_format={"type": "json_object"},
-    )
+    tokens = estimate_tokens(SUGGEST_PROMPT, prompt, output=SUGGEST_OUTPUT_TOKENS)
+
+    with providers.track("groq", tokens=tokens):
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SUGGEST_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.1,
+            max_tokens=1024,
+            response_format={"type": "json_object"},
+        )
     raw = (response.choices[0].message.content or "").strip()
     logger.info("Groq suggest: model=%s, raw_len=%d", model, len(raw))
     parsed = _parse_ai_json(raw)
@@ -514,14 +709,14 @@ def _suggest_with_groq(issue, flows_context, app_config, logger):
 
 def _suggest_with_gemini(issue, flows_context, app_config, logger):
     """Use Gemini to match an issue against published flows and return ranked suggestions."""
-    if not GEMINI_AVAILABLE:
+    if not provider_available("gemini", app_config):
         raise RuntimeError("google-genai not installed. Run: pip install google-genai")
     api_key = app_config.get("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY not configured. Add it to your .env file.")
 
     model = app_config.get("GEMINI_MODEL", "gemini-2.0-flash").replace("models/", "")
-    client = _genai.Client(api_key=api_key)
+    client = providers.gemini(app_config)
 
     prompt = (
         f"Customer issue:\n{issue}\n\n"
@@ -529,16 +724,19 @@ def _suggest_with_gemini(issue, flows_context, app_config, logger):
         "Return the best matching flow(s) as a JSON object following the specified format."
     )
 
-    response = client.models.generate_content(
-        model=model,
-        contents=prompt,
-        config=_genai_types.GenerateContentConfig(
-            system_instruction=SUGGEST_PROMPT,
-            temperature=0.1,
-            max_output_tokens=1024,
-            response_mime_type="application/json",
-        ),
-    )
+    tokens = estimate_tokens(SUGGEST_PROMPT, prompt, output=SUGGEST_OUTPUT_TOKENS)
+
+    with providers.track("gemini", tokens=tokens):
+        response = client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=gemini_types(app_config).GenerateContentConfig(
+                system_instruction=SUGGEST_PROMPT,
+                temperature=0.1,
+                max_output_tokens=1024,
+                response_mime_type="application/json",
+            ),
+        )
     raw = (response.text or "").strip()
     logger.info("Gemini suggest: model=%s, raw_len=%d", model, len(raw))
     parsed = _parse_ai_json(raw)
@@ -558,7 +756,7 @@ def list_providers():
                 "id": "gemini",
                 "name": "Google Gemini",
                 "model": current_app.config.get("GEMINI_MODEL", "gemini-2.0-flash"),
-                "available": GEMINI_AVAILABLE and gemini_key,
+                "available": provider_available("gemini", current_app.config) and gemini_key,
                 "installed": GEMINI_AVAILABLE,
                 "configured": gemini_key,
             },
@@ -566,86 +764,332 @@ def list_providers():
                 "id": "groq",
                 "name": "Groq",
                 "model": current_app.config.get("GROQ_MODEL", "llama-3.3-70b-versatile"),
-                "available": GROQ_AVAILABLE and groq_key,
+                "available": provider_available("groq", current_app.config) and groq_key,
                 "installed": GROQ_AVAILABLE,
                 "configured": groq_key,
             },
-        ]
+        ],
+        # Responses come from ai_fake, not the real services
+        "fake": fake_providers(current_app.config),
     })
 
 
-@ai_bp.post("/generate-from-text")
-def generate_flow_from_text():
-    """Generate a complete flow from a plain-English description using Gemini or Groq."""
+@ai_bp.get("/providers/stats")
+def provider_stats():
+    """Per-provider call counts, latency and connection-pool state for this worker."""
+    return jsonify(providers.stats())
+
+
+def _read_generate_request():
+    """Validate a generate-from-text body. Returns (description, provider, use_cache, error response)."""
     data = request.get_json(silent=True) or {}
     description = (data.get("description") or "").strip()
     provider = (data.get("provider") or "gemini").lower()
+    use_cache = current_app.config.get("AI_CACHE_ENABLED", True) and data.get("cache", True) is not False
 
+    error = None
     if not description:
-        return jsonify({"error": "Missing description"}), 400
-    if len(description) < 10:
-        return jsonify({"error": "Description too short — please provide more detail."}), 400
-    if len(description) > 5000:
-        return jsonify({"error": "Description too long — please keep it under 5000 characters."}), 400
-    if provider not in ("gemini", "groq"):
-        return jsonify({"error": "Invalid provider. Must be 'gemini' or 'groq'."}), 400
+        error = jsonify({"error": "Missing description"}), 400
+    elif len(description) < 10:
+        error = jsonify({"error": "Description too short — please provide more detail."}), 400
+    elif len(description) > 5000:
+        error = jsonify({"error": "Description too long — please keep it under 5000 characters."}), 400
+    elif provider not in ("gemini", "groq"):
+        error = jsonify({"error": "Invalid provider. Must be 'gemini' or 'groq'."}), 400
+    return description, provider, use_cache, error
+
+
+def _rewrite_cached(description, provider, use_cache, cache_meta, app_config, logger):
+    """Step 1 of generation, through the rewrite cache."""
+    rewrite_key = cache_key(description, provider, _configured_model(provider, app_config), PROMPT_VERSION)
+    rewritten = generation_cache.get("rewrite", rewrite_key) if use_cache else None
+    if rewritten is not None:
+        cache_meta["rewrite"] = "hit"
+        return rewritten
+
+    rewritten = _rewrite_description(description, provider, app_config, logger)
+    if use_cache:
+        cache_meta["rewrite"] = "miss"
+        # An unchanged description means the rewrite was skipped or failed — nothing to keep
+        if rewritten != description:
+            generation_cache.set("rewrite", rewrite_key, rewritten)
+    return rewritten
+
+
+def _provider_error(provider, exc):
+    """Map a provider exception to (message, HTTP status)."""
+    if isinstance(exc, RateLimited):
+        return f"Rate limit reached for {provider}. Please try again in {math.ceil(exc.retry_after)}s.", 429
+    if isinstance(exc, RuntimeError):
+        return str(exc), 503
+    err = str(exc).lower()
+    if "api_key" in err or "api key" in err or "invalid_api_key" in err:
+        return f"Invalid {provider} API key: {exc}", 503
+    if "not_found" in err or "not found" in err or "does_not_exist" in err:
+        return f"Model not available for {provider}: {exc}", 503
+    if "quota" in err or "resource_exhausted" in err or "rate_limit" in err or "429" in err:
+        return f"Rate limit reached for {provider}. Please wait a moment and try again.", 429
+    return f"{provider.capitalize()} error: {exc}", 500
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json_provider.dumps(data)}\n\n"
+
+
+def _generate_flow(description, provider, use_cache, app_config, logger, job=None, actor=None):
+    """
+    Rewrite, generate and normalize a flow. Returns (response body, HTTP status).
+    Run as a job, it reports its stage and stops at the next step once cancelled.
+    """
+    model = _configured_model(provider, app_config)
+    cache_meta = {"rewrite": "bypass", "graph": "bypass"}
+    hedge = sections = None
 
     # ── Step 1: Preprocess — normalise any input style into a branching narrative ──
-    rewritten = _rewrite_description(
-        description, provider, current_app.config, current_app.logger
-    )
+    if job:
+        job.update(stage="rewriting")
+    rewritten = _rewrite_cached(description, provider, use_cache, cache_meta, app_config, logger)
 
     # ── Step 2: Generate the structured flow from the cleaned description ─────────
-    try:
-        if provider == "groq":
-            parsed, model_used = _generate_with_groq(
-                rewritten, current_app.config, current_app.logger
-            )
-        else:
-            parsed, model_used = _generate_with_gemini(
-                rewritten, current_app.config, current_app.logger
-            )
-
-    except RuntimeError as exc:
-        return jsonify({"error": str(exc)}), 503
-    except Exception as exc:
-        err = str(exc).lower()
-        current_app.logger.error("%s error: %s", provider, exc)
-        if "api_key" in err or "api key" in err or "invalid_api_key" in err:
-            return jsonify({"error": f"Invalid {provider} API key: {exc}"}), 503
-        if "not_found" in err or "not found" in err or "does_not_exist" in err:
-            return jsonify({"error": f"Model not available for {provider}: {exc}"}), 503
-        if "quota" in err or "resource_exhausted" in err or "rate_limit" in err or "429" in err:
-            return jsonify({"error": f"Rate limit reached for {provider}. Please wait a moment and try again."}), 429
-        return jsonify({"error": f"{provider.capitalize()} error: {exc}"}), 500
-
-    if parsed is None:
-        return jsonify({
-            "error": "AI returned malformed JSON. Please try again or rephrase your description."
-        }), 500
-
-    nodes = parsed.get("nodes", [])
-    if not isinstance(nodes, list) or not nodes:
-        return jsonify({
-            "error": "AI could not generate a flow from that description. Try being more specific."
-        }), 422
-
-    nodes, valid_edges, warnings = _normalize_nodes_and_edges(nodes, parsed.get("edges", []))
-    warnings = (parsed.get("suggestions") or []) + warnings
-
-    audit("flow.generate_from_text", payload={
+    if job:
+        job.check_cancelled()
+        job.update(stage="generating")
+    sectioned = _use_sections(rewritten, app_config)
+    graph_key = cache_key(rewritten, provider, model, PROMPT_VERSION + (":sections" if sectioned else ""))
+    cached = generation_cache.get("graph", graph_key) if use_cache else None
+    if cached is not None:
+        cache_meta["graph"] = "hit"
+        nodes, valid_edges = cached["nodes"], cached["edges"]
+        warnings, model_used = cached["suggestions"], cached["model"]
+        provider = cached.get("provider", provider)
+    else:
+        generators = {"groq": _generate_with_groq, "gemini": _generate_with_gemini}
+        try:
+            if sectioned:
+                parsed, model_used, provider, sections = _generate_in_sections(
+                    rewritten, provider, app_config, logger
+                )
+            else:
+                parsed, model_used, provider, hedge = _hedged_call(
+                    provider,
+                    lambda name: generators[name](rewritten, app_config, logger),
+                    app_config.get("AI_HEDGE_DELAY_SECONDS", 8.0),
+                    app_config,
+                    accept=lambda result: bool(result[0] and result[0].get("nodes")),
+                )
+        except Exception as exc:
+            if not isinstance(exc, RuntimeError):
+                logger.error("%s error: %s", provider, exc)
+            message, status = _provider_error(provider, exc)
+            return {"error": message}, status
+
+        if parsed is None:
+            return {
+                "error": "AI returned malformed JSON. Please try again or rephrase your description."
+            }, 500
+
+        nodes = parsed.get("nodes", [])
+        if not isinstance(nodes, list) or not nodes:
+            return {
+                "error": "AI could not generate a flow from that description. Try being more specific."
+            }, 422
+
+        nodes, valid_edges, warnings = _normalize_nodes_and_edges(nodes, parsed.get("edges", []))
+        warnings = (parsed.get("suggestions") or []) + warnings
+
+        if use_cache:
+            cache_meta["graph"] = "miss"
+            generation_cache.set("graph", graph_key, {
+                "nodes": nodes,
+                "edges": valid_edges,
+                "suggestions": warnings,
+                "model": model_used,
+                "provider": provider,
+            })
+
+    if job:
+        # The result is cached either way, but a cancelled job does not deliver it
+        job.check_cancelled()
+    audit("flow.generate_from_text", actor=actor, payload={
         "provider": provider,
         "description_length": len(description),
         "rewritten_length": len(rewritten),
         "node_count": len(nodes),
         "edge_count": len(valid_edges),
+        "cache": cache_meta,
     })
 
-    return jsonify({
+    return {
         "nodes": nodes,
         "edges": valid_edges,
         "suggestions": warnings,
         # Expose the rewritten description so the frontend can optionally show it
         "rewritten_description": rewritten if rewritten != description else None,
-        "meta": {"model": model_used, "provider": provider},
-    })
\ No newline at end of file
+        "meta": {
+            "model": model_used, "provider": provider, "cache": cache_meta, "hedge": hedge, "sections": sections,
+        },
+    }, 200
+
+
+@ai_bp.post("/generate-from-text")
+def generate_flow_from_text():
+    """Generate a complete flow from a plain-English description using Gemini or Groq."""
+    description, provider, use_cache, error = _read_generate_request()
+    if error:
+        return error
+
+    body, status = _generate_flow(
+        description, provider, use_cache, current_app.config, current_app.logger
+    )
+    if status == 200:
+        db.session.commit()   # the audit entry
+    return jsonify(body), status
+
+
+@ai_bp.post("/generate-from-text/jobs")
+def submit_generate_job():
+    """
+    Queue generate-from-text on the job pool and return 202 with the job at
+    once. Poll GET /api/v1/jobs/<id>; on success its result is the body the
+    synchronous endpoint would have returned. Anonymous callers are limited
+    per client address.
+    """
+    description, provider, use_cache, error = _read_generate_request()
+    if error:
+        return error
+
+    app = current_app._get_current_object()
+    actor_id = request.headers.get("X-Actor-Id")
+
+    def run(job):
+        body, status = _generate_flow(
+            description, provider, use_cache, app.config, app.logger, job=job, actor=actor_id
+        )
+        if status != 200:
+            job.update(http_status=status)
+            raise RuntimeError(body["error"])
+        db.session.commit()
+        return body
+
+    try:
+        job = runner.submit(
+            app, "flow.generate", run,
+            payload={"provider": provider, "description_length": len(description)},
+            actor=actor_id or f"ip:{request.remote_addr}",
+        )
+    except JobLimitExceeded as exc:
+        return jsonify({"error": str(exc)}), 429
+    return jsonify(job.to_dict()), 202
+
+
+@ai_bp.post("/generate-from-text/stream")
+def generate_flow_from_text_stream():
+    """
+    generate-from-text over server-sent events. Emits "status" as each stage
+    starts, "node" and "edge" as soon as each is complete in the model output,
+    then either "done" with the same body the non-streaming endpoint returns
+    or "error" with {error, status}. The final body is authoritative: it
+    drops edges to unknown nodes and fixes up start nodes.
+    """
+    description, provider, use_cache, error = _read_generate_request()
+    if error:
+        return error
+
+    config, logger = current_app.config, current_app.logger
+    model = _configured_model(provider, config)
+    streamers = {"groq": _stream_with_groq, "gemini": _stream_with_gemini}
+
+    def generate():
+        cache_meta = {"rewrite": "bypass", "graph": "bypass"}
+        truncated = False
+
+        yield _sse("status", {"stage": "rewriting"})
+        rewritten = _rewrite_cached(description, provider, use_cache, cache_meta, config, logger)
+
+        graph_key = cache_key(rewritten, provider, model, PROMPT_VERSION)
+        cached = generation_cache.get("graph", graph_key) if use_cache else None
+        if cached is not None:
+            cache_meta["graph"] = "hit"
+            nodes, valid_edges = cached["nodes"], cached["edges"]
+            warnings, model_used = cached["suggestions"], cached["model"]
+            used = cached.get("provider", provider)
+            for node in nodes:
+                yield _sse("node", node)
+            for edge in valid_edges:
+                yield _sse("edge", edge)
+        else:
+            yield _sse("status", {"stage": "generating"})
+            parser = IncrementalParser()
+            streamed = 0
+            try:
+                for text in streamers[provider](rewritten, config):
+                    for kind, value in parser.feed(text):
+                        if kind == "node":
+                            _normalize_node(value, streamed)
+                            streamed += 1
+                        yield _sse(kind, value)
+            except Exception as exc:
+                if not isinstance(exc, RuntimeError):
+                    logger.error("%s stream error: %s", provider, exc)
+                message, status = _provider_error(provider, exc)
+                yield _sse("error", {"error": message, "status": status})
+                return
+
+            # A stream cut off mid-object keeps everything completed so far
+            parsed = parser.finish() or {}
+            truncated = not parser.done
+            nodes = parsed.get("nodes")
+            if not isinstance(nodes, list) or not nodes:
+                yield _sse("error", {
+                    "error": "AI could not generate a flow from that description. Try being more specific.",
+                    "status": 422,
+                })
+                return
+
+            nodes, valid_edges, warnings = _normalize_nodes_and_edges(nodes, parsed.get("edges") or [])
+            warnings = (parsed.get("suggestions") or []) + warnings
+            if truncated:
+                warnings.append("The AI response was cut off — the flow may be missing its last steps.")
+            model_used, used = model, provider
+
+            # Truncated output is worth showing once but not worth replaying
+            if use_cache and not truncated:
+                cache_meta["graph"] = "miss"
+                generation_cache.set("graph", graph_key, {
+                    "nodes": nodes,
+                    "edges": valid_edges,
+                    "suggestions": warnings,
+                    "model": model_used,
+                    "provider": used,
+                })
+
+        audit("flow.generate_from_text", payload={
+            "provider": used,
+            "description_length": len(description),
+            "rewritten_length": len(rewritten),
+            "node_count": len(nodes),
+            "edge_count": len(valid_edges),
+            "cache": cache_meta,
+            "stream": True,
+        })
+        # The request's own commit point has passed; stream_with_context keeps the session here
+        db.session.commit()
+
+        yield _sse("done", {
+            "nodes": nodes,
+            "edges": valid_edges,
+            "suggestions": warnings,
+            "rewritten_description": rewritten if rewritten != description else None,
+            "meta": {
+                "model": model_used,
+                "provider": used,
+                "cache": cache_meta,
+                "hedge": None,
+                "truncated": truncated,
+            },
+        })
+
+    resp = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
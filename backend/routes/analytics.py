@@ -4,11 +4,13 @@ from sqlalchemy import func
 from extensions import db
 from models import Flow, FlowVersion, Node, Session, AuditLog
 from routes import paginate_query
+from replica import replica
 
 analytics_bp = Blueprint("analytics", __name__, url_prefix="/api/v1")
 
 
 @analytics_bp.get("/analytics/overview")
+@replica.reads
 def analytics_overview():
     total_flows = Flow.query.filter_by(is_archived=False).count()
     live_flows = Flow.query.filter(
@@ -65,6 +67,7 @@ def analytics_overview():
 
 
 @analytics_bp.get("/analytics/flows/<flow_id>")
+@replica.reads
 def analytics_flow(flow_id):
     Flow.query.get_or_404(flow_id)
     version_ids = [v.id for v in FlowVersion.query.filter_by(flow_id=flow_id).all()]
@@ -82,12 +85,14 @@ def analytics_flow(flow_id):
             result_counts[s.final_node_id] = result_counts.get(s.final_node_id, 0) + 1
 
     top_results = sorted(result_counts.items(), key=lambda x: -x[1])[:10]
+    titles = dict(
+        db.session.query(Node.id, Node.title).filter(Node.id.in_([n for n, _ in top_results])).all()
+    ) if top_results else {}
     top_results_enriched = []
     for node_id, count in top_results:
-        node = Node.query.get(node_id)
         top_results_enriched.append({
             "node_id": node_id,
-            "title": node.title if node else "Unknown",
+            "title": titles.get(node_id, "Unknown"),
             "count": count,
             "pct": round(count / len(completed) * 100, 1) if completed else 0,
         })
@@ -128,6 +133,7 @@ def analytics_flow(flow_id):
 
 
 @analytics_bp.get("/audit-logs")
+@replica.reads
 def list_audit_logs():
     query = AuditLog.query.order_by(AuditLog.created_at.desc())
     if resource_type := request.args.get("resource_type"):
@@ -144,7 +150,7 @@ def list_audit_logs():
             "resource_id": log.resource_id,
             "actor_id": log.actor_id,
             "payload": log.payload,
-            "created_at": log.created_at.isoformat(),
+            "created_at": log.created_at,
         } for log in logs],
         "pagination": pagination,
     })
\ No newline at end of file
@@ -1,12 +1,22 @@
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort, current_app
 from sqlalchemy import func, or_
-from extensions import db
-from models import Flow, FlowVersion, Node, Edge, Session, SessionStep
-from routes import audit, paginate_query, validate_required
+from extensions import db, cache
+from models import Flow, FlowVersion, Node, Edge, Session
+from routes import (
+    audit, paginate_query, validate_required, make_etag, not_modified, with_etag,
+)
+from jobs import maintenance, JobLimitExceeded
+from maintenance import purge_flow
+from flow_index import flow_index
+from replica import replica
+from rate_limit import RateLimited
 
 flows_bp = Blueprint("flows", __name__, url_prefix="/api/v1")
 
+# Flows the local suggest engine scores in full (top match plus alternatives)
+LOCAL_SUGGEST_LIMIT = 3
+
 
 def _copy_version_contents(source_version_id, new_version_id):
     """Copy all nodes and edges from one version to another."""
@@ -38,9 +48,76 @@ def _copy_version_contents(source_version_id, new_version_id):
     return id_map
 
 
+def _listing_marker(query, include_stats=False):
+    """
+    Cheap aggregate that changes whenever any flow matched by query changes:
+    row count plus the sum and max of their revision/update markers.
+    """
+    marker = tuple(query.order_by(None).with_entities(
+        func.count(Flow.id), func.sum(Flow.revision), func.max(Flow.updated_at)
+    ).one())
+    if include_stats:
+        marker += tuple(db.session.query(
+            func.count(Session.id), func.sum(Session.revision)
+        ).one())
+        marker += tuple(db.session.query(
+            func.count(FlowVersion.id), func.sum(FlowVersion.revision)
+        ).one())
+    return marker
+
+
+def _get_flow_or_404(flow_id):
+    """Like get_or_404, but flows queued for permanent deletion no longer exist."""
+    return Flow.query.filter_by(id=flow_id, deleted_at=None).first_or_404()
+
+
+def _flow_marker(flow_id):
+    """Version markers covering everything get_flow returns, including its stats."""
+    revision = db.session.query(Flow.revision).filter_by(id=flow_id, deleted_at=None).scalar()
+    if revision is None:
+        return None
+    versions = db.session.query(
+        func.count(FlowVersion.id), func.sum(FlowVersion.revision)
+    ).filter(FlowVersion.flow_id == flow_id).one()
+    sessions = db.session.query(
+        func.count(Session.id), func.sum(Session.revision)
+    ).join(FlowVersion, FlowVersion.id == Session.flow_version_id).filter(
+        FlowVersion.flow_id == flow_id
+    ).one()
+    return (revision, *versions, *sessions)
+
+
+def _suggest_locally(issue):
+    """
+    Rank published flows in-process, with no LLM round-trip. Returns the same
+    shape the providers do, plus the entries considered (for id validation).
+    """
+    ranked = flow_index.rank(issue, LOCAL_SUGGEST_LIMIT)
+
+    def _match(entry, confidence, terms):
+        return {
+            "flow_id": entry["flow_id"],
+            "flow_name": entry["flow_name"],
+            "active_version_id": entry["active_version_id"],
+            "confidence": confidence,
+            "reasoning": "Matched on " + ", ".join(f"'{t}'" for t in sorted(terms))
+                         + " in this flow's name, description, tags or steps.",
+        }
+
+    # Same cut-offs the LLM prompt asks for
+    top = ranked[0] if ranked and ranked[0][1] >= 0.40 else None
+    parsed = {
+        "no_match": top is None,
+        "top_match": _match(*top) if top else None,
+        "alternatives": [_match(*r) for r in ranked[1:] if r[1] >= 0.30] if top else [],
+    }
+    return parsed, "bm25-local", [r[0] for r in ranked]
+
+
 # ── Flows ─────────────────────────────────────────────────────
 
 @flows_bp.get("/flows")
+@replica.reads
 def list_flows():
     query = Flow.query.filter_by(is_archived=False)
 
@@ -66,13 +143,19 @@ def list_flows():
         query = query.order_by(Flow.created_at.desc())
 
     include_stats = request.args.get("stats") == "1"
+    etag = make_etag(
+        "flows", request.query_string.decode(), *_listing_marker(query, include_stats)
+    )
+    if resp := not_modified(etag, weak=True):
+        return resp
+
     flows, pagination = paginate_query(query)
     resp = jsonify({
-        "data": [f.to_dict(include_stats=include_stats) for f in flows],
+        "data": Flow.to_dicts(flows, include_stats=include_stats),
         "pagination": pagination,
     })
     resp.headers["X-Total-Count"] = pagination["total"]
-    return resp
+    return with_etag(resp, etag, weak=True)
 
 
 @flows_bp.post("/flows")
@@ -98,19 +181,24 @@ def create_flow():
 
 
 @flows_bp.get("/flows/archived")
+@replica.reads
 def list_archived_flows():
-    flows = Flow.query.filter_by(is_archived=True).order_by(Flow.updated_at.desc()).all()
-    return jsonify([f.to_dict() for f in flows])
+    flows = (
+        Flow.query
+        .filter_by(is_archived=True, deleted_at=None)
+        .order_by(Flow.updated_at.desc())
+        .all()
+    )
+    return jsonify(Flow.to_dicts(flows))
 
 
 @flows_bp.post("/flows/suggest")
 def suggest_flow():
     """Given a plain-English issue, return the best matching published flow(s)."""
-    import json
-    from flask import current_app
-
     try:
-        from routes.ai import _suggest_with_groq, _suggest_with_gemini, GROQ_AVAILABLE, GEMINI_AVAILABLE
+        from routes.ai import (
+            _suggest_with_groq, _suggest_with_gemini, _hedged_call, provider_available,
+        )
     except ImportError as exc:
         return jsonify({"error": f"AI module not available: {exc}. Make sure routes/ai.py is up to date."}), 503
 
@@ -122,17 +210,11 @@ def suggest_flow():
         return jsonify({"error": "Missing issue description"}), 400
     if len(issue) > 2000:
         return jsonify({"error": "Issue description too long — keep it under 2000 characters."}), 400
-    if provider not in ("gemini", "groq"):
-        return jsonify({"error": "Invalid provider. Must be 'gemini' or 'groq'."}), 400
-
-    published_flows = (
-        Flow.query
-        .filter_by(is_archived=False)
-        .filter(Flow.active_version_id.isnot(None))
-        .all()
-    )
+    if provider not in ("gemini", "groq", "local"):
+        return jsonify({"error": "Invalid provider. Must be 'gemini', 'groq' or 'local'."}), 400
 
-    if not published_flows:
+    flows_searched = len(flow_index)
+    if not flows_searched:
         return jsonify({
             "no_match": True,
             "top_match": None,
@@ -140,40 +222,55 @@ def suggest_flow():
             "meta": {"flows_searched": 0, "model": "n/a", "provider": provider},
         })
 
-    flows_context = json.dumps([{
-        "flow_id": f.id,
-        "flow_name": f.name,
-        "active_version_id": f.active_version_id,
-        "description": f.description or "",
-        "category": f.category or "",
-        "tags": f.tags or [],
-    } for f in published_flows], indent=2)
-
-    try:
-        if provider == "groq" and GROQ_AVAILABLE:
-            parsed, model_used = _suggest_with_groq(
-                issue, flows_context, current_app.config, current_app.logger
-            )
-        elif GEMINI_AVAILABLE:
-            parsed, model_used = _suggest_with_gemini(
-                issue, flows_context, current_app.config, current_app.logger
-            )
-        else:
-            return jsonify({"error": "No AI provider available. Configure GROQ_API_KEY or GEMINI_API_KEY."}), 503
-    except RuntimeError as exc:
-        return jsonify({"error": str(exc)}), 503
-    except Exception as exc:
-        err = str(exc).lower()
-        current_app.logger.error("%s suggest error: %s", provider, exc)
-        if "quota" in err or "rate_limit" in err or "429" in err:
-            return jsonify({"error": f"Rate limit reached for {provider}. Please wait a moment."}), 429
-        return jsonify({"error": f"{provider.capitalize()} error: {exc}"}), 500
+    allow_fallback = current_app.config.get("SUGGEST_LOCAL_FALLBACK", True)
+    fallback_reason = None
+    hedge = None
+    valid_ids = frozenset()
+    catalog_version = None
+    if provider != "local":
+        # Only the best lexical candidates go into the prompt, serialized once per flow
+        flows_context, valid_ids, catalog_version = flow_index.prompt_context(
+            issue, current_app.config["SUGGEST_CANDIDATES"]
+        )
+        suggesters = {"groq": _suggest_with_groq, "gemini": _suggest_with_gemini}
+        config, logger = current_app.config, current_app.logger
+        primary = "groq" if provider == "groq" and provider_available("groq", config) else "gemini"
+
+        try:
+            if primary == "groq" or provider_available("gemini", config):
+                parsed, model_used, provider, hedge = _hedged_call(
+                    primary,
+                    lambda name: suggesters[name](issue, flows_context, config, logger),
+                    config.get("AI_HEDGE_SUGGEST_DELAY_SECONDS", 0.0),
+                    config,
+                )
+            elif allow_fallback:
+                fallback_reason = "no_provider"
+            else:
+                return jsonify({"error": "No AI provider available. Configure GROQ_API_KEY or GEMINI_API_KEY."}), 503
+        except RuntimeError as exc:
+            if not allow_fallback:
+                return jsonify({"error": str(exc)}), 503
+            fallback_reason = "not_configured"
+        except Exception as exc:
+            err = str(exc).lower()
+            current_app.logger.error("%s suggest error: %s", provider, exc)
+            if isinstance(exc, RateLimited) or "quota" in err or "rate_limit" in err or "429" in err:
+                if not allow_fallback:
+                    return jsonify({"error": f"Rate limit reached for {provider}. Please wait a moment."}), 429
+                fallback_reason = "rate_limited"
+            else:
+                return jsonify({"error": f"{provider.capitalize()} error: {exc}"}), 500
+
+    fallback_from = provider if fallback_reason else None
+    if provider == "local" or fallback_reason:
+        parsed, model_used, candidates = _suggest_locally(issue)
+        valid_ids = frozenset(c["flow_id"] for c in candidates)
+        provider = "local"
 
     if parsed is None:
         return jsonify({"error": "AI returned malformed JSON. Please try again."}), 500
 
-    valid_ids = {f.id for f in published_flows}
-
     def _validate_match(match):
         if not match or not isinstance(match, dict):
             return None
@@ -191,7 +288,7 @@ def suggest_flow():
     audit("flow.suggest", payload={
         "provider": provider,
         "issue_length": len(issue),
-        "flows_searched": len(published_flows),
+        "flows_searched": flows_searched,
         "matched": not no_match,
     })
 
@@ -200,16 +297,28 @@ def suggest_flow():
         "top_match": top_match,
         "alternatives": alternatives[:2],
         "meta": {
-            "flows_searched": len(published_flows),
+            "flows_searched": flows_searched,
+            "candidates": len(valid_ids),
+            "catalog_version": catalog_version if catalog_version is not None else flow_index.version,
             "model": model_used,
             "provider": provider,
+            "fallback_from": fallback_from,
+            "fallback_reason": fallback_reason,
+            "hedge": hedge,
         },
     })
 
 
 @flows_bp.get("/flows/<flow_id>")
 def get_flow(flow_id):
-    flow = Flow.query.get_or_404(flow_id)
+    marker = _flow_marker(flow_id)
+    if marker is None:
+        abort(404)
+    etag = make_etag("flow", flow_id, *marker)
+    if resp := not_modified(etag, weak=True):
+        return resp
+
+    flow = Flow.query.get(flow_id)
     versions = (
         FlowVersion.query
         .filter_by(flow_id=flow_id)
@@ -218,12 +327,12 @@ def get_flow(flow_id):
     )
     data = flow.to_dict(include_stats=True)
     data["versions"] = [v.to_dict() for v in versions]
-    return jsonify(data)
+    return with_etag(jsonify(data), etag, weak=True)
 
 
 @flows_bp.put("/flows/<flow_id>")
 def update_flow(flow_id):
-    flow = Flow.query.get_or_404(flow_id)
+    flow = _get_flow_or_404(flow_id)
     data = request.get_json(silent=True) or {}
 
     if "name" in data:
@@ -239,69 +348,66 @@ def update_flow(flow_id):
         flow.tags = data["tags"]
 
     flow.updated_at = datetime.utcnow()
+    flow.revision = Flow.revision + 1
     audit("flow.updated", "flow", flow_id, {"fields": list(data.keys())})
     db.session.commit()
+    cache.invalidate("flows", flow_id)
     return jsonify(flow.to_dict())
 
 
 @flows_bp.delete("/flows/<flow_id>")
 def archive_flow(flow_id):
     """Soft delete — moves to archive, recoverable."""
-    flow = Flow.query.get_or_404(flow_id)
+    flow = _get_flow_or_404(flow_id)
     flow.is_archived = True
     flow.updated_at = datetime.utcnow()
+    flow.revision = Flow.revision + 1
     audit("flow.archived", "flow", flow_id)
     db.session.commit()
+    cache.invalidate("flows", flow_id)
     return jsonify({"archived": True})
 
 
 @flows_bp.delete("/flows/<flow_id>/permanent")
 def permanently_delete_flow(flow_id):
-    """Hard delete — removes all versions, nodes, edges, sessions permanently."""
+    """
+    Hard delete — removes all versions, nodes, edges, sessions permanently.
+    The flow disappears from the API immediately; its rows are purged in
+    bounded chunks by a background job whose progress is at GET /jobs/<id>.
+    """
     flow = Flow.query.get_or_404(flow_id)
-    audit("flow.deleted_permanent", "flow", flow_id, {"name": flow.name})
-
-    version_ids = [v.id for v in FlowVersion.query.filter_by(flow_id=flow_id).all()]
-    if version_ids:
-        # Must delete in FK-dependency order: steps → sessions → edges → nodes → versions
-        session_ids = [
-            s.id for s in Session.query.filter(
-                Session.flow_version_id.in_(version_ids)
-            ).all()
-        ]
-        if session_ids:
-            SessionStep.query.filter(
-                SessionStep.session_id.in_(session_ids)
-            ).delete(synchronize_session=False)
-            Session.query.filter(
-                Session.id.in_(session_ids)
-            ).delete(synchronize_session=False)
-
-        node_ids = [
-            n.id for n in Node.query.filter(
-                Node.flow_version_id.in_(version_ids)
-            ).all()
-        ]
-        if node_ids:
-            Edge.query.filter(
-                or_(
-                    Edge.source_node_id.in_(node_ids),
-                    Edge.target_node_id.in_(node_ids),
-                )
-            ).delete(synchronize_session=False)
-        Node.query.filter(
-            Node.flow_version_id.in_(version_ids)
-        ).delete(synchronize_session=False)
-        FlowVersion.query.filter_by(flow_id=flow_id).delete(synchronize_session=False)
+    if job := maintenance.find_active("flow.purge", flow_id=flow_id):
+        return jsonify({"deleted": True, "job": job.to_dict()}), 202
 
-    db.session.delete(flow)
-    db.session.commit()
-    return jsonify({"deleted": True})
+    # Queued before the flow is marked deleted, so a full queue leaves the flow untouched
+    chunk_size = current_app.config["PURGE_CHUNK_SIZE"]
+    try:
+        job = maintenance.submit(
+            current_app._get_current_object(), "flow.purge",
+            lambda job: purge_flow(flow_id, chunk_size, job),
+            payload={"flow_id": flow_id},
+        )
+    except JobLimitExceeded as exc:
+        resp = jsonify({"error": str(exc)})
+        resp.headers["Retry-After"] = "5"
+        return resp, 429
+
+    if not flow.deleted_at:
+        # A bulk UPDATE, since the job may already have removed the row
+        Flow.query.filter_by(id=flow_id).update({
+            Flow.deleted_at: datetime.utcnow(),
+            Flow.is_archived: True,
+            Flow.revision: Flow.revision + 1,
+        }, synchronize_session=False)
+        audit("flow.deleted_permanent", "flow", flow_id, {"name": flow.name})
+        db.session.commit()
+        cache.invalidate("flows", flow_id)
+    return jsonify({"deleted": True, "job": job.to_dict()}), 202
 
 
 @flows_bp.post("/flows/<flow_id>/duplicate")
 def duplicate_flow(flow_id):
-    source = Flow.query.get_or_404(flow_id)
+    source = _get_flow_or_404(flow_id)
     data = request.get_json(silent=True) or {}
     source_version = (
         FlowVersion.query.get(source.active_version_id)
@@ -341,11 +447,13 @@ def duplicate_flow(flow_id):
 
 @flows_bp.post("/flows/<flow_id>/restore")
 def restore_flow(flow_id):
-    flow = Flow.query.get_or_404(flow_id)
+    flow = _get_flow_or_404(flow_id)
     flow.is_archived = False
     flow.updated_at = datetime.utcnow()
+    flow.revision = Flow.revision + 1
     audit("flow.restored", "flow", flow_id)
     db.session.commit()
+    cache.invalidate("flows", flow_id)
     return jsonify(flow.to_dict())
 
 
@@ -353,10 +461,14 @@ def restore_flow(flow_id):
 
 @flows_bp.get("/categories")
 def list_categories():
+    etag = make_etag("categories", *_listing_marker(Flow.query.filter_by(is_archived=False)))
+    if resp := not_modified(etag, weak=True):
+        return resp
+
     rows = (
         db.session.query(Flow.category, func.count(Flow.id))
         .filter(Flow.is_archived == False, Flow.category.isnot(None))
         .group_by(Flow.category)
         .all()
     )
-    return jsonify([{"name": r[0], "count": r[1]} for r in rows])
\ No newline at end of file
+    return with_etag(jsonify([{"name": r[0], "count": r[1]} for r in rows]), etag, weak=True)
\ No newline at end of file
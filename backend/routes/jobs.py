@@ -0,0 +1,34 @@
+from flask import Blueprint, request, jsonify
+from jobs import runner
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api/v1")
+
+
+def _get_own_job(job_id):
+    """Return (job, error response). A job submitted with X-Actor-Id belongs to that actor."""
+    job = runner.get(job_id)
+    if not job:
+        return None, (jsonify({"error": "Job not found"}), 404)
+    actor = request.headers.get("X-Actor-Id")
+    if job.actor and not job.actor.startswith("ip:") and job.actor != actor:
+        return None, (jsonify({"error": "Job belongs to another user"}), 403)
+    return job, None
+
+
+@jobs_bp.get("/jobs/<job_id>")
+def get_job(job_id):
+    job, error = _get_own_job(job_id)
+    if error:
+        return error
+    return jsonify(job.to_dict())
+
+
+@jobs_bp.post("/jobs/<job_id>/cancel")
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop at its next checkpoint."""
+    job, error = _get_own_job(job_id)
+    if error:
+        return error
+    if job.status not in ("queued", "running"):
+        return jsonify({"error": f"Job already {job.status}"}), 409
+    return jsonify(runner.cancel(job_id).to_dict()), 202
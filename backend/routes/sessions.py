@@ -1,12 +1,33 @@
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort, current_app
 from extensions import db
 from models import Flow, FlowVersion, Node, Edge, Session, SessionStep
-from routes import paginate_query, validate_required
+from routes import paginate_query, validate_required, make_etag, not_modified, with_etag
+from graph import get_runtime_index, steps_remaining, reachable_results
+import changefeed
+from replica import replica
 
 sessions_bp = Blueprint("sessions", __name__, url_prefix="/api/v1")
 
 
+def _emit(session, event_type):
+    """Push a compact summary; viewers refetch full state only if they need the details."""
+    changefeed.publish(f"session:{session.id}", event_type, {
+        "status": session.status,
+        "current_node_id": session.current_node_id,
+        "step_number": len(session.path_taken or []),
+        "resolution_type": session.resolution_type,
+        "feedback_rating": session.feedback_rating,
+    })
+
+
+def _node_titles(node_ids):
+    """Titles for a list of node ids, in one query."""
+    if not node_ids:
+        return {}
+    return dict(db.session.query(Node.id, Node.title).filter(Node.id.in_(set(node_ids))).all())
+
+
 def _build_session_state(session):
     """Build the full state payload returned after every session action."""
     node = Node.query.get(session.current_node_id)
@@ -22,17 +43,19 @@ def _build_session_state(session):
     step_map = {s.node_id: s.answer_label for s in steps}
 
     breadcrumb = []
+    titles = _node_titles(session.path_taken[:-1])
     for node_id in session.path_taken[:-1]:
-        past_node = Node.query.get(node_id)
-        if past_node:
+        if (title := titles.get(node_id)) is not None:
             answer = step_map.get(node_id, "")
             breadcrumb.append({
                 "node_id": node_id,
-                "question": past_node.title,
+                "question": title,
                 "answer": answer,
-                "label": f"{past_node.title} → {answer}" if answer else past_node.title,
+                "label": f"{title} → {answer}" if answer else title,
             })
 
+    runtime_index = get_runtime_index(session.flow_version_id)
+
     payload = {
         "session_id": session.id,
         "ticket_id": session.ticket_id,
@@ -41,6 +64,9 @@ def _build_session_state(session):
         "status": session.status,
         "resolution_type": session.resolution_type,
         "step_number": len(session.path_taken),
+        # Precomputed at publish; None for unpublished drafts
+        "steps_remaining": steps_remaining(runtime_index, node.id),
+        "reachable_results": reachable_results(runtime_index, node.id),
         "current_node": node.to_dict(),
         "breadcrumb": [b["label"] for b in breadcrumb],
         "breadcrumb_structured": breadcrumb,
@@ -65,7 +91,7 @@ def start_session():
     if err := validate_required(data, "flow_id"):
         return err
 
-    flow = Flow.query.get_or_404(data["flow_id"])
+    flow = Flow.query.filter_by(id=data["flow_id"], deleted_at=None).first_or_404()
 
     if data.get("version_id"):
         version = FlowVersion.query.filter_by(
@@ -105,6 +131,7 @@ def start_session():
 
 
 @sessions_bp.get("/sessions")
+@replica.reads
 def list_sessions():
     query = Session.query
 
@@ -123,8 +150,28 @@ def list_sessions():
 
 @sessions_bp.get("/sessions/<session_id>")
 def get_session(session_id):
-    session = Session.query.get_or_404(session_id)
-    return jsonify(_build_session_state(session))
+    # Session state also embeds node text, which can change while testing a draft
+    marker = (
+        db.session.query(Session.revision, FlowVersion.revision)
+        .join(FlowVersion, FlowVersion.id == Session.flow_version_id)
+        .filter(Session.id == session_id)
+        .first()
+    )
+    if marker is None:
+        abort(404)
+    etag = make_etag("session", session_id, *marker)
+    if resp := not_modified(etag):
+        return resp
+
+    session = Session.query.get(session_id)
+    return with_etag(jsonify(_build_session_state(session)), etag)
+
+
+@sessions_bp.get("/sessions/<session_id>/changes")
+def session_changes(session_id):
+    """Server-sent stream of state changes for a session."""
+    Session.query.get_or_404(session_id)
+    return changefeed.stream_response(f"session:{session_id}", current_app.config)
 
 
 @sessions_bp.post("/sessions/<session_id>/step")
@@ -174,7 +221,9 @@ def submit_step(session_id):
             else "resolved"
         )
 
+    session.revision = Session.revision + 1
     db.session.commit()
+    _emit(session, "session.step")
     return jsonify(_build_session_state(session))
 
 
@@ -201,7 +250,9 @@ def go_back(session_id):
     session.completed_at = None
     session.duration_seconds = None
     session.resolution_type = None
+    session.revision = Session.revision + 1
     db.session.commit()
+    _emit(session, "session.back")
     return jsonify(_build_session_state(session))
 
 
@@ -224,7 +275,9 @@ def restart_session(session_id):
     session.resolution_type = None
     session.feedback_rating = None
     session.feedback_note = None
+    session.revision = Session.revision + 1
     db.session.commit()
+    _emit(session, "session.restarted")
     return jsonify(_build_session_state(session))
 
 
@@ -242,11 +295,14 @@ def submit_feedback(session_id):
     if "note" in data:
         session.feedback_note = data["note"]
 
+    session.revision = Session.revision + 1
     db.session.commit()
+    _emit(session, "session.feedback")
     return jsonify({"success": True, "rating": session.feedback_rating})
 
 
 @sessions_bp.get("/sessions/<session_id>/export")
+@replica.reads
 def export_session(session_id):
     """Return a full structured transcript of the session."""
     session = Session.query.get_or_404(session_id)
@@ -256,14 +312,14 @@ def export_session(session_id):
         .order_by(SessionStep.step_number)
         .all()
     )
+    titles = _node_titles([step.node_id for step in steps])
     transcript = []
     for step in steps:
-        node = Node.query.get(step.node_id)
         transcript.append({
             "step": step.step_number,
-            "question": node.title if node else step.node_id,
+            "question": titles.get(step.node_id, step.node_id),
             "answer": step.answer_label,
-            "timestamp": step.created_at.isoformat() if step.created_at else None,
+            "timestamp": step.created_at,
         })
 
     final_node = Node.query.get(session.final_node_id) if session.final_node_id else None
@@ -275,8 +331,8 @@ def export_session(session_id):
         "status": session.status,
         "resolution_type": session.resolution_type,
         "duration_seconds": session.duration_seconds,
-        "started_at": session.started_at.isoformat() if session.started_at else None,
-        "completed_at": session.completed_at.isoformat() if session.completed_at else None,
+        "started_at": session.started_at,
+        "completed_at": session.completed_at,
         "transcript": transcript,
         "resolution": {
             "title": final_node.title,
@@ -1,22 +1,83 @@
+import uuid
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, abort, current_app
 from sqlalchemy import or_
-from extensions import db
+from extensions import db, cache
 from models import Flow, FlowVersion, Node, Edge
-from routes import audit, validate_required, VALID_NODE_TYPES
+from routes import (
+    audit, validate_required, VALID_NODE_TYPES, bump_revision, make_etag, not_modified, with_etag,
+)
+from graph import load_graph, validate_graph, has_errors, build_runtime_index
+import changefeed
 
 versions_bp = Blueprint("versions", __name__, url_prefix="/api/v1")
 
 
+# Node fields echoed verbatim in node.updated deltas
+_NODE_FIELDS = ("title", "body", "type", "position", "metadata")
+
+
+def _emit(version_id, event_type, data):
+    changefeed.publish(f"version:{version_id}", event_type, data)
+
+
+def _commit_graph_change(version_id):
+    """
+    Bump the version's revision and commit a node or edge write. A published
+    version can still be edited, so its runtime index is rebuilt to match and
+    every worker's cached copy is dropped. When it is a flow's active version
+    the flow is invalidated too, since suggest indexes its node text.
+    """
+    bump_revision(FlowVersion, version_id)
+    status, active_for = (
+        db.session.query(FlowVersion.status, Flow.id)
+        .outerjoin(Flow, Flow.active_version_id == FlowVersion.id)
+        .filter(FlowVersion.id == version_id)
+        .first()
+    )
+    published = status == "published"
+    if published:
+        FlowVersion.query.filter_by(id=version_id).update(
+            {"runtime_index": build_runtime_index(load_graph(version_id))}, synchronize_session=False
+        )
+    db.session.commit()
+    if published:
+        cache.invalidate("runtime_index", version_id)
+    if active_for is not None:
+        cache.invalidate("flows", active_for)
+
+
 # ── Versions ──────────────────────────────────────────────────
 
 @versions_bp.get("/flows/<flow_id>/versions/<version_id>")
 def get_version(flow_id, version_id):
-    version = FlowVersion.query.filter_by(id=version_id, flow_id=flow_id).first_or_404()
+    revision = (
+        db.session.query(FlowVersion.revision)
+        .filter_by(id=version_id, flow_id=flow_id)
+        .scalar()
+    )
+    if revision is None:
+        abort(404)
+    etag = make_etag("version", version_id, revision)
+    if resp := not_modified(etag):
+        return resp
+
+    version = FlowVersion.query.get(version_id)
     data = version.to_dict(include_graph=True)
     data["nodes"] = [n.to_dict() for n in Node.query.filter_by(flow_version_id=version_id).all()]
     data["edges"] = [e.to_dict() for e in Edge.query.filter_by(flow_version_id=version_id).all()]
-    return jsonify(data)
+    return with_etag(jsonify(data), etag)
+
+
+@versions_bp.get("/flows/<flow_id>/versions/<version_id>/validate")
+def validate_version(flow_id, version_id):
+    """Check a version's graph for structural problems. Cheap enough to call on every save."""
+    FlowVersion.query.filter_by(id=version_id, flow_id=flow_id).first_or_404()
+    issues = validate_graph(load_graph(version_id))
+    return jsonify({
+        "valid": not has_errors(issues),
+        "issues": issues,
+    })
 
 
 @versions_bp.post("/flows/<flow_id>/versions/<version_id>/publish")
@@ -24,23 +85,38 @@ def publish_version(flow_id, version_id):
     version = FlowVersion.query.filter_by(id=version_id, flow_id=flow_id).first_or_404()
     if version.status == "published":
         return jsonify({"error": "Version already published"}), 409
-    if not Node.query.filter_by(flow_version_id=version_id, is_start=True).first():
-        return jsonify({"error": "Flow must have a start node before publishing"}), 422
+
+    graph = load_graph(version_id)
+    issues = validate_graph(graph)
+    if has_errors(issues):
+        errors = [i for i in issues if i["severity"] == "error"]
+        return jsonify({
+            "error": f"Flow has {len(errors)} problem(s) that must be fixed before publishing: "
+                     f"{errors[0]['message']}",
+            "issues": issues,
+        }), 422
 
     data = request.get_json(silent=True) or {}
+    version.runtime_index = build_runtime_index(graph)
     version.status = "published"
     version.published_at = datetime.utcnow()
     version.change_notes = data.get("change_notes", version.change_notes)
+    version.revision = FlowVersion.revision + 1
 
     flow = Flow.query.get(flow_id)
     flow.active_version_id = version_id
     flow.updated_at = datetime.utcnow()
+    flow.revision = Flow.revision + 1
     audit("version.published", "flow_version", version_id, {
         "flow_id": flow_id,
         "version_number": version.version_number,
     })
     db.session.commit()
-    return jsonify(version.to_dict())
+    cache.invalidate("flows", flow_id)
+    _emit(version_id, "version.published", {"version": version.to_dict()})
+    result = version.to_dict()
+    result["issues"] = issues
+    return jsonify(result)
 
 
 @versions_bp.post("/flows/<flow_id>/versions")
@@ -68,11 +144,19 @@ def create_new_version(flow_id):
         from routes.flows import _copy_version_contents
         _copy_version_contents(latest.id, new_version.id)
 
+    bump_revision(Flow, flow_id)
     audit("version.created", "flow_version", new_version.id, {"flow_id": flow_id})
     db.session.commit()
     return jsonify(new_version.to_dict(include_graph=True)), 201
 
 
+@versions_bp.get("/versions/<version_id>/changes")
+def version_changes(version_id):
+    """Server-sent stream of node and edge deltas for a version."""
+    FlowVersion.query.get_or_404(version_id)
+    return changefeed.stream_response(f"version:{version_id}", current_app.config)
+
+
 # ── Nodes ─────────────────────────────────────────────────────
 
 @versions_bp.post("/versions/<version_id>/nodes")
@@ -100,7 +184,8 @@ def create_node(version_id):
         is_start=bool(data.get("is_start", False)),
     )
     db.session.add(node)
-    db.session.commit()
+    _commit_graph_change(version_id)
+    _emit(version_id, "node.created", {"node": node.to_dict()})
     return jsonify(node.to_dict()), 201
 
 
@@ -129,7 +214,12 @@ def update_node(version_id, node_id):
         Node.query.filter_by(flow_version_id=version_id, is_start=True).update({"is_start": False})
         node.is_start = True
 
-    db.session.commit()
+    _commit_graph_change(version_id)
+    # is_start moves between nodes, so send it along with whatever fields changed
+    _emit(version_id, "node.updated", {
+        "id": node_id,
+        "changes": {**{k: data[k] for k in data if k in _NODE_FIELDS}, "is_start": node.is_start},
+    })
     return jsonify(node.to_dict())
 
 
@@ -140,7 +230,9 @@ def delete_node(version_id, node_id):
         or_(Edge.source_node_id == node_id, Edge.target_node_id == node_id)
     ).delete(synchronize_session=False)
     db.session.delete(node)
-    db.session.commit()
+    _commit_graph_change(version_id)
+    # Clients drop any edges touching the node themselves
+    _emit(version_id, "node.deleted", {"id": node_id})
     return jsonify({"deleted": True})
 
 
@@ -148,14 +240,22 @@ def delete_node(version_id, node_id):
 def bulk_update_positions(version_id):
     FlowVersion.query.get_or_404(version_id)
     positions = (request.get_json(silent=True) or {}).get("positions", [])
+    ids = [p.get("id") for p in positions]
+    nodes = {
+        n.id: n for n in Node.query.filter(Node.id.in_(ids), Node.flow_version_id == version_id).all()
+    } if ids else {}
     updated = 0
+    moved = []
     for p in positions:
-        node = Node.query.filter_by(id=p.get("id"), flow_version_id=version_id).first()
-        if node:
+        if node := nodes.get(p.get("id")):
             node.position_x = p.get("x", node.position_x)
             node.position_y = p.get("y", node.position_y)
+            moved.append({"id": node.id, "x": node.position_x, "y": node.position_y})
             updated += 1
+    bump_revision(FlowVersion, version_id)
     db.session.commit()
+    if moved:
+        _emit(version_id, "node.moved", {"positions": moved})
     return jsonify({"updated": updated})
 
 
@@ -187,7 +287,8 @@ def create_edge(version_id):
         sort_order=data.get("sort_order", 0),
     )
     db.session.add(edge)
-    db.session.commit()
+    _commit_graph_change(version_id)
+    _emit(version_id, "edge.created", {"edge": edge.to_dict()})
     return jsonify(edge.to_dict()), 201
 
 
@@ -199,7 +300,8 @@ def update_edge(version_id, edge_id):
         edge.condition_label = data["condition_label"].strip()
     if "sort_order" in data:
         edge.sort_order = data["sort_order"]
-    db.session.commit()
+    _commit_graph_change(version_id)
+    _emit(version_id, "edge.updated", {"edge": edge.to_dict()})
     return jsonify(edge.to_dict())
 
 
@@ -207,7 +309,8 @@ def update_edge(version_id, edge_id):
 def delete_edge(version_id, edge_id):
     edge = Edge.query.filter_by(id=edge_id, flow_version_id=version_id).first_or_404()
     db.session.delete(edge)
-    db.session.commit()
+    _commit_graph_change(version_id)
+    _emit(version_id, "edge.deleted", {"id": edge_id})
     return jsonify({"deleted": True})
 
 
@@ -241,6 +344,8 @@ def batch_import(version_id):
             if node_type not in VALID_NODE_TYPES:
                 node_type = "question"
             node = Node(
+                # Ids assigned here rather than at flush let every row go in one batched INSERT
+                id=str(uuid.uuid4()),
                 flow_version_id=version_id,
                 type=node_type,
                 title=(n.get("title") or "").strip() or "Untitled step",
@@ -251,7 +356,6 @@ def batch_import(version_id):
                 is_start=bool(n.get("is_start", False)),
             )
             db.session.add(node)
-            db.session.flush()
             temp_id = str(n.get("tempId") or n.get("id") or i)
             id_map[temp_id] = node.id
             created_nodes.append(node)
@@ -284,6 +388,7 @@ def batch_import(version_id):
             seen.add(key)
 
             edge = Edge(
+                id=str(uuid.uuid4()),
                 flow_version_id=version_id,
                 source_node_id=src_id,
                 target_node_id=tgt_id,
@@ -293,16 +398,20 @@ def batch_import(version_id):
             db.session.add(edge)
             created_edges.append(edge)
 
-        db.session.commit()
-        audit("version.batch_import", "flow_version", version_id, {
-            "node_count": len(created_nodes),
-            "edge_count": len(created_edges),
-        })
-        return jsonify({
+        # Serialized before commit, which expires every row and would reload each one
+        body = {
             "nodes": [n.to_dict() for n in created_nodes],
             "edges": [e.to_dict() for e in created_edges],
             "skipped_edges": skipped_edges,
+        }
+        _commit_graph_change(version_id)
+        # Whole graph replaced — a delta would be as large as the version itself
+        _emit(version_id, "version.reset", {"reason": "import"})
+        audit("version.batch_import", "flow_version", version_id, {
+            "node_count": len(created_nodes),
+            "edge_count": len(created_edges),
         })
+        return jsonify(body)
 
     except Exception as exc:
         db.session.rollback()
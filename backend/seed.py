@@ -0,0 +1,319 @@
+"""
+Synthetic data at production scale, for benchmarks and local profiling.
+
+    flask seed [--flows 200] [--versions 3] [--nodes 40] [--sessions 50]
+               [--steps 12] [--audit-logs 5000] [--seed 0]
+
+Every flow gets --versions versions with their own graph of about --nodes
+nodes: questions with two or three answers fanning out to results at the
+leaves, a quarter of them escalations. All versions but possibly the last
+are published, each with its runtime index built as publish would. Each
+flow gets --sessions sessions walked down random answers for at most
+--steps steps, most on the active version; a walk that reaches a result is
+completed, the rest are left in progress. Audit log entries are spread over
+the generated flows and versions.
+
+Ids, graph shapes and walks come from --seed, so two runs with the same
+arguments produce the same rows. Timestamps are relative to now, spread
+over the last 90 days, so date-windowed analytics see realistic data.
+
+Rows are inserted in chunks with executemany, straight through the tables,
+and committed per chunk: a million session steps seed in a few minutes on
+SQLite. Seed an empty database; ids would collide with an earlier run.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from extensions import db
+from graph import CompiledGraph, build_runtime_index
+from models import Flow, FlowVersion, Node, Edge, Session, SessionStep, AuditLog
+
+TOPICS = [
+    ("Internet outage", "network", ["internet", "router", "wifi"]),
+    ("Slow connection", "network", ["speed", "wifi"]),
+    ("Refund request", "billing", ["refund", "payments"]),
+    ("Double charge", "billing", ["payments", "card"]),
+    ("Password reset", "account", ["login", "security"]),
+    ("Locked account", "account", ["login", "fraud"]),
+    ("Order tracking", "shipping", ["order", "delivery"]),
+    ("Damaged delivery", "shipping", ["returns", "delivery"]),
+    ("Printer jam", "hardware", ["printer"]),
+    ("Laptop will not boot", "hardware", ["laptop", "power"]),
+    ("App crash on upload", "mobile", ["app", "crash"]),
+    ("Push notifications missing", "mobile", ["app", "notifications"]),
+]
+
+QUESTIONS = [
+    "Is the {thing} showing an error?",
+    "Has the customer restarted the {thing}?",
+    "Does the issue happen on every {thing}?",
+    "Did the {thing} work before today?",
+    "Is the {thing} covered by warranty?",
+    "Can the customer see the {thing} in their account?",
+    "Has the customer tried a different {thing}?",
+    "Is there a known incident affecting the {thing}?",
+]
+THINGS = ["device", "router", "order", "payment", "account", "app", "browser", "connection"]
+RESULTS = [
+    "Resolved: walk the customer through the fix",
+    "Resolved: resend the confirmation",
+    "Resolved: apply the known workaround",
+    "Refund issued",
+    "Replacement shipped",
+]
+ESCALATIONS = ["Escalate to tier 2", "Escalate to billing", "Raise a hardware ticket", "Escalate to security"]
+ANSWERS = {
+    2: [("Yes", "No"), ("Fixed", "Still failing"), ("Found", "Not found")],
+    3: [("Yes", "No", "Not sure"), ("Working", "Intermittent", "Down")],
+}
+AUDIT_ACTIONS = [
+    ("flow.updated", "flow", 30), ("version.created", "flow_version", 15),
+    ("version.published", "flow_version", 10), ("version.batch_import", "flow_version", 20),
+    ("flow.suggest", "flow", 20), ("flow.archived", "flow", 2), ("flow.created", "flow", 3),
+]
+AGENTS = [f"agent-{i:03d}" for i in range(40)]
+
+
+class _Writer:
+    """Buffers rows per table and inserts them in chunks, parents before children."""
+
+    ORDER = (Flow, FlowVersion, Node, Edge, Session, SessionStep, AuditLog)
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.rows = {model: [] for model in self.ORDER}
+        self.counts = {model.__tablename__: 0 for model in self.ORDER}
+
+    def add(self, model, row):
+        self.rows[model].append(row)
+        if len(self.rows[model]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        for model in self.ORDER:
+            if rows := self.rows[model]:
+                db.session.execute(model.__table__.insert(), rows)
+                self.counts[model.__tablename__] += len(rows)
+                self.rows[model] = []
+        db.session.commit()
+
+
+def _new_id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def generate_graph(rng, size):
+    """
+    A publishable graph of about size nodes: (types, titles, out), where
+    out[i] lists (target index, answer label) for node i. Results make up the
+    last 30% of the nodes and every edge points forward, so the graph is
+    acyclic and every question reaches a result.
+    """
+    size = max(3, size + rng.randint(-size // 10, size // 10))
+    n_results = max(1, size * 3 // 10)
+    first_result = size - n_results
+    children = [[] for _ in range(size)]
+    for j in range(1, size):
+        # Hang each node under a recent question with room for another answer, which keeps paths deep
+        earlier = min(j, first_result)
+        open_questions = [q for q in range(max(0, earlier - 3), earlier) if len(children[q]) < 3]
+        if not open_questions:
+            open_questions = [q for q in range(earlier) if len(children[q]) < 3]
+        children[rng.choice(open_questions)].append(j)
+    for q in range(first_result):
+        while len(children[q]) < 2:
+            target = rng.randrange(q + 1, size)
+            if target not in children[q]:
+                children[q].append(target)
+
+    types = ["question"] * first_result + ["result"] * n_results
+    titles = [rng.choice(QUESTIONS).format(thing=rng.choice(THINGS)) for _ in range(first_result)]
+    titles += [rng.choice(ESCALATIONS if rng.random() < 0.25 else RESULTS) for _ in range(n_results)]
+    out = []
+    for i in range(size):
+        labels = rng.choice(ANSWERS[len(children[i])]) if children[i] else ()
+        out.append(list(zip(children[i], labels)))
+    return types, titles, out
+
+
+def import_payload(rng, size):
+    """A generated graph in the shape POST /versions/<id>/import takes."""
+    types, titles, out = generate_graph(rng, size)
+    ids = range(len(types))
+    return {
+        "nodes": [
+            {"id": str(i), "type": types[i], "title": titles[i], "is_start": i == 0,
+             "position": {"x": (i % 6) * 280, "y": (i // 6) * 180}}
+            for i in ids
+        ],
+        "edges": [
+            {"source": str(i), "target": str(target), "label": label, "sort_order": order}
+            for i in ids for order, (target, label) in enumerate(out[i])
+        ],
+    }
+
+
+def _write_version(writer, rng, version_id, size, created_at):
+    """Insert one version's nodes and edges. Returns the walkable graph and its runtime index."""
+    types, titles, out = generate_graph(rng, size)
+    node_ids = [_new_id(rng) for _ in types]
+    edge_ids = []
+    for i, node_id in enumerate(node_ids):
+        escalates = types[i] == "result" and titles[i] in ESCALATIONS
+        writer.add(Node, {
+            "id": node_id, "flow_version_id": version_id, "type": types[i], "title": titles[i],
+            "body": (
+                "Ask the customer and note what they report before choosing an answer."
+                if types[i] == "question" else "Tell the customer the outcome and log it on the ticket."
+            ),
+            "position_x": float((i % 6) * 280), "position_y": float((i // 6) * 180),
+            "node_metadata": {"escalate_to": "tier 2"} if escalates else {},
+            "is_start": i == 0, "created_at": created_at,
+        })
+        edge_ids.append([])
+        for order, (target, label) in enumerate(out[i]):
+            edge_id = _new_id(rng)
+            edge_ids[i].append(edge_id)
+            writer.add(Edge, {
+                "id": edge_id, "flow_version_id": version_id, "source_node_id": node_id,
+                "target_node_id": node_ids[target], "condition_label": label, "sort_order": order,
+            })
+    compiled = CompiledGraph(
+        [(node_ids[i], types[i], titles[i], i == 0) for i in range(len(node_ids))],
+        [(edge_ids[i][k], node_ids[i], node_ids[t], label)
+         for i in range(len(node_ids)) for k, (t, label) in enumerate(out[i])],
+    )
+    return (node_ids, types, titles, out, edge_ids), build_runtime_index(compiled)
+
+
+def _write_session(writer, rng, version_id, walk, max_steps, now):
+    node_ids, types, titles, out, edge_ids = walk
+    started = now - timedelta(days=rng.uniform(0, 90))
+    session_id = _new_id(rng)
+    path = [0]
+    for step in range(max_steps):
+        current = path[-1]
+        # Some sessions are abandoned part way through
+        if types[current] == "result" or rng.random() < 0.05:
+            break
+        k = rng.randrange(len(out[current]))
+        writer.add(SessionStep, {
+            "id": _new_id(rng), "session_id": session_id, "node_id": node_ids[current],
+            "edge_id": edge_ids[current][k], "answer_label": out[current][k][1],
+            "step_number": step + 1, "created_at": started + timedelta(seconds=30 * (step + 1)),
+        })
+        path.append(out[current][k][0])
+
+    final = path[-1] if types[path[-1]] == "result" else None
+    duration = int(rng.lognormvariate(5.5, 0.6)) if final is not None else None
+    rated = final is not None and rng.random() < 0.3
+    agent = rng.choice(AGENTS)
+    writer.add(Session, {
+        "id": session_id, "flow_version_id": version_id,
+        "ticket_id": f"TKT-{rng.randrange(10 ** 6):06d}",
+        "agent_id": agent, "agent_name": agent.replace("-", " ").title(),
+        "status": "completed" if final is not None else "in_progress",
+        "current_node_id": node_ids[path[-1]],
+        "path_taken": [node_ids[i] for i in path],
+        "final_node_id": node_ids[final] if final is not None else None,
+        "resolution_type": (
+            ("escalated" if titles[final] in ESCALATIONS else "resolved") if final is not None else None
+        ),
+        "feedback_rating": rng.choice([3, 4, 4, 5, 5, 5, 2, 1]) if rated else None,
+        "feedback_note": None,
+        "started_at": started,
+        "completed_at": started + timedelta(seconds=duration) if final is not None else None,
+        "duration_seconds": duration,
+        "revision": len(path),
+    })
+
+
+def seed_database(flows=200, versions=3, nodes=40, sessions=50, steps=12, audit_logs=5000,
+                  seed=0, chunk_size=2000, on_flow=None):
+    """Insert synthetic rows (see the module docstring). Returns the row count per table."""
+    rng = random.Random(seed)
+    writer = _Writer(chunk_size)
+    now = datetime.utcnow()
+    flow_ids, version_ids = [], []
+
+    for f in range(flows):
+        topic, category, tags = TOPICS[f % len(TOPICS)]
+        flow_id = _new_id(rng)
+        created = now - timedelta(days=90 + rng.uniform(0, 270))
+        published = []   # (version id, walkable graph)
+        rows = []
+        for number in range(1, versions + 1):
+            version_id = _new_id(rng)
+            version_created = created + timedelta(days=number * 7)
+            walk, index = _write_version(writer, rng, version_id, nodes, version_created)
+            # The newest version is an open draft on a third of the flows
+            is_draft = number == versions and versions > 1 and rng.random() < 0.33
+            rows.append({
+                "id": version_id, "flow_id": flow_id, "version_number": number,
+                "status": "draft" if is_draft else "published",
+                "graph_data": {"nodes": [], "edges": []},
+                "change_notes": None if number == 1 else f"Revision {number}",
+                "runtime_index": None if is_draft else index,
+                "revision": 1,
+                "published_at": None if is_draft else version_created,
+                "created_at": version_created,
+            })
+            if not is_draft:
+                published.append((version_id, walk))
+            version_ids.append(version_id)
+
+        writer.add(Flow, {
+            "id": flow_id, "name": f"{topic} #{f // len(TOPICS) + 1}" if f >= len(TOPICS) else topic,
+            "description": f"Guided troubleshooting for {topic.lower()} issues.",
+            "category": category, "tags": tags,
+            "active_version_id": published[-1][0] if published else None,
+            "is_archived": rng.random() < 0.05, "deleted_at": None, "revision": versions,
+            "created_at": created, "updated_at": created + timedelta(days=versions * 7),
+        })
+        for row in rows:
+            writer.add(FlowVersion, row)
+        flow_ids.append(flow_id)
+
+        for _ in range(sessions if published else 0):
+            # Most sessions run on the active version, the rest on older published ones
+            version_id, walk = published[-1] if rng.random() < 0.8 else rng.choice(published)
+            _write_session(writer, rng, version_id, walk, steps, now)
+        if on_flow:
+            on_flow(f + 1)
+
+    weights = [w for _, _, w in AUDIT_ACTIONS]
+    for _ in range(audit_logs if flow_ids else 0):
+        action, resource_type, _ = rng.choices(AUDIT_ACTIONS, weights)[0]
+        writer.add(AuditLog, {
+            "id": _new_id(rng), "action": action, "resource_type": resource_type,
+            "resource_id": rng.choice(flow_ids if resource_type == "flow" else version_ids),
+            "actor_id": rng.choice(AGENTS), "payload": {},
+            "created_at": now - timedelta(days=rng.uniform(0, 90)),
+        })
+    writer.flush()
+    return writer.counts
+
+
+@click.command("seed")
+@click.option("--flows", type=int, default=200, show_default=True)
+@click.option("--versions", type=int, default=3, show_default=True, help="Versions per flow.")
+@click.option("--nodes", type=int, default=40, show_default=True, help="Nodes per version graph, about.")
+@click.option("--sessions", type=int, default=50, show_default=True, help="Sessions per flow.")
+@click.option("--steps", type=int, default=12, show_default=True, help="Most steps a session walks.")
+@click.option("--audit-logs", type=int, default=5000, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+@with_appcontext
+def seed_command(flows, versions, nodes, sessions, steps, audit_logs, seed):
+    """Fill an empty database with synthetic flows, sessions and audit logs."""
+    db.create_all()
+    if existing := Flow.query.count():
+        raise click.ClickException(f"The database already has {existing} flows; seed an empty one.")
+
+    def progress(done):
+        if done % 50 == 0:
+            click.echo(f"  {done}/{flows} flows")
+
+    counts = seed_database(flows, versions, nodes, sessions, steps, audit_logs, seed, on_flow=progress)
+    click.echo("Seeded " + ", ".join(f"{n} {table}" for table, n in counts.items()) + ".")
@@ -0,0 +1,430 @@
+"""
+A cache shared by every worker process, with invalidation across workers.
+
+extensions.cache keeps recently used values in a per-process LRU of
+CACHE_LOCAL_ENTRIES, in front of the store CACHE_BACKEND names:
+
+memory  Nothing behind the LRU. Each worker caches on its own and an
+        invalidation reaches only the worker that made it, so use it for
+        development and single-worker deployments.
+sqlite  A SQLite file at CACHE_PATH that every worker on the host opens,
+        memory-mapped. Put it on /dev/shm to keep it in shared memory.
+        It holds up to CACHE_SHARED_ENTRIES values, and the oldest written
+        go first. Invalidations are rows the workers poll every
+        CACHE_POLL_SECONDS.
+redis   Any server that speaks RESP (Redis, Valkey) at CACHE_URL, for
+        workers on several hosts. Invalidations go out with PUBLISH and
+        arrive on a SUBSCRIBE connection. `python -m bench.resp_server` is a
+        stand-in server for trying it locally.
+
+cache.invalidate(namespace, key) drops the entry from the store and from
+every worker's LRU. It also runs the callbacks registered with
+cache.on_invalidate(namespace, fn) in each worker, so structures a worker
+builds in memory (the suggest catalog) catch up with writes made by
+another. Callbacks run on the listener thread, so they should only mark
+things stale.
+
+Shared stores hold values as JSON, so cache JSON-serializable data. A
+store that cannot be reached counts as a miss. When a listener loses its
+connection it may have missed messages, so it empties its LRU and calls
+every callback with key None, meaning any key may have changed. /metrics
+counts lookups by namespace and where they were answered (local, shared,
+miss), and evictions by reason.
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import unquote, urlparse
+import json_provider
+from metrics import metrics
+
+log = logging.getLogger(__name__)
+
+
+class RespError(Exception):
+    """An error reply from a RESP server."""
+
+
+STORE_ERRORS = (OSError, sqlite3.Error, RespError)
+
+
+class MemoryStore:
+    """No store behind the local LRU."""
+    shared = False
+
+    def get(self, key):
+        return None
+
+    def set(self, key, raw):
+        return 0
+
+    def delete(self, key):
+        pass
+
+    def publish(self, message):
+        pass
+
+    def listen(self, on_message, on_reset):
+        pass
+
+
+class SQLiteStore:
+    shared = True
+    RETAIN_INVALIDATIONS_SECONDS = 300
+
+    def __init__(self, path, max_entries=10000, poll_seconds=0.5):
+        self.path = path
+        self.max_entries = max_entries
+        self.poll_seconds = poll_seconds
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Autocommit: every statement is its own transaction, so no lock is held between them
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA mmap_size = {64 * 1024 * 1024}")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_invalidations ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, message BLOB NOT NULL, at REAL NOT NULL)"
+        )
+        return conn
+
+    def _conn(self):
+        # A connection inherited through fork belongs to the parent
+        if self._db is None or self._pid != os.getpid():
+            self._db, self._pid = self._connect(), os.getpid()
+        return self._db
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn().execute("SELECT value FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, raw):
+        """Store raw under key. Returns how many of the oldest entries made room for it."""
+        with self._lock:
+            conn = self._conn()
+            # REPLACE gives the row a new rowid, so rowid order is write order. Deletes leave
+            # gaps in it, so the cap counts rows back from the newest rather than subtracting
+            conn.execute("INSERT OR REPLACE INTO cache_entries (key, value) VALUES (?, ?)", (key, raw))
+            return conn.execute(
+                "DELETE FROM cache_entries WHERE rowid < "
+                "(SELECT rowid FROM cache_entries ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+                (self.max_entries - 1,),
+            ).rowcount
+
+    def delete(self, key):
+        with self._lock:
+            self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def publish(self, message):
+        now = time.time()
+        with self._lock:
+            conn = self._conn()
+            conn.execute("INSERT INTO cache_invalidations (message, at) VALUES (?, ?)", (message, now))
+            conn.execute(
+                "DELETE FROM cache_invalidations WHERE at < ?", (now - self.RETAIN_INVALIDATIONS_SECONDS,)
+            )
+
+    def listen(self, on_message, on_reset):
+        """Poll for invalidations forever. Runs on its own thread, with its own connection."""
+        conn, last = None, None
+        while True:
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    if last is None:
+                        last = conn.execute("SELECT coalesce(max(seq), 0) FROM cache_invalidations").fetchone()[0]
+                    else:
+                        on_reset()
+                rows = conn.execute(
+                    "SELECT seq, message FROM cache_invalidations WHERE seq > ? ORDER BY seq", (last,)
+                ).fetchall()
+                for seq, message in rows:
+                    on_message(message)
+                    last = seq
+            except sqlite3.Error as e:
+                log.warning("Cache invalidation poll failed: %s", e)
+                conn = None
+            time.sleep(self.poll_seconds)
+
+
+# ── RESP (Redis protocol) ─────────────────────────────────────
+
+class _RespConnection:
+    def __init__(self, address, timeout):
+        self.sock = socket.create_connection(address, timeout)
+        self.reader = self.sock.makefile("rb")
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+        return self.read()
+
+    def read(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Cache server closed the connection")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RespError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            return None if size < 0 else self.reader.read(size + 2)[:-2]
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [self.read() for _ in range(size)]
+        raise RespError(f"Unexpected reply from the cache server: {line[:40]!r}")
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespStore:
+    """A Redis-protocol server, through a small pool of connections."""
+    shared = True
+
+    def __init__(self, url, channel, timeout=2.0, max_idle=8):
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.database = int(parsed.path.strip("/") or 0)
+        self.channel = channel
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self, timeout):
+        conn = _RespConnection(self.address, timeout)
+        try:
+            if self.password:
+                conn.command("AUTH", self.password)
+            if self.database:
+                conn.command("SELECT", self.database)
+        except (OSError, RespError):
+            conn.close()
+            raise
+        return conn
+
+    def _command(self, *args):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sockets inherited through fork belong to the parent
+                self._idle, self._pid = [], os.getpid()
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect(self.timeout)
+        try:
+            reply = conn.command(*args)
+        except OSError:
+            conn.close()
+            raise
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return reply
+        conn.close()
+        return reply
+
+    def get(self, key):
+        return self._command("GET", key)
+
+    def set(self, key, raw):
+        # Capacity is the server's business (maxmemory and its eviction policy)
+        self._command("SET", key, raw)
+        return 0
+
+    def delete(self, key):
+        self._command("DEL", key)
+
+    def publish(self, message):
+        self._command("PUBLISH", self.channel, message)
+
+    def listen(self, on_message, on_reset):
+        """Follow the invalidation channel forever, reconnecting with backoff."""
+        delay, connected_before = 0.5, False
+        while True:
+            conn = None
+            try:
+                conn = self._connect(self.timeout)
+                conn.command("SUBSCRIBE", self.channel)
+                conn.sock.settimeout(None)
+                if connected_before:
+                    on_reset()
+                connected_before, delay = True, 0.5
+                while True:
+                    reply = conn.read()
+                    if reply and reply[0] == b"message":
+                        on_message(reply[2])
+            except (OSError, RespError) as e:
+                log.warning("Cache invalidation channel lost (%s); reconnecting in %.1fs", e, delay)
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+# ── The cache ─────────────────────────────────────────────────
+
+class SharedCache:
+    def __init__(self, local_entries=512):
+        self.local_entries = local_entries
+        self.prefix = "guided:"
+        self.store = MemoryStore()
+        self._local = OrderedDict()    # (namespace, key) -> value
+        self._lock = threading.Lock()
+        self._callbacks = {}           # namespace -> [fn(key)]
+        self._pid = None
+        self._origin = None
+        self._listening_pid = None
+        self._warned_at = 0.0
+
+    def init_app(self, app):
+        config = app.config
+        self.local_entries = config["CACHE_LOCAL_ENTRIES"]
+        self.prefix = config["CACHE_PREFIX"]
+        backend = config["CACHE_BACKEND"]
+        if backend == "memory":
+            self.store = MemoryStore()
+        elif backend == "sqlite":
+            if not config["CACHE_PATH"]:
+                raise ValueError("CACHE_BACKEND=sqlite needs CACHE_PATH")
+            self.store = SQLiteStore(config["CACHE_PATH"], config["CACHE_SHARED_ENTRIES"], config["CACHE_POLL_SECONDS"])
+        elif backend == "redis":
+            self.store = RespStore(config["CACHE_URL"], f"{self.prefix}invalidations")
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND {backend!r}; use memory, sqlite or redis")
+        # Workers start listening on their first request, after any fork
+        app.before_request(self._ensure_listening)
+
+    def on_invalidate(self, namespace, fn):
+        """
+        Call fn(key) in every worker whenever a key in namespace is invalidated,
+        and fn(None) when invalidations may have been missed.
+        """
+        self._callbacks.setdefault(namespace, []).append(fn)
+
+    # ── Lookups ───────────────────────────────────────────────
+
+    def get(self, namespace, key):
+        """The cached value, or None."""
+        with self._lock:
+            value = self._local.get((namespace, key))
+            if value is not None:
+                self._local.move_to_end((namespace, key))
+        if value is not None:
+            metrics.observe_cache(namespace, "local")
+            return value
+        if self.store.shared and (raw := self._try(self.store.get, self._key(namespace, key))) is not None:
+            value = json_provider.loads(raw)
+            self._remember(namespace, key, value)
+            metrics.observe_cache(namespace, "shared")
+            return value
+        metrics.observe_cache(namespace, "miss")
+        return None
+
+    def set(self, namespace, key, value):
+        self._remember(namespace, key, value)
+        if self.store.shared:
+            evicted = self._try(self.store.set, self._key(namespace, key), json_provider.dumps_bytes(value))
+            if evicted:
+                metrics.observe_cache_eviction("*", "shared_capacity", evicted)
+
+    def invalidate(self, namespace, key):
+        """Drop key from the store and every worker's LRU, and run the namespace's callbacks everywhere."""
+        self._forget(namespace, key)
+        self._try(self.store.delete, self._key(namespace, key))
+        message = json_provider.dumps_bytes({"origin": self._process_origin(), "namespace": namespace, "key": key})
+        self._try(self.store.publish, message)
+        self._run_callbacks(namespace, key)
+
+    # ── Internals ─────────────────────────────────────────────
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}{namespace}:{key}"
+
+    def _try(self, operation, *args):
+        try:
+            return operation(*args)
+        except STORE_ERRORS as e:
+            # One warning per minute is enough to notice an outage
+            if time.time() - self._warned_at > 60:
+                self._warned_at = time.time()
+                log.warning("Cache store unavailable, working without it: %s", e)
+            return None
+
+    def _remember(self, namespace, key, value):
+        evicted = []
+        with self._lock:
+            self._local[(namespace, key)] = value
+            self._local.move_to_end((namespace, key))
+            while len(self._local) > self.local_entries:
+                evicted.append(self._local.popitem(last=False)[0][0])
+        for evicted_namespace in evicted:
+            metrics.observe_cache_eviction(evicted_namespace, "capacity")
+
+    def _forget(self, namespace, key):
+        with self._lock:
+            found = self._local.pop((namespace, key), None) is not None
+        if found:
+            metrics.observe_cache_eviction(namespace, "invalidated")
+
+    def _run_callbacks(self, namespace, key):
+        for fn in self._callbacks.get(namespace, ()):
+            try:
+                fn(key)
+            except Exception:
+                log.exception("Cache invalidation callback failed for %s %s", namespace, key)
+
+    def _on_message(self, message):
+        event = json_provider.loads(message)
+        if event["origin"] != self._origin:
+            self._forget(event["namespace"], event["key"])
+            self._run_callbacks(event["namespace"], event["key"])
+
+    def _on_reset(self):
+        with self._lock:
+            self._local.clear()
+        for namespace in list(self._callbacks):
+            self._run_callbacks(namespace, None)
+
+    def _process_origin(self):
+        # Fresh after a fork, so a worker never mistakes another's messages for its own
+        if self._pid != os.getpid():
+            self._pid, self._origin = os.getpid(), uuid.uuid4().hex
+        return self._origin
+
+    def _ensure_listening(self):
+        if self._listening_pid == os.getpid() or not self.store.shared:
+            return
+        with self._lock:
+            if self._listening_pid == os.getpid():
+                return
+            self._listening_pid = os.getpid()
+        self._process_origin()
+        threading.Thread(
+            target=self.store.listen, args=(self._on_message, self._on_reset),
+            name="cache-invalidations", daemon=True,
+        ).start()
@@ -0,0 +1,71 @@
+import pytest
+from config import Config
+from app import create_app
+from extensions import db as _db
+from query_counter import query_counter
+from flow_index import flow_index
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_BINDS = {}
+    AI_CACHE_ENABLED = False
+    AI_CACHE_PATH = None
+    CACHE_BACKEND = "memory"
+    METRICS_ENABLED = False
+    QUERY_REPEAT_THRESHOLD = 0
+    VERSION_GC_INTERVAL_HOURS = 0
+    # Provider budgets off, so fake-provider tests never queue or 429
+    GROQ_RPM = GROQ_TPM = GEMINI_RPM = GEMINI_TPM = 0
+
+
+@pytest.fixture(scope="session")
+def app():
+    app = create_app(TestConfig)
+    app.logger.disabled = True
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """A fresh, empty schema for each test, with no catalog indexed from the last one."""
+    with app.app_context():
+        _db.drop_all()
+        _db.create_all()
+    flow_index.invalidate()
+    yield _db
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def query_count():
+    """query_counter.count: `with query_count() as scope:` counts the statements the block runs."""
+    return query_counter.count
+
+
+@pytest.fixture
+def publish_flow(client):
+    """
+    publish_flow(name, nodes=None, edges=None, **fields) creates a flow, imports
+    the graph (a question leading to one result by default) and publishes it.
+    Returns (flow id, version id).
+    """
+    def publish(name, nodes=None, edges=None, **fields):
+        flow = client.post("/api/v1/flows", json={"name": name, **fields}).get_json()
+        version_id = flow["versions"][0]["id"]
+        if nodes is None:
+            nodes = [
+                {"id": "q", "title": "Is it plugged in?", "is_start": True},
+                {"id": "r", "title": "Resolved", "type": "result"},
+            ]
+            edges = [{"source": "q", "target": "r", "label": "yes"}]
+        client.post(f"/api/v1/versions/{version_id}/import", json={"nodes": nodes, "edges": edges or []})
+        resp = client.post(f"/api/v1/flows/{flow['id']}/versions/{version_id}/publish", json={})
+        assert resp.status_code == 200, resp.get_json()
+        return flow["id"], version_id
+    return publish
@@ -0,0 +1,63 @@
+"""Long descriptions are generated section by section and stitched into one flow."""
+import json
+import pytest
+from routes.ai import _stitch_sections
+
+SECTION = {
+    "nodes": [
+        {"id": "1", "title": "Is the router on?", "type": "question", "is_start": True},
+        {"id": "2", "title": "Turn it on", "body": None, "type": "result"},
+        {"id": "3", "title": "CONTINUE", "body": None, "type": "result"},
+    ],
+    "edges": [
+        {"source": "1", "target": "2", "label": "no"},
+        {"source": "1", "target": "3", "label": "yes"},
+    ],
+}
+
+DESCRIPTION = " ".join(
+    f"Step {i}: ask whether the customer has checked item {i}. If not, ask them to check it and retry."
+    for i in range(40)
+)
+
+
+def test_stitch_tolerates_null_title_and_body():
+    part = json.loads(json.dumps(SECTION))
+    part["nodes"][1]["title"] = None
+    stitched = _stitch_sections([part, json.loads(json.dumps(SECTION))])
+    titles = [n["title"] for n in stitched["nodes"]]
+    assert "CONTINUE" not in titles
+    # The second section's start follows the first section's handover
+    second_start = next(n["id"] for n in stitched["nodes"][1:] if n["title"] == "Is the router on?")
+    assert {"source": "0", "target": second_start, "label": "yes"} in stitched["edges"]
+
+
+@pytest.fixture
+def fake_providers(app, monkeypatch, tmp_path):
+    """Fake providers that answer every flow prompt with SECTION, whose result bodies are null."""
+    (tmp_path / "flow").mkdir()
+    (tmp_path / "flow" / "section.txt").write_text(json.dumps(SECTION))
+    for key, value in {
+        "AI_FAKE_PROVIDERS": True,
+        "AI_FAKE_LATENCY": "fixed:0",
+        "AI_FAKE_RECORDINGS": str(tmp_path),
+        "GROQ_API_KEY": "fake",
+        "GEMINI_API_KEY": "fake",
+        "AI_CHUNKED_MIN_CHARS": 1000,
+        "AI_CHUNK_MAX_CHARS": 1200,
+    }.items():
+        monkeypatch.setitem(app.config, key, value)
+
+
+def test_generate_in_sections(client, fake_providers):
+    resp = client.post("/api/v1/flows/generate-from-text", json={
+        "description": DESCRIPTION, "provider": "groq", "use_cache": False,
+    })
+    assert resp.status_code == 200, resp.get_json()
+    body = resp.get_json()
+    assert body["meta"]["sections"]["count"] > 1
+    nodes = body["nodes"]
+    assert sum(n["is_start"] for n in nodes) == 1
+    assert all(n["title"] != "CONTINUE" for n in nodes)
+    # Identical results from every section are merged into one node
+    assert sum(n["title"] == "Turn it on" for n in nodes) == 1
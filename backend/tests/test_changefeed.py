@@ -0,0 +1,68 @@
+"""The change feed's per-channel ring buffer and resume semantics."""
+import pytest
+from changefeed import ChangeFeed
+
+
+@pytest.fixture
+def feed():
+    """A feed keeping the last three events per channel, with events 1 to 5 published on "version:v"."""
+    feed = ChangeFeed(buffer_size=3)
+    for i in range(1, 6):
+        assert feed.publish("version:v", "node.updated", {"n": i}) == i
+    return feed
+
+
+def _seqs(events):
+    return [seq for seq, _, _ in events]
+
+
+def test_resume_inside_the_buffer(feed):
+    events, reset = feed.since("version:v", 3)
+    assert not reset
+    assert _seqs(events) == [4, 5]
+    assert events[0][1] == "node.updated"
+    assert events[0][2] == '{"n":4}'
+
+
+def test_caught_up_client_gets_nothing(feed):
+    assert feed.since("version:v", 5) == ([], False)
+    assert feed.wait("version:v", 5, timeout=0) == ([], False)
+
+
+def test_resume_from_just_before_the_oldest_buffered_event(feed):
+    events, reset = feed.since("version:v", 2)
+    assert not reset
+    assert _seqs(events) == [3, 4, 5]
+
+
+def test_client_behind_the_buffer_is_reset(feed):
+    assert feed.since("version:v", 1) == ([], True)
+    assert feed.since("version:v", 0) == ([], True)
+
+
+def test_client_ahead_of_the_channel_is_reset(feed):
+    # An id from a previous process lifetime, or from a channel that was evicted
+    assert feed.since("version:v", 9) == ([], True)
+
+
+def test_duplicate_and_old_sequence_numbers_are_skipped(feed):
+    assert feed.deliver("version:v", 5, "node.updated", '{"n":"again"}') == 5
+    assert feed.deliver("version:v", 4, "node.updated", '{"n":"late"}') == 4
+    events, _ = feed.since("version:v", 2)
+    assert [payload for _, _, payload in events] == ['{"n":3}', '{"n":4}', '{"n":5}']
+    assert feed.deliver("version:v", 7, "node.deleted", "{}") == 7
+    assert _seqs(feed.since("version:v", 5)[0]) == [7]
+
+
+def test_channels_are_numbered_independently(feed):
+    assert feed.publish("session:s", "step", {}) == 1
+    assert feed.current("version:v") == 5
+    assert feed.current("session:s") == 1
+
+
+def test_evicted_channel_resets_its_clients():
+    feed = ChangeFeed(buffer_size=3, max_channels=1)
+    feed.publish("version:a", "node.updated", {})
+    feed.publish("version:b", "node.updated", {})
+    # "version:a" was forgotten, so a client that saw event 1 is now ahead of it
+    assert feed.since("version:a", 1) == ([], True)
@@ -0,0 +1,109 @@
+"""Conditional GETs answer 304 before loading or serializing anything."""
+from unittest import mock
+import pytest
+from models import Flow, FlowVersion, Node, Edge, Session
+
+
+@pytest.fixture
+def published(client):
+    """A published two-node flow with one session on it."""
+    flow = client.post("/api/v1/flows", json={"name": "Router", "category": "network"}).get_json()
+    version_id = flow["versions"][0]["id"]
+    client.post(f"/api/v1/versions/{version_id}/import", json={
+        "nodes": [
+            {"id": "q", "title": "Lights on?", "is_start": True},
+            {"id": "r", "title": "Fixed", "type": "result"},
+        ],
+        "edges": [{"source": "q", "target": "r", "label": "yes"}],
+    })
+    client.post(f"/api/v1/flows/{flow['id']}/versions/{version_id}/publish", json={})
+    session = client.post("/api/v1/sessions", json={"flow_id": flow["id"]}).get_json()
+    return {"flow_id": flow["id"], "version_id": version_id, "session_id": session["session_id"]}
+
+
+def _revalidate(client, url):
+    """GET url twice, the second time with its ETag. Returns the second response and the ETag."""
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    second = client.get(url, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    return second, etag
+
+
+def _assert_not_called(*mocks):
+    for m in mocks:
+        m.assert_not_called()
+
+
+def test_get_version(client, published):
+    url = f"/api/v1/flows/{published['flow_id']}/versions/{published['version_id']}"
+    _, etag = _revalidate(client, url)
+    with mock.patch.object(FlowVersion, "to_dict") as version_dict, \
+            mock.patch.object(Node, "to_dict") as node_dict, \
+            mock.patch.object(Edge, "to_dict") as edge_dict, \
+            mock.patch("routes.versions.jsonify") as jsonify:
+        resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    _assert_not_called(version_dict, node_dict, edge_dict, jsonify)
+
+
+def test_get_version_changes_etag_after_edit(client, published):
+    url = f"/api/v1/flows/{published['flow_id']}/versions/{published['version_id']}"
+    etag = client.get(url).headers["ETag"]
+    node_id = client.get(url).get_json()["nodes"][0]["id"]
+    client.put(f"/api/v1/versions/{published['version_id']}/nodes/{node_id}", json={"title": "Power on?"})
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_get_flow(client, published):
+    url = f"/api/v1/flows/{published['flow_id']}"
+    _, etag = _revalidate(client, url)
+    with mock.patch.object(Flow, "to_dict") as flow_dict, \
+            mock.patch.object(Flow, "to_dicts") as flow_dicts, \
+            mock.patch.object(FlowVersion, "to_dict") as version_dict, \
+            mock.patch("routes.flows.jsonify") as jsonify:
+        resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    _assert_not_called(flow_dict, flow_dicts, version_dict, jsonify)
+
+
+def test_list_flows_with_stats(client, published):
+    url = "/api/v1/flows?stats=1"
+    _, etag = _revalidate(client, url)
+    with mock.patch.object(Flow, "to_dict") as flow_dict, \
+            mock.patch.object(Flow, "to_dicts") as flow_dicts, \
+            mock.patch("routes.flows.jsonify") as jsonify:
+        resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    _assert_not_called(flow_dict, flow_dicts, jsonify)
+
+
+def test_list_flows_changes_etag_when_a_session_starts(client, published):
+    url = "/api/v1/flows?stats=1"
+    etag = client.get(url).headers["ETag"]
+    client.post("/api/v1/sessions", json={"flow_id": published["flow_id"]})
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_list_categories(client, published):
+    url = "/api/v1/categories"
+    _, etag = _revalidate(client, url)
+    with mock.patch("routes.flows.jsonify") as jsonify:
+        resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    jsonify.assert_not_called()
+
+
+def test_get_session(client, published):
+    url = f"/api/v1/sessions/{published['session_id']}"
+    _, etag = _revalidate(client, url)
+    with mock.patch.object(Session, "to_dict") as session_dict, \
+            mock.patch("routes.sessions._build_session_state") as build_state, \
+            mock.patch("routes.sessions.jsonify") as jsonify:
+        resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    _assert_not_called(session_dict, build_state, jsonify)
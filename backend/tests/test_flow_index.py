@@ -0,0 +1,72 @@
+"""Local BM25 ranking of the published catalog, as the "local" suggest provider uses it."""
+import pytest
+from flow_index import flow_index, tokenize
+
+CATALOG = [
+    ("Internet outage", "network", ["internet", "router", "wifi"]),
+    ("Slow connection", "network", ["speed", "wifi"]),
+    ("Refund request", "billing", ["refund", "payments"]),
+    ("Double charge", "billing", ["payments", "card"]),
+    ("Password reset", "account", ["login", "security"]),
+    ("Printer jam", "hardware", ["printer"]),
+    ("App crash on upload", "mobile", ["app", "crash"]),
+]
+
+
+@pytest.fixture
+def catalog(app, publish_flow):
+    for name, category, tags in CATALOG:
+        publish_flow(name, category=category, tags=tags)
+    with app.app_context():
+        yield
+
+
+def _top(query):
+    ranked = flow_index.rank(query, 3)
+    return (ranked[0][0]["flow_name"], ranked[0][1]) if ranked else (None, 0)
+
+
+@pytest.mark.parametrize("words", [
+    ("charge", "charged", "charging", "charges"),
+    ("drop", "drops", "dropped", "dropping"),
+    ("restart", "restarts", "restarted", "restarting"),
+    ("battery", "batteries"),
+])
+def test_stemming_is_consistent(words):
+    assert len({tuple(tokenize(w)) for w in words}) == 1
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("wifi router keeps dropping", {"Internet outage", "Slow connection"}),
+    ("forgot password", {"Password reset"}),
+    ("customer says their wifi router needs a restart, please help", {"Internet outage"}),
+    ("I was charged twice on my card", {"Double charge"}),
+    ("printer jammed again", {"Printer jam"}),
+    ("the app keeps crashing when uploading photos", {"App crash on upload"}),
+])
+def test_natural_language_queries_clear_the_cutoff(catalog, query, expected):
+    name, confidence = _top(query)
+    assert name in expected
+    assert confidence >= 0.40
+
+
+def test_query_with_no_catalog_terms_matches_nothing(catalog):
+    assert flow_index.rank("weather forecast for tomorrow", 3) == []
+
+
+def test_local_suggest_on_a_one_flow_catalog(client, publish_flow):
+    flow_id, _ = publish_flow("router wifi reset")
+    resp = client.post("/api/v1/flows/suggest", json={"issue": "my wifi router needs reset", "provider": "local"})
+    body = resp.get_json()
+    assert not body["no_match"]
+    assert body["top_match"]["flow_id"] == flow_id
+
+
+def test_editing_the_active_version_reindexes_node_text(app, client, publish_flow):
+    flow_id, version_id = publish_flow("Kitchen appliances")
+    with app.app_context():
+        assert flow_index.rank("toaster smoking", 3) == []
+    nodes = client.get(f"/api/v1/flows/{flow_id}/versions/{version_id}").get_json()["nodes"]
+    client.put(f"/api/v1/versions/{version_id}/nodes/{nodes[0]['id']}", json={"title": "Is the toaster smoking?"})
+    with app.app_context():
+        assert [e["flow_id"] for e, _, _ in flow_index.rank("toaster smoking", 3)] == [flow_id]
@@ -0,0 +1,99 @@
+"""Validation and runtime indexes over compiled graphs, built straight from row tuples."""
+from graph import CompiledGraph, validate_graph, has_errors, build_runtime_index, steps_remaining, reachable_results
+
+
+def _graph(nodes, edges):
+    """nodes: "id" for a question, "id!" for a result, a leading "*" marks a start. edges: (source, target[, label])."""
+    rows = []
+    for spec in nodes:
+        start, spec = spec.startswith("*"), spec.lstrip("*")
+        node_type = "result" if spec.endswith("!") else "question"
+        node_id = spec.rstrip("!")
+        rows.append((node_id, node_type, node_id.upper(), start))
+    edge_rows = [
+        (f"e{i}", edge[0], edge[1], edge[2] if len(edge) > 2 else f"option {i}")
+        for i, edge in enumerate(edges)
+    ]
+    return CompiledGraph(rows, edge_rows)
+
+
+def _codes(graph):
+    return sorted((i["code"], i.get("node_id") or i.get("edge_id")) for i in validate_graph(graph))
+
+
+def test_valid_graph_has_no_issues():
+    graph = _graph(["*q", "a!", "b!"], [("q", "a", "yes"), ("q", "b", "no")])
+    assert validate_graph(graph) == []
+
+
+def test_cycle_without_exit():
+    graph = _graph(["*q", "x", "y", "r!"], [("q", "r", "done"), ("q", "x", "loop"), ("x", "y"), ("y", "x")])
+    assert _codes(graph) == [("no_path_to_result", "x"), ("no_path_to_result", "y")]
+
+
+def test_cycle_with_exit_is_fine():
+    graph = _graph(["*q", "x", "r!"], [("q", "x"), ("x", "q", "again"), ("x", "r", "done")])
+    assert validate_graph(graph) == []
+
+
+def test_unreachable_node():
+    graph = _graph(["*q", "r!", "orphan", "s!"], [("q", "r"), ("orphan", "s")])
+    assert _codes(graph) == [("unreachable_node", "orphan"), ("unreachable_node", "s")]
+
+
+def test_dangling_edge():
+    graph = _graph(["*q", "r!"], [("q", "r"), ("q", "gone")])
+    assert _codes(graph) == [("dangling_edge", "e1")]
+    assert has_errors(validate_graph(graph))
+
+
+def test_missing_and_multiple_starts():
+    assert _codes(_graph(["q", "r!"], [("q", "r")])) == [("no_start_node", None)]
+    graph = _graph(["*q", "*p", "r!"], [("q", "r"), ("p", "r")])
+    assert _codes(graph) == [("multiple_start_nodes", "p"), ("unreachable_node", "p")]
+
+
+def test_result_with_outgoing_edges_and_dead_end_question():
+    graph = _graph(["*q", "r!", "d"], [("q", "r"), ("r", "d")])
+    assert _codes(graph) == [("dead_end_question", "d"), ("result_has_outgoing", "r")]
+
+
+def test_duplicate_and_empty_labels_are_warnings():
+    graph = _graph(["*q", "a!", "b!", "c!"], [("q", "a", "Yes"), ("q", "b", "yes "), ("q", "c", "")])
+    issues = validate_graph(graph)
+    assert sorted((i["code"], i["edge_id"]) for i in issues) == [
+        ("duplicate_condition_label", "e1"), ("empty_condition_label", "e2"),
+    ]
+    assert {i["severity"] for i in issues} == {"warning"}
+    assert not has_errors(issues)
+
+
+def test_runtime_index_on_a_dag():
+    #   q ─> m ─> a!
+    #   │    └──> b!
+    #   └──> c!
+    graph = _graph(["*q", "m", "a!", "b!", "c!"], [("q", "m"), ("q", "c"), ("m", "a"), ("m", "b")])
+    index = build_runtime_index(graph)
+    assert index["depth"] == {"q": 1, "m": 1, "a": 0, "b": 0, "c": 0}
+    assert steps_remaining(index, "m") == 1
+    assert sorted(reachable_results(index, "q")) == ["a", "b", "c"]
+    assert sorted(reachable_results(index, "m")) == ["a", "b"]
+    assert reachable_results(index, "c") == ["c"]
+    # No two nodes here reach the same results, so no set is shared
+    assert len(index["result_sets"]) == 5
+    assert reachable_results(index, "unknown") is None
+    assert steps_remaining(None, "q") is None
+
+
+def test_runtime_index_shares_sets_within_a_cycle():
+    graph = _graph(["*q", "x", "r!"], [("q", "x"), ("x", "q", "again"), ("x", "r", "done")])
+    index = build_runtime_index(graph)
+    assert index["reachable"]["q"] == index["reachable"]["x"]
+    assert index["depth"] == {"q": 2, "x": 1, "r": 0}
+
+
+def test_session_state_reports_the_index(client, publish_flow):
+    flow_id, _ = publish_flow("Router")
+    state = client.post("/api/v1/sessions", json={"flow_id": flow_id}).get_json()
+    assert state["steps_remaining"] == 1
+    assert len(state["reachable_results"]) == 1
@@ -0,0 +1,77 @@
+"""Permanent deletion: the flow disappears at once and a maintenance job purges its rows in chunks."""
+import threading
+import pytest
+import jobs
+import routes.flows
+from jobs import maintenance
+from models import Flow, FlowVersion, Node, Edge, Session, SessionStep
+
+SESSIONS = 5
+
+
+@pytest.fixture
+def flow_with_sessions(client, publish_flow):
+    """A flow with two versions and SESSIONS completed sessions of one step each."""
+    flow_id, _ = publish_flow("Router")
+    client.post(f"/api/v1/flows/{flow_id}/versions", json={})
+    for _ in range(SESSIONS):
+        state = client.post("/api/v1/sessions", json={"flow_id": flow_id}).get_json()
+        client.post(f"/api/v1/sessions/{state['session_id']}/step",
+                    json={"edge_id": state["options"][0]["edge_id"]})
+    return flow_id
+
+
+def _finished(job_id):
+    """
+    The job, once the single maintenance worker has finished it and left its
+    app context. Waiting on the worker rather than polling the API matters:
+    the in-memory test database is one connection, which the job thread and
+    a request thread must not use at once.
+    """
+    maintenance._pool().submit(lambda: None).result(timeout=10)
+    return maintenance.get(job_id).to_dict()
+
+
+def test_purge_in_chunks(app, client, flow_with_sessions, monkeypatch):
+    monkeypatch.setitem(app.config, "PURGE_CHUNK_SIZE", 2)
+    reports = []
+    update = jobs.Job.update
+
+    def record(job, **progress):
+        reports.append(progress)
+        update(job, **progress)
+    monkeypatch.setattr(jobs.Job, "update", record)
+
+    # Held until the request is done with the database
+    requested = threading.Event()
+    purge = routes.flows.purge_flow
+    monkeypatch.setattr(routes.flows, "purge_flow", lambda *args: requested.wait(10) and purge(*args))
+
+    resp = client.delete(f"/api/v1/flows/{flow_with_sessions}/permanent")
+    assert resp.status_code == 202
+    # Gone from the API before the job has run
+    assert client.get(f"/api/v1/flows/{flow_with_sessions}").status_code == 404
+    requested.set()
+
+    job = _finished(resp.get_json()["job"]["id"])
+    assert job["status"] == "succeeded", job["error"]
+    assert job["progress"]["phase"] == "done"
+    assert job["progress"]["deleted"] == {
+        "session_steps": SESSIONS, "sessions": SESSIONS, "edges": 2, "nodes": 4, "versions": 2,
+    }
+    # Five sessions at two per chunk are reported after each of three chunks
+    assert sorted({r["deleted"]["sessions"] for r in reports if "sessions" in r.get("deleted", {})}) == [2, 4, 5]
+
+    with app.app_context():
+        for model in (Flow, FlowVersion, Node, Edge, Session, SessionStep):
+            assert model.query.count() == 0, model.__name__
+
+
+def test_full_queue_returns_429_and_leaves_the_flow(client, flow_with_sessions, monkeypatch):
+    monkeypatch.setattr(maintenance, "max_queued", 0)
+    resp = client.delete(f"/api/v1/flows/{flow_with_sessions}/permanent")
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "5"
+    flow = client.get(f"/api/v1/flows/{flow_with_sessions}")
+    assert flow.status_code == 200
+    assert not flow.get_json()["is_archived"]
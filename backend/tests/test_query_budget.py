@@ -0,0 +1,13 @@
+import pytest
+from bench.query_budget import CASES, measure
+
+SMALL, LARGE = 3, 30
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_query_budget(app, db, query_count, name):
+    setup, budget = CASES[name]
+    small = measure(app, db, query_count, setup, SMALL)
+    large = measure(app, db, query_count, setup, LARGE)
+    assert large.total <= small.total, f"grows with input: {large.repeated(2)}"
+    assert max(small.total, large.total) <= budget, large.repeated(2)
@@ -0,0 +1,35 @@
+from extensions import cache
+from shared_cache import SharedCache, SQLiteStore
+from flow_index import flow_index
+
+
+def test_reset_clears_the_lru_and_runs_every_callback():
+    shared = SharedCache()
+    seen = []
+    shared.on_invalidate("flows", lambda key: seen.append(("flows", key)))
+    shared.on_invalidate("runtime_index", lambda key: seen.append(("runtime_index", key)))
+    shared.set("flows", "f1", {"name": "Router"})
+    shared._on_reset()
+    assert shared._local == {}
+    assert sorted(seen) == [("flows", None), ("runtime_index", None)]
+
+
+def test_reset_rebuilds_the_suggest_catalog(app, publish_flow):
+    publish_flow("Router")
+    with app.app_context():
+        assert len(flow_index) == 1
+        cache._on_reset()
+        assert not flow_index.built
+        assert len(flow_index) == 1
+
+
+def test_sqlite_store_keeps_the_newest_entries(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.db"), max_entries=3)
+    for key in "abcde":
+        store.set(key, b"1")
+    # Deletes leave gaps in the rowids, which the cap must not count
+    store.delete("d")
+    store.delete("c")
+    for key in "fgh":
+        store.set(key, b"1")
+    assert [store.get(key) is not None for key in "abefgh"] == [False, False, False, True, True, True]
@@ -0,0 +1,15 @@
+import os
+from bench import startup
+
+# Wall-clock time depends on the machine, so the test's budget is loose by default;
+# python -m bench.startup enforces BUDGET_MS. Set STARTUP_BUDGET_MS to tighten it.
+BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 3 * startup.BUDGET_MS))
+
+
+def test_import_app_loads_no_lazy_modules():
+    assert startup.eager_imports(startup.import_profile()) == []
+
+
+def test_import_app_within_budget():
+    best = min(startup.import_profile()["app"][1] for _ in range(3))
+    assert best / 1000 <= BUDGET_MS
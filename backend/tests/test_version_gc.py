@@ -0,0 +1,74 @@
+"""Version garbage collection: what it may reclaim, and what it must keep."""
+from datetime import datetime, timedelta
+import pytest
+from extensions import db
+from maintenance import collect_versions
+from models import FlowVersion, Node, Edge
+
+RETENTION_DAYS = 30
+
+
+def _branch_and_publish(client, flow_id):
+    version = client.post(f"/api/v1/flows/{flow_id}/versions", json={}).get_json()
+    client.post(f"/api/v1/flows/{flow_id}/versions/{version['id']}/publish", json={})
+    return version["id"]
+
+
+@pytest.fixture
+def history(app, client, publish_flow):
+    """
+    One flow with five versions: v1 superseded, v2 superseded with a session
+    on it, v3 superseded but recent, v4 active and v5 the draft being edited.
+    All but v3 are older than the retention window.
+    """
+    flow_id, v1 = publish_flow("Router")
+    v2 = _branch_and_publish(client, flow_id)
+    client.post("/api/v1/sessions", json={"flow_id": flow_id})
+    v3 = _branch_and_publish(client, flow_id)
+    v4 = _branch_and_publish(client, flow_id)
+    v5 = client.post(f"/api/v1/flows/{flow_id}/versions", json={}).get_json()["id"]
+    old = datetime.utcnow() - timedelta(days=RETENTION_DAYS + 1)
+    with app.app_context():
+        FlowVersion.query.filter(FlowVersion.id.in_([v1, v2, v4, v5])).update(
+            {"created_at": old}, synchronize_session=False
+        )
+        db.session.commit()
+    return {"superseded": v1, "with_session": v2, "recent": v3, "active": v4, "newest": v5}
+
+
+def _remaining(app):
+    with app.app_context():
+        return {v.id for v in FlowVersion.query.all()}
+
+
+def test_collects_only_unreachable_versions_past_retention(app, history):
+    with app.app_context():
+        counts = collect_versions(RETENTION_DAYS, chunk_size=1)
+        assert Node.query.filter_by(flow_version_id=history["superseded"]).count() == 0
+        assert Edge.query.filter_by(flow_version_id=history["superseded"]).count() == 0
+    assert counts == {"dry_run": False, "versions": 1, "nodes": 2, "edges": 1}
+    assert _remaining(app) == set(history.values()) - {history["superseded"]}
+
+
+def test_shorter_retention_reaches_recent_versions(app, history):
+    with app.app_context():
+        collect_versions(0, chunk_size=100)
+    assert _remaining(app) == {history["with_session"], history["active"], history["newest"]}
+
+
+def test_dry_run_reports_what_a_real_run_reclaims(app, history):
+    with app.app_context():
+        planned = collect_versions(0, chunk_size=100, dry_run=True)
+        assert _remaining(app) == set(history.values())
+        done = collect_versions(0, chunk_size=100)
+    assert planned.pop("dry_run") and not done.pop("dry_run")
+    assert planned == done == {"versions": 2, "nodes": 4, "edges": 2}
+
+
+def test_gc_versions_command(app, history):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["gc-versions", "--dry-run"])
+    assert "Would reclaim 1 versions, 2 nodes, 1 edges." in result.output
+    assert _remaining(app) == set(history.values())
+    result = runner.invoke(args=["gc-versions", "--retention-days", "0"])
+    assert "Reclaimed 2 versions, 4 nodes, 2 edges." in result.output
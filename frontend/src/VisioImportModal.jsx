@@ -1,5 +1,6 @@
 import { useState, useRef, useCallback } from 'react'
 import JSZip from 'jszip'
+import { api } from './api'
 
 // ── API (mirrors App.jsx) ─────────────────────────────────────
 const BASE = 'http://localhost:5000/api/v1'
@@ -518,28 +519,26 @@ function TextToFlowTab({ onGenerated, onError }) {
     setGenStage('reading')
 
     try {
-      await new Promise(r => setTimeout(r, 400))
-      setGenProgress(30); setGenStage('detecting')
-
-      const res = await fetch(`${BASE}/flows/generate-from-text`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ description: description.trim(), provider }),
-      })
-
-      setGenProgress(65); setGenStage('mapping')
-
-      if (!res.ok) {
-        const err = await res.json().catch(() => ({}))
-        const msg = err.error || `Server error ${res.status}`
+      // Nodes stream in as the model writes them, so progress tracks real work
+      let streamedNodes = 0
+      let data
+      try {
+        data = await api.generateFlowFromTextStream(description.trim(), provider, (type, payload) => {
+          if (type === 'status') {
+            if (payload.stage === 'rewriting') { setGenProgress(25); setGenStage('detecting') }
+            else { setGenProgress(45); setGenStage('mapping') }
+          } else if (type === 'node') {
+            streamedNodes += 1
+            setGenProgress(Math.min(85, 45 + streamedNodes * 3))
+          }
+        })
+      } catch (err) {
         // Surface actionable messages for common failure cases
-        if (res.status === 503) throw new Error(`${msg} (AI service unavailable)`)
-        if (res.status === 429) throw new Error(`${msg} (please wait a moment)`)
-        if (res.status === 422) throw new Error(msg)
-        throw new Error(msg)
+        if (err.status === 503) throw new Error(`${err.message} (AI service unavailable)`)
+        if (err.status === 429) throw new Error(`${err.message} (please wait a moment)`)
+        throw err
       }
 
-      const data = await res.json()
       setGenProgress(88); setGenStage('building')
       await new Promise(r => setTimeout(r, 500))
       setGenProgress(100)
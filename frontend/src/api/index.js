@@ -13,6 +13,51 @@ async function req(method, path, body) {
   return res.json()
 }
 
+// POST that answers with server-sent events. Calls onEvent(type, data) per event
+// and resolves with the "done" payload; an "error" event rejects.
+async function stream(path, body, onEvent) {
+  const res = await fetch(`${BASE}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+  })
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}))
+    const error = new Error(err.error || `HTTP ${res.status}`)
+    error.status = res.status
+    throw error
+  }
+
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let end
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, end)
+      buffer = buffer.slice(end + 2)
+      let type = 'message'
+      let data = ''
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) type = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      const payload = data ? JSON.parse(data) : null
+      if (type === 'done') return payload
+      if (type === 'error') {
+        const error = new Error(payload.error)
+        error.status = payload.status
+        throw error
+      }
+      onEvent?.(type, payload)
+    }
+  }
+  throw new Error('Stream ended unexpectedly')
+}
+
 export const api = {
   // Flows
   getFlows: (params = {}) => {
@@ -30,9 +75,14 @@ export const api = {
 
   // Versions
   getVersion: (fId, vId) => req('GET', `/flows/${fId}/versions/${vId}`),
+  validateVersion: (fId, vId) => req('GET', `/flows/${fId}/versions/${vId}/validate`),
   publishVersion: (fId, vId, d) => req('POST', `/flows/${fId}/versions/${vId}/publish`, d),
   createVersion: (fId, d) => req('POST', `/flows/${fId}/versions`, d),
 
+  // Change feeds (server-sent events) — pass to `new EventSource(url)`
+  versionChangesUrl: (vId) => `${BASE}/versions/${vId}/changes`,
+  sessionChangesUrl: (id) => `${BASE}/sessions/${id}/changes`,
+
   // Nodes
   createNode: (vId, d) => req('POST', `/versions/${vId}/nodes`, d),
   updateNode: (vId, nId, d) => req('PUT', `/versions/${vId}/nodes/${nId}`, d),
@@ -62,6 +112,14 @@ export const api = {
   suggestFlow: (issue, provider = 'groq') => req('POST', '/flows/suggest', { issue, provider }),
   getAIProviders: () => req('GET', '/flows/providers'),
   generateFlowFromText: (description, provider = 'groq') => req('POST', '/flows/generate-from-text', { description, provider }),
+  generateFlowFromTextStream: (description, provider = 'groq', onEvent) =>
+    stream('/flows/generate-from-text/stream', { description, provider }, onEvent),
+  submitGenerateJob: (description, provider = 'groq') =>
+    req('POST', '/flows/generate-from-text/jobs', { description, provider }),
+
+  // Background jobs
+  getJob: (id) => req('GET', `/jobs/${id}`),
+  cancelJob: (id) => req('POST', `/jobs/${id}/cancel`),
 
   // Misc
   getCategories: () => req('GET', '/categories'),
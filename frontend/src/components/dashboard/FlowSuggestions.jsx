@@ -244,7 +244,7 @@ export default function FlowSuggestions() {
             <span style={{ color: 'var(--border2)' }}>·</span>
             <span>{result.meta?.model}</span>
             <span style={{ color: 'var(--border2)' }}>·</span>
-            <span style={{ color: 'var(--accent)', opacity: 0.7 }}>groq</span>
+            <span style={{ color: 'var(--accent)', opacity: 0.7 }}>{result.meta?.provider || 'groq'}</span>
           </div>
         </div>
       )}
@@ -318,7 +318,7 @@ function SessionSidebar({ session, breadcrumb, isCompleted, testVersionId, flowI
 
       <div style={{ padding: '16px 20px', borderTop: '1px solid var(--border)' }}>
         <div style={{ display: 'flex', justifyContent: 'space-between', fontFamily: 'var(--mono)', fontSize: '10px', color: 'var(--text3)', marginBottom: isCompleted ? '10px' : 0 }}>
-          <span>step {session.step_number}</span>
+          <span>step {session.step_number}{!isCompleted && session.steps_remaining != null ? ` · ~${session.steps_remaining} left` : ''}</span>
           <span style={{ color: isCompleted ? 'var(--green)' : 'var(--text3)' }}>{isCompleted ? 'done' : 'in progress'}</span>
         </div>
         {isCompleted && (